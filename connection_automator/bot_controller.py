@@ -8,6 +8,7 @@ import random
 import pandas as pd
 from selenium.common.exceptions import WebDriverException
 from connection_automator.linkedin_bot import LinkedinBot
+from search_tool.profile_url import profile_key
 import consts as c
 
 class BotController():
@@ -25,6 +26,12 @@ class BotController():
         self.used_profiles = []
         self.num_sent = 0
         self.df = pd.read_excel(self.excel)
+        # Visit each profile once, however many ways it was linked, keeping
+        # every row without a link, as the rows are written back to the sheet
+        if 'Link' in self.df:
+            self.df['Link'] = self.df['Link'].map(profile_key)
+            repeated = self.df['Link'].notna() & self.df['Link'].duplicated()
+            self.df = self.df[~repeated].reset_index(drop=True)
 
     def run(self):
         """
@@ -14,6 +14,7 @@ from tkinter import ttk
 import pickle
 import consts as c
 import search_tool.search_for_profiles as search_for_profiles
+from search_tool.result_sink import RESULT_SINKS
 from connection_automator.bot_controller import BotController
 
 class Interface:
@@ -368,7 +369,7 @@ class Interface:
 
             isdir = os.path.isdir(os.path.dirname(output))
             access = os.access(os.path.dirname(output), os.W_OK)
-            end = output[-4:] == 'xlsx'
+            end = os.path.splitext(output)[1].lower() in RESULT_SINKS
             if isdir and access and end:
                 c.EXCEL_FILE_LOCATION = output
             else:
@@ -0,0 +1,337 @@
+"""
+The Bloom Filter module of the LinkedIn Search Tool.
+
+This module puts a Bloom filter in front of the profile index. A Bloom
+filter is a small array of bits that can say for certain that a profile
+has never been indexed, and can only be wrong the other way, by rarely
+saying that a new profile might have been. Once the index is large, most
+links returned by a search have already been indexed, so the filter lets
+the program skip the index for every link that is definitely new and only
+look up the rest, which matters most when the index is stored on disk. The
+filter is saved next to the index so that it does not need to be rebuilt
+on every run, along with the version of the index it was built from, so
+that a filter left behind by a crash or by another copy of the program is
+rebuilt rather than trusted.
+
+Author: Ethan Baker
+"""
+import math
+import numpy as np
+from search_tool.file_lock import FileLock, atomic_open
+from search_tool.compact_index import slug_hash, hash_profiles
+from search_tool.profile_url import profile_slug
+
+# The fewest profiles a new filter is sized for
+MIN_CAPACITY = 10000
+
+class BloomFilter():
+    """
+    A class representing a Bloom filter of 64-bit profile hashes.
+
+    Contains the properties capacity, which is the number of profiles the
+    filter is sized for, error_rate, which is the chance that a new profile
+    is mistaken for an indexed one once capacity profiles have been added,
+    size and num_hashes, which are the number of bits in the filter and the
+    number of bits set for each profile, and bits, a numpy array holding
+    the bits. count is the number of profiles that have been added, source
+    is the String filepath to the index the filter was built from, and
+    version is a String identifying the saved index the filter holds every
+    profile of, or "" if it is not known to hold them all.
+    """
+
+    def __init__(self, capacity, error_rate, source=None, version=""):
+        """
+        Creates an empty BloomFilter object.
+
+        Parameter capacity: The number of profiles the filter is sized for.
+        Precondition: capacity is an int > 0.
+
+        Parameter error_rate: The false positive rate at capacity.
+        Precondition: error_rate is a float between 0 and 1.
+
+        Parameter source: the filepath to the index the filter is built from.
+        Precondition: source is a String, or None.
+
+        Parameter version: The version of the saved index the filter holds.
+        Precondition: version is a String.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.source = source
+        self.version = version
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def positions(self, keys):
+        """
+        Returns: A 2D numpy array with a row of bit positions for each key.
+
+        The positions are made from the two halves of each key by double
+        hashing, so each key is only hashed once.
+
+        Parameter keys: The hashes of the profiles.
+        Precondition: keys is a numpy uint64 array.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        first = keys & np.uint64(0xFFFFFFFF)
+        second = (keys >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (first[:, None] + steps * second[:, None]) % np.uint64(self.size)
+
+    def add_keys(self, keys):
+        """
+        Adds the hashes of profiles to the filter.
+
+        Parameter keys: The hashes of the profiles.
+        Precondition: keys is a numpy uint64 array.
+        """
+        positions = self.positions(keys).ravel()
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), masks)
+        self.count += len(keys)
+
+    def contains_keys(self, keys):
+        """
+        Returns: A numpy array of bools, which are False where the key at the
+        same position in keys has definitely not been added.
+
+        Parameter keys: The hashes of the profiles.
+        Precondition: keys is a numpy uint64 array.
+        """
+        positions = self.positions(keys)
+        bits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7))) & 1
+        return bits.all(axis=1)
+
+    def false_positive_rate(self):
+        """
+        Returns: The chance that a new profile is currently mistaken for an
+        indexed one, estimated from the share of bits that are set.
+        """
+        filled = np.unpackbits(self.bits)[:self.size].sum() / self.size
+        return float(filled ** self.num_hashes)
+
+    def memory_usage(self):
+        """
+        Returns: The number of bytes used by the filter's bits.
+        """
+        return self.bits.nbytes
+
+    def save(self, bloom_file):
+        """
+        Saves the filter to bloom_file.
+
+        Parameter bloom_file: the filepath to save the filter to.
+        Precondition: bloom_file is a String containing a valid .npz filepath.
+        """
+        with atomic_open(bloom_file) as file:
+            np.savez(file, bits=self.bits, count=self.count,
+                     capacity=self.capacity, error_rate=self.error_rate,
+                     source=str(self.source), version=self.version)
+
+def load_bloom_filter(bloom_file):
+    """
+    Returns: The BloomFilter saved at bloom_file, or None if there is none
+    or it was saved without the version of its index.
+
+    Parameter bloom_file: the filepath to the saved filter.
+    Precondition: bloom_file is a String containing a valid .npz filepath.
+    """
+    try:
+        with np.load(bloom_file) as data:
+            bloom = BloomFilter(int(data["capacity"]), float(data["error_rate"]),
+                                str(data["source"]), str(data["version"]))
+            bloom.bits = data["bits"]
+            bloom.count = int(data["count"])
+        return bloom
+    except:
+        return None
+
+class BloomIndexedData():
+    """
+    A class representing indexed data with a Bloom filter in front of its
+    profile index.
+
+    Contains the property index, which is the IndexedData object whose
+    profiles are filtered, bloom_file, the String filepath to the saved
+    filter, and error_rate, the false positive rate the filter is sized for.
+    The filter is loaded on first use, and is rebuilt from index if it has
+    not been saved, was built from another index or another version of it,
+    or holds more profiles than it was sized for. lookups counts the profiles that the filter could
+    not rule out, and false_positives those of them that were not indexed.
+    Everything else is passed on to index.
+    """
+
+    def __init__(self, index, bloom_file, error_rate):
+        """
+        Creates a BloomIndexedData object.
+
+        Parameter index: The indexed data to filter.
+        Precondition: index is an IndexedData object.
+
+        Parameter bloom_file: the filepath to the saved filter.
+        Precondition: bloom_file is a String containing a valid .npz filepath.
+
+        Parameter error_rate: The false positive rate to size the filter for.
+        Precondition: error_rate is a float between 0 and 1.
+        """
+        self.index = index
+        self.bloom_file = bloom_file
+        self.error_rate = error_rate
+        self._bloom = None
+        self.lookups = 0
+        self.false_positives = 0
+
+    def __getattr__(self, name):
+        # Only called for attributes BloomIndexedData does not have itself
+        if name == "index":
+            raise AttributeError(name)
+        return getattr(self.index, name)
+
+    @property
+    def bloom(self):
+        """
+        The BloomFilter of indexed profiles, loaded or built on first use.
+        """
+        if self._bloom is None:
+            bloom = load_bloom_filter(self.bloom_file)
+            if (bloom is None or bloom.source != str(self.index.profile_file) or
+                    bloom.version != self.index_version() or
+                    bloom.count > bloom.capacity):
+                bloom = self.build_bloom_filter()
+            self._bloom = bloom
+        return self._bloom
+
+    def index_version(self):
+        """
+        Returns: A String identifying the saved profile index of self.index.
+        """
+        return repr(self.index.saved_profiles_version())
+
+    def build_bloom_filter(self):
+        """
+        Returns: A new BloomFilter holding every profile in self.index.
+
+        The filter is sized for twice as many profiles as there are now, so
+        it does not need to be rebuilt for a while. It records the version
+        of the saved index unless self.index has unsaved changes, as it
+        may then be missing profiles saved by another process.
+        """
+        profiles = self.index.profiles
+        if isinstance(profiles, np.ndarray):
+            keys = profiles
+        else:
+            keys = hash_profiles(list(profiles))
+        bloom = BloomFilter(max(MIN_CAPACITY, 2 * len(keys)), self.error_rate,
+                            str(self.index.profile_file))
+        bloom.add_keys(keys)
+        if not self.index.profiles_dirty:
+            bloom.version = self.index_version()
+        return bloom
+
+    def refresh(self):
+        """
+        Refreshes self.index, and forgets the filter if the saved index has
+        changed since the filter was loaded or built, unless self.index has
+        unsaved changes that only the filter in memory holds.
+        """
+        self.index.refresh()
+        if (self._bloom is not None and not self.index.profiles_dirty and
+                self._bloom.version != self.index_version()):
+            self._bloom = None
+
+    @property
+    def profiles(self):
+        """
+        The indexed profiles of self.index.
+        """
+        return self.index.profiles
+
+    @profiles.setter
+    def profiles(self, profiles):
+        self.index.profiles = profiles
+        self._bloom = self.build_bloom_filter()
+
+    def observed_false_positive_rate(self):
+        """
+        Returns: The share of lookups the filter sent to self.index that
+        turned out to be new profiles, or 0.0 if there have been none.
+        """
+        if self.lookups == 0:
+            return 0.0
+        return self.false_positives / self.lookups
+
+    def check_dup_profile(self, profile):
+        """
+        Checks for a duplicate profile, only looking it up in self.index if
+        the filter cannot rule it out.
+
+        Returns: True if profile has been indexed, otherwise False.
+
+        Parameter profile: the profile of the user that is being searched for.
+        Precondition: profile is a String that represents a url.
+        """
+        return self.check_dup_profiles([profile])[0]
+
+    def check_dup_profiles(self, profiles):
+        """
+        Checks a list of profiles for duplicates at once.
+
+        Returns: A list of bools, which are True where the profile at the
+        same position in profiles has been indexed.
+
+        Parameter profiles: the profiles being searched for.
+        Precondition: profiles is a list of Strings that represent urls.
+        """
+        maybe = self.bloom.contains_keys(hash_profiles(profiles))
+        candidates = [profile for profile, hit in zip(profiles, maybe) if hit]
+        found = iter(self.index.check_dup_profiles(candidates) if candidates else [])
+        dups = [bool(hit) and next(found) for hit in maybe]
+        self.lookups += len(candidates)
+        self.false_positives += len(candidates) - sum(dups)
+        return dups
+
+    def add_indexed_profile(self, profile):
+        """
+        Adds a new profile to the filter and to self.index.
+
+        Parameter profile: The profile being added.
+        Precondition: profile is a String.
+        """
+        self.bloom.add_keys(np.array([slug_hash(profile_slug(profile))], dtype=np.uint64))
+        self.index.add_indexed_profile(profile)
+
+    def add_indexed_profiles(self, profiles):
+        """
+        Adds many profiles to the filter and to self.index at once.
+
+        Parameter profiles: The profiles being added.
+        Precondition: profiles is an iterable of Strings.
+        """
+        profiles = list(profiles)
+        self.bloom.add_keys(hash_profiles(profiles))
+        self.index.add_indexed_profiles(profiles)
+
+    def save_indexed_profiles(self):
+        """
+        Saves self.index, then saves the filter to self.bloom_file with the
+        version of the index it now holds.
+
+        The filter is locked while they are saved. If another process saved
+        the index since the filter was loaded, the index may have merged in
+        profiles the filter does not hold, so the filter is rebuilt from it
+        instead. If the program stops between the two saves, the saved
+        filter's version no longer matches the index and it is rebuilt on
+        next use.
+        """
+        with FileLock(self.bloom_file):
+            bloom = self.bloom
+            current = bloom.version == self.index_version()
+            self.index.save_indexed_profiles()
+            if current:
+                bloom.version = self.index_version()
+            else:
+                self.index.refresh()
+                self._bloom = bloom = self.build_bloom_filter()
+            bloom.save(self.bloom_file)
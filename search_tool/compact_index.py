@@ -0,0 +1,283 @@
+"""
+The Compact Index module of the LinkedIn Search Tool.
+
+This module stores the profile index as a sorted numpy array of 64-bit
+hashes of each profile's slug, instead of a set of url Strings. Each profile
+then costs 8 bytes, so tens of millions of profiles fit in a few hundred MB,
+and a whole page of results can be checked in one vectorized search. As two
+slugs can share a hash, an optional side table of exact slugs can be kept
+to confirm each match, at the cost of storing every slug again.
+
+Author: Ethan Baker
+"""
+import pickle
+import hashlib
+import numpy as np
+from search_tool.indexed_data import IndexedData, file_version
+from search_tool.file_lock import FileLock, atomic_open
+from search_tool.profile_url import profile_slug
+
+# The number of added hashes held before they are merged into the array
+PENDING_LIMIT = 1000
+
+def slug_hash(slug):
+    """
+    Returns: A stable 64-bit int hash of slug.
+
+    Parameter slug: A profile slug.
+    Precondition: slug is a String.
+    """
+    digest = hashlib.blake2b(slug.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def hash_profiles(profiles):
+    """
+    Returns: A numpy uint64 array of the hashes of the slugs of profiles.
+
+    Parameter profiles: The profile urls to hash.
+    Precondition: profiles is a list of Strings.
+    """
+    return np.fromiter((slug_hash(profile_slug(profile)) for profile in profiles),
+                       dtype=np.uint64, count=len(profiles))
+
+class CompactIndexedData(IndexedData):
+    """
+    A class representing indexed data with a compact profile index.
+
+    Contains the property hashes, a sorted numpy uint64 array of the hash of
+    every indexed profile's slug, and pending, a set of hashes that have been
+    added but not yet merged into hashes. If the property exact is True,
+    the property slugs maps each hash to the set of slugs indexed with it,
+    so hash collisions are never mistaken for duplicates. Hashes indexed
+    before exact slugs were kept have no slugs, and are matched by hash
+    alone. The property
+    compact_file is the String filepath to the saved array, which is created
+    from the .pkl profile index at profile_file the first time it is loaded.
+    The query index is the same as in IndexedData.
+    """
+
+    def __init__(self, profile_file, query_file, compact_file, exact=False):
+        """
+        Creates a CompactIndexedData object.
+
+        Parameter profile_file: the filepath to the .pkl profile index.
+        Precondition: profile_file is a String containing a valid .pkl filepath.
+
+        Parameter query_file: the filepath to the query index.
+        Precondition: query_file is a String containing a valid .pkl filepath.
+
+        Parameter compact_file: the filepath to the compact profile index.
+        Precondition: compact_file is a String containing a valid .npz filepath.
+
+        Parameter exact: Whether to keep exact slugs to resolve collisions.
+        Precondition: exact is a bool.
+        """
+        super().__init__(profile_file, query_file)
+        self.compact_file = compact_file
+        self.exact = exact
+        self.hashes = None
+        self.pending = set()
+        self.slugs = {}
+
+    @property
+    def profiles(self):
+        """
+        The sorted numpy array of indexed profile hashes, loaded on first use.
+        """
+        if self.hashes is None:
+            self.load_compact_profiles()
+        self.merge_pending()
+        return self.hashes
+
+    @profiles.setter
+    def profiles(self, profiles):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.pending = set()
+        self.slugs = {}
+        self.add_indexed_profiles(list(profiles))
+        self.profiles_replaced = True
+
+    def refresh(self):
+        """
+        Forgets the loaded indexes if their files have changed since they
+        were loaded or saved, unless they have unsaved changes.
+        """
+        if (self.hashes is not None and not self.profiles_dirty and
+                file_version(self.compact_file) != self.profiles_version):
+            self.hashes = None
+            self.pending = set()
+            self.slugs = {}
+        if (self._query_records is not None and not self.queries_dirty and
+                file_version(self.query_file) != self.queries_version):
+            self._query_records = None
+
+    def saved_profiles_version(self):
+        """
+        Returns: A value identifying the saved compact index.
+        """
+        return file_version(self.compact_file)
+
+    def load_compact_profiles(self):
+        """
+        Loads the profile hashes from self.compact_file, or hashes the .pkl
+        profile index if there is no compact index yet.
+
+        A compact index that exists but cannot be read is not rebuilt from
+        the .pkl index, as that could lose the profiles added since, so the
+        error is raised instead. If exact is True but the index was saved
+        without its slugs, the hashes are kept, and the slugs are rebuilt
+        from the profiles in the .pkl index that are in it.
+        """
+        self.profiles_version = file_version(self.compact_file)
+        try:
+            with np.load(self.compact_file) as data:
+                self.hashes = data["hashes"]
+        except FileNotFoundError:
+            self.hashes = np.empty(0, dtype=np.uint64)
+            self.slugs = {}
+            self.add_indexed_profiles(list(self.load_indexed_profiles()))
+            self.merge_pending()
+            return
+        if self.exact:
+            try:
+                with open(self.compact_file + ".slugs.pkl", 'rb') as file:
+                    self.slugs = pickle.load(file)
+            except FileNotFoundError:
+                self.slugs = self.rebuild_slugs()
+
+    def rebuild_slugs(self):
+        """
+        Returns: A dictionary mapping the hash of each profile in the .pkl
+        profile index that is in self.hashes to the set of its slug.
+        """
+        slugs = {}
+        for profile in self.load_indexed_profiles():
+            slug = profile_slug(profile)
+            key = slug_hash(slug)
+            position = np.searchsorted(self.hashes, np.uint64(key))
+            if position < len(self.hashes) and int(self.hashes[position]) == key:
+                slugs.setdefault(key, set()).add(slug)
+        return slugs
+
+    def exact_match(self, key, slug):
+        """
+        Returns: True if slug was indexed with the hash key, or if no slugs
+        were kept for key, otherwise False.
+
+        Parameter key: The hash of an indexed profile.
+        Precondition: key is an int.
+
+        Parameter slug: The slug being searched for.
+        Precondition: slug is a String.
+        """
+        slugs = self.slugs.get(key)
+        return slugs is None or slug in slugs
+
+    def merge_pending(self):
+        """
+        Merges the pending hashes into the sorted array of hashes.
+        """
+        if self.pending:
+            new = np.fromiter(self.pending, dtype=np.uint64, count=len(self.pending))
+            self.hashes = np.union1d(self.hashes, new)
+            self.pending = set()
+
+    def check_dup_profiles(self, profiles):
+        """
+        Checks a list of profiles for duplicates at once.
+
+        Returns: A list of bools, which are True where the profile at the
+        same position in profiles has been indexed.
+
+        Parameter profiles: the profiles being searched for.
+        Precondition: profiles is a list of Strings that represent urls.
+        """
+        hashes = self.profiles
+        keys = hash_profiles(profiles)
+        positions = np.searchsorted(hashes, keys)
+        found = positions < len(hashes)
+        found[found] = hashes[positions[found]] == keys[found]
+        if self.exact:
+            for i, profile in enumerate(profiles):
+                if found[i]:
+                    found[i] = self.exact_match(int(keys[i]), profile_slug(profile))
+        return found.tolist()
+
+    def check_dup_profile(self, profile):
+        """
+        Checks for a duplicate profile by searching for its hash.
+
+        Returns: True if profile has been indexed, otherwise False.
+
+        Parameter profile: the profile of the user that is being searched for.
+        Precondition: profile is a String that represents a url.
+        """
+        if self.hashes is None:
+            self.load_compact_profiles()
+        key = slug_hash(profile_slug(profile))
+        if key in self.pending:
+            found = True
+        else:
+            position = np.searchsorted(self.hashes, np.uint64(key))
+            found = position < len(self.hashes) and int(self.hashes[position]) == key
+        if found and self.exact:
+            return self.exact_match(key, profile_slug(profile))
+        return bool(found)
+
+    def add_indexed_profile(self, profile):
+        """
+        Adds a new profile to the index.
+
+        Parameter profile: The profile being added.
+        Precondition: profile is a String.
+        """
+        self.add_indexed_profiles([profile])
+
+    def add_indexed_profiles(self, profiles):
+        """
+        Adds many profiles to the index at once.
+
+        The hashes are held apart and merged into the sorted array once
+        PENDING_LIMIT of them have been added, or when the whole array is
+        checked or saved, rather than on every page of results.
+
+        Parameter profiles: The profiles being added.
+        Precondition: profiles is a list of Strings.
+        """
+        if self.hashes is None:
+            self.load_compact_profiles()
+        for profile in profiles:
+            slug = profile_slug(profile)
+            key = slug_hash(slug)
+            self.pending.add(key)
+            if self.exact:
+                self.slugs.setdefault(key, set()).add(slug)
+        if len(self.pending) >= PENDING_LIMIT:
+            self.merge_pending()
+        self.profiles_dirty = True
+
+    def save_indexed_profiles(self):
+        """
+        Saves the array of profile hashes to self.compact_file.
+
+        The file is locked while it is saved, and if another process has
+        saved it since it was loaded, the profiles it added are merged in
+        first, unless the whole index has been replaced.
+        """
+        with FileLock(self.compact_file):
+            hashes = self.profiles
+            if (not self.profiles_replaced and
+                    file_version(self.compact_file) != self.profiles_version):
+                saved = CompactIndexedData(self.profile_file, self.query_file,
+                                           self.compact_file, self.exact)
+                self.hashes = hashes = np.union1d(hashes, saved.profiles)
+                for key, slugs in saved.slugs.items():
+                    self.slugs.setdefault(key, set()).update(slugs)
+            with atomic_open(self.compact_file) as file:
+                np.savez(file, hashes=hashes)
+            if self.exact:
+                with atomic_open(self.compact_file + ".slugs.pkl") as file:
+                    pickle.dump(self.slugs, file)
+            self.profiles_version = file_version(self.compact_file)
+        self.profiles_dirty = False
+        self.profiles_replaced = False
@@ -0,0 +1,100 @@
+"""
+The File Lock module of the LinkedIn Search Tool.
+
+This module lets several copies of the program, like the GUI and a
+scheduled search, safely share the same index files. FileLock is an
+advisory lock held on a .lock file next to the file it protects, which
+each copy takes before reading an index to merge with and writing it back,
+and atomic_open writes a file in full next to its destination before
+renaming it into place, so no copy ever reads a half written index.
+
+Author: Ethan Baker
+"""
+import os
+import threading
+import tempfile
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, so msvcrt's byte range locks are used instead
+    fcntl = None
+    import msvcrt
+
+# The locks held by this process, see FileLock
+HELD = {}
+HELD_LOCK = threading.Lock()
+
+class FileLock():
+    """
+    A class representing an advisory lock on a file, shared across processes.
+
+    Contains the property lock_file, which is the String filepath to the
+    .lock file that is locked. A FileLock is used as a context manager, and
+    may be taken again by the thread that holds it, for example when one
+    locked save calls another.
+    """
+
+    def __init__(self, filepath):
+        """
+        Creates a FileLock object.
+
+        Parameter filepath: the filepath to the file being protected.
+        Precondition: filepath is a String containing a valid filepath.
+        """
+        self.lock_file = os.path.abspath(filepath) + ".lock"
+
+    def __enter__(self):
+        with HELD_LOCK:
+            if self.lock_file not in HELD:
+                HELD[self.lock_file] = [threading.RLock(), 0, None]
+            held = HELD[self.lock_file]
+        held[0].acquire()
+        if held[1] == 0:
+            file = open(self.lock_file, 'a+b')
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            held[2] = file
+        held[1] += 1
+        return self
+
+    def __exit__(self, *args):
+        held = HELD[self.lock_file]
+        held[1] -= 1
+        if held[1] == 0:
+            file = held[2]
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+            file.close()
+            held[2] = None
+        held[0].release()
+
+@contextmanager
+def atomic_open(filepath):
+    """
+    Opens a temporary file to write in place of filepath.
+
+    The temporary file is renamed over filepath once it has been written
+    and flushed to disk, and is deleted instead if writing it fails.
+
+    Parameter filepath: the filepath being written.
+    Precondition: filepath is a String containing a valid filepath.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    handle, temp_file = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, filepath)
+    except:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
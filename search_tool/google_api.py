@@ -8,22 +8,49 @@ search queries.
 Author: Ethan Baker
 """
 import random
-import requests
+import asyncio
+import threading
 import pandas as pd
 import consts as c
-from search_tool.indexed_data import IndexedData
+from search_tool.indexed_data import IndexedData, get_indexed_data
+from search_tool.search_session import SearchSession
+from search_tool.response_cache import ResponseCache
+from search_tool.query_cursors import QueryCursors
+from search_tool.yield_policy import YieldPolicy
+from search_tool.query_scheduler import QueryScheduler
+from search_tool.query_planner import QueryPlanner
+from search_tool.query_codec import build_query
+from search_tool.profile_url import profile_key
+from search_tool.profile_fields import extract_fields
+
+# The only parts of each response that are read, see
+# https://developers.google.com/custom-search/v1/performance#partial
+RESULT_FIELDS = "searchInformation/totalResults,items(title,link,snippet)"
+
+def empty_results():
+    """
+    Returns: An empty pandas DataFrame with the columns of search results.
+    """
+    df = pd.DataFrame({"Title": [], "Link": [], "Snippets": []})
+    if c.EXTRACT_FIELDS:
+        df = extract_fields(df)
+    return df
 
 class GoogleSearchAPI:
     """
     A class representing a custom Google search engine.
 
     The class contains properties key and engine_id, which represent
-    the API key, and custom search engine ID, respectively. The class contains
+    the API key, and custom search engine ID, respectively, session, the
+    SearchSession used to send requests, cache, the ResponseCache of
+    previously received pages, or None if caching is off, requests_sent,
+    the number of requests sent to the API so far, and error, the error
+    message of the last search, or "" if there was none. The class contains
     methods to generate search queries and to return search results of a 
     query.
     """
 
-    def __init__(self, key, engine_id):
+    def __init__(self, key, engine_id, session=None, cache=None):
         """
         Creates a new GoogleSearchAPI object.
 
@@ -33,9 +60,26 @@ class GoogleSearchAPI:
         Parameter engine_id: The ID of the Custom Google search engine.
         Precondition: engine_id is a String object representing a 
         valid search engine engine ID.
+
+        Parameter session: The session used to send requests.
+        Precondition: session is a SearchSession, or None to create one
+        with the default timeout and transport.
+
+        Parameter cache: The cache of previously received pages.
+        Precondition: cache is a ResponseCache, or None to use the cache
+        at c.RESPONSE_CACHE_LOCATION if c.USE_RESPONSE_CACHE is True.
         """
         self.key = key
         self.id = engine_id
+        self.session = session if session is not None else SearchSession()
+        if cache is None and c.USE_RESPONSE_CACHE:
+            cache = ResponseCache(c.RESPONSE_CACHE_LOCATION, 
+                                  c.RESPONSE_CACHE_TTL, 
+                                  c.RESPONSE_CACHE_MAX_ENTRIES)
+        self.cache = cache
+        self.requests_sent = 0
+        self.error = ""
+        self.lock = threading.Lock()
 
     def generate_queries(self, preferences):
         """
@@ -46,6 +90,12 @@ class GoogleSearchAPI:
         limited to 100 results per Google's API. Generating a list of
         search terms instead of using Google's AND operator allows for
         more clients to be found as each term generates 100 new results.
+        Unless c.REPEAT_QUERIES is True, queries that have been searched are
+        left out until they were last searched more than c.QUERY_EXPIRY 
+        seconds ago. If c.ADAPTIVE_QUERIES is True, the queries that are left
+        are then merged and split by a QueryPlanner, based on how many results
+        every query returned before, so a searched query is never merged into
+        a new one. Planned queries that have been searched are also left out.
 
         Returns: A list of strings that represent search queries.
 
@@ -54,58 +104,65 @@ class GoogleSearchAPI:
         search_for_profiles.load_preferences() and is based on a consts.py 
         configuration which follows the rules outlined in that file.
         """
-        queries = []
-        # Generate list of queries
+        generated = list(self.iter_queries(preferences))
+        queries = generated
+        repeat = c.REPEAT_QUERIES or c.CACHE_REPLAY_ONLY
+
+        # Remove previously searched queries if necessary
+        if not repeat:
+            indexed = get_indexed_data(c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION)
+            queries = indexed.filter_new_queries(generated, c.QUERY_EXPIRY)
+
+        # Merge and split the remaining queries based on past results
+        if c.ADAPTIVE_QUERIES:
+            planner = QueryPlanner(c.YIELD_STATS_LOCATION, c.SPARSE_QUERY_RESULTS,
+                                   c.MAX_MERGED_YEARS, c.QUERY_SPLIT_TERMS)
+            searched = set(generated).difference(queries)
+            queries = planner.plan(generated, searched)
+            if not repeat:
+                queries = indexed.filter_new_queries(queries, c.QUERY_EXPIRY)
+        return list(queries)
+
+    def iter_queries(self, preferences):
+        """
+        Yields the search terms for every combination of user preferences.
+
+        Queries are yielded one at a time, in order of position, then
+        location, then years of experience, without being filtered.
+
+        Parameter preferences: A dictionary of user search preferences.
+        Precondition: preferences is generated by 
+        search_for_profiles.load_preferences() and is based on a consts.py 
+        configuration which follows the rules outlined in that file.
+        """
         for pos in preferences["position"]:
             for loc in preferences["location"]:
                 if preferences["exp_op"] == ">":
-                    for years in list(range(int(preferences["exp_num"]), 31)):
+                    for years in range(int(preferences["exp_num"]), 31):
                         s = ""
                         if years != 1: s = "s"
-                        queries.append('site:linkedin.com/in intitle:("'+loc+
-                                       '") AND ("'+pos+'") AND ("'+
-                                       str(years)+' year' + s + '")')
+                        yield build_query(pos, loc, str(years) + ' year' + s)
                 elif preferences["exp_op"] == "<":
-                    for years in list(range(0, int(preferences["exp_num"]))):
+                    for years in range(0, int(preferences["exp_num"])):
                         s = ""
                         if years != 1: s = "s"
                         if years == 0:
-                            queries.append('site:linkedin.com/in intitle:("'+loc+
-                                       '") AND ("'+pos
-                                       +'") -"year" -"years"')
+                            yield build_query(pos, loc, "")
                         else:
-                            queries.append('site:linkedin.com/in intitle:("'+loc+
-                                       '") AND ("'+pos+'") AND ("'+
-                                       str(years)+' year' + s + '")')
+                            yield build_query(pos, loc, str(years) + ' year' + s)
                 elif preferences["exp_op"] == "=":
-                    s = ""
-                    if preferences["exp_num"] != 1: s = "s"
-                    queries.append('site:linkedin.com/in intitle:("'+loc+
-                                    '") AND ("'+pos+'") AND ("'+
-                                        str(preferences["exp_num"])+' year")')
-                    
-        # Remove previously searched queries if necessary
-        if c.REPEAT_QUERIES == False:
-            indexed = IndexedData(c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION)
-            temp = queries.copy()
-            for query in temp:
-                if indexed.check_dup_query(query):
-                    queries.remove(query)
-        return queries
+                    yield build_query(pos, loc, str(preferences["exp_num"]) + ' year')
 
-    def search(self, terms):
+    def search(self, terms, sink=None, result_filter=None):
         """
         Searches google for terms as per user preferences in consts.py.
 
-        Uses the list of terms from generate urls to search google until
-        the daily free API request limit is reached. Records client profiles
-        in a pandas DataFrame that includes the page Title, Url, and Snippets.
-        After using a search query from terms, it records it so it doesnt get
-        used again later. As it compiles the list of clients, the method checks 
-        for and removes any previously indexed profiles from the DataFrame. The 
-        method stops when it encounters an error from the API, either returning
-        the error code, or in the case of the API request limit filling up, it
-        returns a message signaling that.
+        Collects every batch of new profiles from iter_search into a single
+        pandas DataFrame that includes the page Title, Url, and Snippets.
+        Each page of results is written to sink as soon as it has been
+        checked. Callers that do not need every result at once should use
+        iter_search instead, so that the results of a whole run are never
+        held in memory.
 
         Returns: A list of length 2 where the first element is a pandas DataFrame
         that contains new profile information, and the second element is an error 
@@ -114,65 +171,331 @@ class GoogleSearchAPI:
         Parameter terms: The list of terms used to search Google.
         Precondition: terms is made up of Strings that represent Google 
         search terms.
+
+        Parameter sink: Where each page of results is saved.
+        Precondition: sink is a ResultSink, or None.
+
+        Parameter result_filter: The rules each page of results must pass.
+        Precondition: result_filter is a ResultFilter, or None.
+        """
+        batches = []
+        for batch in self.iter_search(terms, result_filter):
+            if sink is not None:
+                sink.write(batch)
+            batches.append(batch)
+
+        # Create and return data frame
+        df = pd.concat(batches, ignore_index=True) if batches else empty_results()
+        lst = [df, self.error]
+        return lst
+
+    def iter_search(self, terms, result_filter=None, per_term=False):
         """
-        # Set up DataFrame
-        df = pd.DataFrame()
-        titles = []
-        links = []
-        snippets = []
+        Searches google for terms, yielding the new profiles as they are found.
+
+        Uses the list of terms from generate urls to search google until
+        the daily free API request limit is reached. Yields client profiles
+        in pandas DataFrames that include the page Title, Url, and Snippets,
+        one for each page of results, or one for each term if per_term is
+        True. Pages with no new profiles are skipped.
+        After receiving every page of a search query from terms, it records it
+        so it doesnt get used again later. Queries that were stopped part of the
+        way through are recorded in a QueryCursors, and are resumed from their
+        first missing page, before any other query, the next time they are 
+        searched. Queries whose pages stop yielding enough new profiles, as per
+        c.MIN_PAGE_YIELD, are treated as finished early. Rather than searching
+        terms in a random order, a QueryScheduler orders them by the number of
+        new profiles they are expected to return per request, and plans each
+        batch of terms from what is left of c.DAILY_REQUEST_BUDGET once the
+        requests sent for the batches before it are known. No more requests
+        than the budget allows are sent, and terms keep being searched in
+        that order until it runs out. As it
+        yields the clients, the method checks for and removes any previously
+        indexed profiles, passes each page through result_filter, if there
+        is one, and parses the fields of each profile with extract_fields if
+        c.EXTRACT_FIELDS is True. Pages are requested concurrently using
+        fetch_all, c.SEARCH_TERM_BATCH terms at a time, so that only the
+        pages of those terms are held at once, but are checked for duplicates
+        in the same order as terms. The method stops sending requests when it encounters
+        an error from the API. Once every batch has been yielded, or the
+        generator is closed, the indexes are saved and self.error is set to
+        the error code, or in the case of the API request limit filling up, 
+        a message signaling that. If c.CACHE_REPLAY_ONLY is True, results
+        are served from the response cache only, and are not checked against or
+        added to the indexes.
+
+        Parameter terms: The list of terms used to search Google.
+        Precondition: terms is made up of Strings that represent Google 
+        search terms.
 
+        Parameter result_filter: The rules each page of results must pass.
+        Precondition: result_filter is a ResultFilter, or None.
+
+        Parameter per_term: Whether to yield each term's results at once.
+        Precondition: per_term is a bool.
+        """
+        self.error = ""
         er_msg = ""
 
-        indexed = IndexedData(c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION)
-        code = ""
-        brk = False
+        if c.CACHE_REPLAY_ONLY:
+            # Replayed profiles were indexed when they were first received
+            indexed = IndexedData(None, None)
+            cursors = QueryCursors(None)
+        else:
+            indexed = get_indexed_data(c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION)
+            cursors = QueryCursors(c.QUERY_CURSOR_LOCATION)
+        policy = YieldPolicy(c.YIELD_STATS_LOCATION, c.MIN_PAGE_YIELD,
+                             c.PAGE_WAVE_SIZE, indexed)
+        scheduler = QueryScheduler(policy.stats, c.REQUEST_USAGE_LOCATION,
+                                   c.DAILY_REQUEST_BUDGET)
+        # Shuffle so that queries with equal estimates are searched in any order
         random.shuffle(terms)
-        for term in terms:
-            num_results = 100
-            start = 1
-            while num_results > start:
-                url = f"https://www.googleapis.com/customsearch/v1?key="
-                url = url + f"{self.key}&cx={self.id}&q={term}&start={start}"
-                data = requests.get(url).json()
-                
-                # Look for error
-                if data.get("error") is not None:
-                    brk = True
-                    error = data.get("error")
-                    code = error.get("code")
+        if not c.CACHE_REPLAY_ONLY:
+            # Forget unfinished queries that were replanned into other queries
+            cursors.prune_cursors(terms)
+            terms = scheduler.rank(terms, cursors.cursors)
+        sent = self.requests_sent
+        code = None
+        try:
+            while terms:
+                limit = None
+                if c.CACHE_REPLAY_ONLY:
+                    batch = terms[:c.SEARCH_TERM_BATCH]
+                else:
+                    limit = scheduler.remaining_budget() - (self.requests_sent - sent)
+                    if limit <= 0:
+                        er_msg = "Daily request budget reached."
+                        break
+                    # Always search the best term, as its cost is only an estimate
+                    batch = scheduler.schedule(terms, cursors.cursors, limit) or terms[:1]
+                    batch = batch[:c.SEARCH_TERM_BATCH]
+                terms = [term for term in terms if term not in batch]
+                searched, code = asyncio.run(self.fetch_all(batch, cursors.cursors,
+                                                            policy, limit))
+                for term, pages, next_start, num_results in searched:
+                    found = 0
+                    batches = []
+                    for data in pages:
+                        if data.get("items") is not None:
+                            page = self.check_page(data.get("items"), indexed)
+                            found += len(page)
+                            if result_filter is not None:
+                                page = result_filter.apply(page)
+                            if page.empty:
+                                continue
+                            if c.EXTRACT_FIELDS:
+                                page = extract_fields(page)
+                            if per_term:
+                                batches.append(page)
+                            else:
+                                yield page
+                    if batches:
+                        yield pd.concat(batches, ignore_index=True)
+                    # Index search query once all of its pages have been received
+                    if next_start >= num_results:
+                        indexed.add_indexed_query(term, found)
+                        cursors.remove_cursor(term)
+                    elif next_start > 1:
+                        cursors.set_cursor(term, next_start, num_results)
+                if code is not None:
                     break
+        finally:
+            if code is not None:
+                if code != 429:
+                    er_msg = "Google API Error " + str(code)
+                else:
+                    er_msg = "API request limit reached."
+            self.error = er_msg
 
-                # Get search result data
-                search_info = data.get("searchInformation")
+            if not c.CACHE_REPLAY_ONLY:
+                indexed.save_indexed_queries(c.QUERY_EXPIRY)
+                indexed.save_indexed_profiles()
+                cursors.save_cursors()
+                policy.save_stats()
+                scheduler.record_usage(self.requests_sent - sent)
+                scheduler.save_usage()
+                if self.cache is not None:
+                    self.cache.save()
+
+    def check_page(self, items, indexed):
+        """
+        Checks a page of results against the index, and indexes its new
+        profiles.
+
+        The whole page is checked at once, by canonical url, so every link
+        to a profile is one result.
+
+        Returns: A pandas DataFrame of the Title, Link, and Snippets of each
+        new profile on the page.
+
+        Parameter items: The results on the page.
+        Precondition: items is the list of items of a Google API response.
+
+        Parameter indexed: The index that results are checked against.
+        Precondition: indexed is an IndexedData object.
+        """
+        page_links = [profile_key(result.get("link")) for result in items]
+        dups = indexed.check_dup_profiles(page_links)
+        new = []
+        page = {"Title": [], "Link": [], "Snippets": []}
+        for result, link, dup in zip(items, page_links, dups):
+            if not dup and link not in new:
+                new.append(link)
+                page["Title"].append(result.get("title"))
+                page["Link"].append(link)
+                page["Snippets"].append(result.get("snippet"))
+        indexed.add_indexed_profiles(new)
+        return pd.DataFrame(page)
+
+    def fetch_page(self, term, start):
+        """
+        Requests a single page of results from the Custom Search API.
+
+        Only the fields in RESULT_FIELDS are requested, so metadata such
+        as pagemaps is not downloaded or decoded. Pages in self.cache are
+        returned without sending a request. If c.CACHE_REPLAY_ONLY is True,
+        requests are never sent, and pages missing from the cache are 
+        returned as empty.
+
+        Returns: A dictionary of the decoded JSON response.
+
+        Parameter term: The term being searched.
+        Precondition: term is a String that represents a Google search term.
+
+        Parameter start: The index of the first result on the page.
+        Precondition: start is an int in 1, 11, ..., 91.
+        """
+        if self.cache is not None:
+            data = self.cache.get(term, start, c.CACHE_REPLAY_ONLY)
+            if data is not None:
+                return data
+        if c.CACHE_REPLAY_ONLY:
+            return {"searchInformation": {"totalResults": "0"}}
+
+        params = {"key": self.key, "cx": self.id, "q": term, "start": start,
+                  "fields": RESULT_FIELDS}
+        with self.lock:
+            self.requests_sent += 1
+        data = self.session.get_json(params)
+        if self.cache is not None and data.get("error") is None:
+            self.cache.put(term, start, data)
+        return data
+
+    async def fetch_all(self, terms, resume=None, policy=None, limit=None):
+        """
+        Concurrently fetches every page of results for every term.
+
+        At most c.SEARCH_CONCURRENCY requests are in flight at once. The
+        first page of each term is requested to learn its totalResults, 
+        after which the remaining pages of that term are requested together.
+        Terms in resume skip straight to their first missing page. If a policy
+        is given, the remaining pages are instead requested policy.wave_size at
+        a time, and a term is stopped once a batch of its pages yields too
+        few new profiles. Once the API returns an error, no further requests are sent, but requests 
+        that are already in flight are allowed to finish. No more than limit
+        requests are sent, and terms whose pages could not be requested
+        within it are reported as unfinished, as they are after an error.
+
+        Returns: A tuple of length 2 where the first element is a list of 
+        (term, pages, next_start, num_results) tuples, in the same order as 
+        terms, for every term that had at least one request sent, and the 
+        second element is the first error code returned by the API, or None.
+        next_start is the start index of the first page of the term that was
+        not received, and num_results is the number of results of the term,
+        so the term is finished when next_start >= num_results. Terms that 
+        were stopped by policy are reported with num_results equal to 
+        next_start.
+
+        Parameter terms: The list of terms used to search Google.
+        Precondition: terms is made up of Strings that represent Google 
+        search terms.
+
+        Parameter resume: The progress of unfinished terms.
+        Precondition: resume is a dictionary that maps terms to 
+        (next_start, num_results) tuples, as in QueryCursors, or None.
+
+        Parameter policy: The rule used to stop paging through a term early.
+        Precondition: policy is a YieldPolicy object, or None.
+
+        Parameter limit: The most requests that may be sent.
+        Precondition: limit is an int >= 0, or None for no limit.
+        """
+        if resume is None:
+            resume = {}
+        semaphore = asyncio.Semaphore(c.SEARCH_CONCURRENCY)
+        errors = []
+        sent = self.requests_sent
+        in_flight = [0]
+
+        async def fetch(term, start):
+            # Returns the page, or None if the request was never sent
+            async with semaphore:
+                if errors:
+                    return None
+                # Pages in flight may be cached, but are counted until they return
+                if limit is not None and self.requests_sent - sent + in_flight[0] >= limit:
+                    return None
+                in_flight[0] += 1
+                try:
+                    data = await asyncio.to_thread(self.fetch_page, term, start)
+                finally:
+                    in_flight[0] -= 1
+            if data.get("error") is not None:
+                errors.append(data.get("error").get("code"))
+            return data
+
+        async def fetch_term(term):
+            pages = []
+            if term in resume:
+                start, num_results = resume[term]
+            else:
+                first = await fetch(term, 1)
+                if first is None:
+                    return None
+                if first.get("error") is not None:
+                    return (term, [], 1, 100)
+
+                pages.append(first)
+                start = 11
+                num_results = 100
+                search_info = first.get("searchInformation")
                 if search_info is not None:
                     total_results = search_info.get("totalResults")
                     if total_results is not None:
                         num_results = min(100, int(total_results))
-                start += 10
-
-                if data.get("items") is not None:
-                    for result in data.get("items"):
-                        if not indexed.check_dup_profile(result.get("link")):
-                            indexed.add_indexed_profile(result.get("link"))
-                            titles.append(result.get("title"))
-                            links.append(result.get("link"))
-                            snippets.append(result.get("snippet"))
-            # Index search query
-            indexed.add_indexed_query(term)
-            if brk:
-                if code != 429:
-                    er_msg = "Google API Error " + str(code)
-                else:
-                    er_msg = "API request limit reached."
-                break
+                if policy is not None and not policy.keep_paging(term, [first]):
+                    return (term, pages, start, start)
 
-        indexed.save_indexed_queries()
-        indexed.save_indexed_profiles()
-        
-        # Create and return data frame
-        df["Title"] = titles
-        df["Link"] = links
-        df["Snippets"] = snippets
+            sent = len(pages) > 0
+            starts = list(range(start, num_results, 10))
+            wave = len(starts)
+            if policy is not None and policy.threshold > 0:
+                wave = policy.wave_size
+            next_start = start
+            while starts:
+                batch = await asyncio.gather(*[fetch(term, page_start) 
+                                               for page_start in starts[:wave]])
+                starts = starts[wave:]
+                received = [data for data in batch 
+                            if data is not None and data.get("error") is None]
+                sent = sent or any(data is not None for data in batch)
+                pages.extend(received)
+                keep = policy is None or policy.keep_paging(term, received)
+                if len(received) < len(batch):
+                    for data in batch:
+                        if data is None or data.get("error") is not None:
+                            break
+                        next_start += 10
+                    break
+                next_start += 10 * len(batch)
+                if not keep:
+                    return (term, pages, next_start, next_start)
 
-        lst = [df, er_msg]
-        return lst
+            if not sent:
+                return None
+            return (term, pages, next_start, num_results)
+
+        searched = await asyncio.gather(*[fetch_term(term) for term in terms])
+        searched = [result for result in searched if result is not None]
+        code = errors[0] if errors else None
+        return (searched, code)
@@ -5,31 +5,126 @@ This module allows the program to retrieve and record information
 about profiles that have been indexed and query terms that have been
 searched in the past. This ensures that the application does not return
 repreat profiles or unnecessarily rely on search terms that have
-recently been used.
+recently been used. Indexes are loaded the first time they are used, and
+get_indexed_data shares one IndexedData object for each pair of files
+across the program, so the same index is not loaded twice.
 
 Author: Ethan Baker
 """
+import os
+import time
 import pickle
+import consts as c
+from search_tool.query_codec import QueryCodec
+from search_tool.file_lock import FileLock, atomic_open
+from search_tool.profile_url import profile_key
+
+# IndexedData objects shared by get_indexed_data
+SHARED = {}
+
+# The format of saved profile indexes, see load_indexed_profiles
+PROFILE_FORMAT = 1
+
+def get_indexed_data(profile_file, query_file):
+    """
+    Returns: The shared IndexedData object for profile_file and query_file.
+
+    The object is created the first time it is asked for. Its class depends
+    on c.INDEX_BACKEND: a SQLiteIndexedData stored at c.INDEX_DATABASE_LOCATION
+    for "sqlite", a CompactIndexedData stored at 
+    c.COMPACT_PROFILE_INDEX_LOCATION for "compact", a MmapIndexedData stored 
+    at c.MMAP_PROFILE_INDEX_LOCATION for "mmap", a JournaledIndexedData for 
+    "journal", a ShardedIndexedData stored in c.SHARD_DIRECTORY for 
+    "sharded", and an IndexedData otherwise. If c.USE_BLOOM_FILTER is True, 
+    it is wrapped in a BloomIndexedData whose filter is saved at 
+    c.BLOOM_FILTER_LOCATION. On later calls, any index whose file has been 
+    changed by something else since it was loaded or saved, and that has no 
+    unsaved changes, is reloaded the next time it is used.
+
+    Parameter profile_file: the filepath to the profile index.
+    Precondition: profile_file is a String containing a valid .pkl filepath.
+
+    Parameter query_file: the filepath to the query index.
+    Precondition: query_file is a String containing a valid .pkl filepath.
+    """
+    key = (c.INDEX_BACKEND, c.USE_BLOOM_FILTER, profile_file, query_file)
+    if key not in SHARED:
+        # Backends are imported here as they depend on this module
+        if c.INDEX_BACKEND == "sqlite":
+            from search_tool.sqlite_index import SQLiteIndexedData
+            SHARED[key] = SQLiteIndexedData(profile_file, query_file,
+                                            c.INDEX_DATABASE_LOCATION,
+                                            c.INDEX_BATCH_SIZE)
+        elif c.INDEX_BACKEND == "compact":
+            from search_tool.compact_index import CompactIndexedData
+            SHARED[key] = CompactIndexedData(profile_file, query_file,
+                                             c.COMPACT_PROFILE_INDEX_LOCATION,
+                                             c.COMPACT_EXACT_MATCH)
+        elif c.INDEX_BACKEND == "mmap":
+            from search_tool.mmap_index import MmapIndexedData
+            SHARED[key] = MmapIndexedData(profile_file, query_file,
+                                          c.MMAP_PROFILE_INDEX_LOCATION,
+                                          c.MMAP_MERGE_THRESHOLD)
+        elif c.INDEX_BACKEND == "journal":
+            from search_tool.journal_index import JournaledIndexedData
+            SHARED[key] = JournaledIndexedData(profile_file, query_file,
+                                               c.JOURNAL_COMPACT_SIZE)
+        elif c.INDEX_BACKEND == "sharded":
+            from search_tool.sharded_index import ShardedIndexedData
+            SHARED[key] = ShardedIndexedData(profile_file, query_file,
+                                             c.SHARD_DIRECTORY, c.SHARD_BITS,
+                                             c.SHARD_MEMORY_LIMIT)
+        else:
+            SHARED[key] = IndexedData(profile_file, query_file)
+        if c.USE_BLOOM_FILTER:
+            from search_tool.bloom_filter import BloomIndexedData
+            SHARED[key] = BloomIndexedData(SHARED[key], c.BLOOM_FILTER_LOCATION,
+                                           c.BLOOM_ERROR_RATE)
+    else:
+        SHARED[key].refresh()
+    return SHARED[key]
+
+def file_version(filepath):
+    """
+    Returns: A tuple (modified time, size) identifying the current contents
+    of filepath, or None if it does not exist.
+
+    Parameter filepath: The path to a file.
+    Precondition: filepath is a String, or None.
+    """
+    try:
+        stat = os.stat(filepath)
+        return (stat.st_mtime_ns, stat.st_size)
+    except (OSError, TypeError):
+        return None
 
 class IndexedData():
     """
     A class representing data that has previously been recorded by the application.
 
-    Contains properties profiles and queries, which represent alphabetically sorted
-    lists of previously indexed profiles and previously used search queries. Also 
-    includes properties profile_file and query_file, which are the String filepaths
-    to the indexes This class contains methods to load, check for duplicates, 
-    add to, and save both of the lists.
+    Contains properties profiles and queries, which represent a set of previously
+    indexed profiles and an alphabetically sorted list of previously used search
+    queries. Also includes properties profile_file and query_file, which are the
+    String filepaths to the indexes This class contains methods to load, check for
+    duplicates, add to, and save both of the indexes. Each index is only loaded 
+    from its file the first time it is used. Queries are stored compressed 
+    by the QueryCodec codec, and the property query_records maps each 
+    compressed query to a tuple (searched, new), where searched is the time 
+    it was last searched, in seconds since the epoch, and new is the number 
+    of new profiles it returned then, or None if that is not known. Queries 
+    indexed before times were recorded are recorded as (0, None). LinkedIn
+    profiles are indexed by their canonical urls, so every link to the same
+    profile is a duplicate.
     """
 
     def __init__(self, profile_file, query_file):
         """
         Creates an Indexed Data Object.
 
-        This object contains two alphabetically sorted lists of strings 
-        that represent profiles (represented by self.profiles) and queries 
-        (represented by self.queries) which were indexed after running the 
-        program a previous time.
+        This object contains a set of strings that represent profiles 
+        (represented by self.profiles) and an alphabetically sorted list of 
+        strings that represent queries (represented by self.queries) which 
+        were indexed after running the program a previous time.
 
         Parameter profile_file: the filepath to the profile index.
         Precondition: profile_file is a String containing a valid .pkl filepath.
@@ -39,131 +134,319 @@ class IndexedData():
         """
         self.profile_file = profile_file
         self.query_file = query_file
-        self.profiles = self.load_indexed_profiles()
-        self.queries = self.load_indexed_queries()
+        self._profiles = None
+        self._query_records = None
+        self.codec = QueryCodec()
+        self.profiles_version = None
+        self.queries_version = None
+        self.profiles_dirty = False
+        self.queries_dirty = False
+        self.profiles_replaced = False
+        self.queries_replaced = False
+
+    @property
+    def profiles(self):
+        """
+        The set of indexed profiles, loaded on first use.
+        """
+        if self._profiles is None:
+            self.profiles_version = file_version(self.profile_file)
+            self._profiles = self.load_indexed_profiles()
+        return self._profiles
+
+    @profiles.setter
+    def profiles(self, profiles):
+        self._profiles = set(map(profile_key, profiles))
+        self.profiles_dirty = True
+        self.profiles_replaced = True
+
+    @property
+    def query_records(self):
+        """
+        The dictionary of compressed indexed queries and their records, 
+        loaded on first use.
+        """
+        if self._query_records is None:
+            self.queries_version = file_version(self.query_file)
+            self._query_records = self.load_indexed_queries()
+        return self._query_records
+
+    @property
+    def queries(self):
+        """
+        The sorted list of indexed queries, rebuilt from their compressed form.
+        """
+        return sorted(self.codec.decode(key) for key in self.query_records)
+
+    @queries.setter
+    def queries(self, queries):
+        records = {}
+        for query in queries:
+            records[self.codec.encode(query)] = self.query_record(query)
+        self._query_records = records
+        self.queries_dirty = True
+        self.queries_replaced = True
+
+    def refresh(self):
+        """
+        Forgets any loaded index whose file has changed since it was loaded
+        or saved, unless it has unsaved changes, so that it is reloaded on
+        next use.
+        """
+        if (self._profiles is not None and not self.profiles_dirty and
+                file_version(self.profile_file) != self.profiles_version):
+            self._profiles = None
+        if (self._query_records is not None and not self.queries_dirty and
+                file_version(self.query_file) != self.queries_version):
+            self._query_records = None
+
+    def saved_profiles_version(self):
+        """
+        Returns: A value identifying the saved profile index, which changes
+        whenever it is written.
+        """
+        return file_version(self.profile_file)
 
     def load_indexed_profiles(self):
         """
-        Loads the list of alphabetically sorted accounts from self.profile_file.
+        Loads the set of indexed accounts from self.profile_file.
+
+        Indexes are saved as a tuple (PROFILE_FORMAT, profiles), whose
+        profiles are already canonical and are loaded as they are. Indexes
+        saved before, as sets or alphabetically sorted lists, are also
+        accepted, and their profiles are made canonical as they are loaded,
+        until the index is next saved.
         """
         try:
             with open(self.profile_file, 'rb') as file:
-                return pickle.load(file)
+                profiles = pickle.load(file)
         except:
-            return []
+            return set()
+        if isinstance(profiles, tuple) and profiles[0] == PROFILE_FORMAT:
+            return profiles[1]
+        return set(map(profile_key, profiles))
         
     def check_dup_profile(self, profile):
         """
-        Checks for duplicate profiles using a recursive binary search algorithm.
+        Checks for duplicate profiles using a hash lookup.
         
         Returns: True if self.profiles contains profile, otherwise False.
 
         Parameter profile: the profile of the user that is being searched for.
         Precondition: profile is a String that represents a url. 
         """
-        left = 0
-        right = len(self.profiles) - 1
+        return profile_key(profile) in self.profiles
 
-        while left <= right:
-            mid = (left + right) // 2
-            value = self.profiles[mid]
+    def check_dup_profiles(self, profiles):
+        """
+        Checks a list of profiles for duplicates at once.
 
-            if value == profile: return True
-            elif value < profile: left = mid + 1
-            else: right = mid - 1
+        Returns: A list of bools, which are True where the profile at the
+        same position in profiles has been indexed.
 
-        return False
+        Parameter profiles: the profiles being searched for.
+        Precondition: profiles is a list of Strings that represent urls.
+        """
+        return [self.check_dup_profile(profile) for profile in profiles]
 
     def add_indexed_profile(self, profile):
         """
-        Adds a new profile url to its correct location in the sorted list.
-
-        Modifies self.profiles to add the url of the new profile
-        to its correct position based on alphabetical order.
+        Adds a new profile url to the index.
 
         Parameter profile: The profile being added.
-        Precondition: profile is a String that is not already in the list.
+        Precondition: profile is a String that is not already in the index.
         """
-        left = 0
-        right = len(self.profiles) - 1
+        self.profiles.add(profile_key(profile))
+        self.profiles_dirty = True
 
-        while left <= right:
-            mid = (left + right) // 2
-            value = self.profiles[mid]
+    def add_indexed_profiles(self, profiles):
+        """
+        Adds many profile urls to the index at once.
 
-            if value < profile:
-                left = mid + 1
-            else:
-                right = mid - 1
-        
-        self.profiles.insert(left, profile)
+        Parameter profiles: The profiles being added.
+        Precondition: profiles is an iterable of Strings.
+        """
+        self.profiles.update(map(profile_key, profiles))
+        self.profiles_dirty = True
 
     def save_indexed_profiles(self):
         """
-        Saves the updated list of indexed accounts to self.profile_file.
+        Saves the updated set of indexed accounts to self.profile_file.
+
+        The file is locked while it is saved, and if another process has
+        saved it since it was loaded, the profiles it added are merged in
+        first, unless the whole set has been replaced.
         """
-        with open(self.profile_file, 'wb') as file:
-            pickle.dump(self.profiles, file)
+        with FileLock(self.profile_file):
+            profiles = self.profiles
+            if (not self.profiles_replaced and
+                    file_version(self.profile_file) != self.profiles_version):
+                profiles.update(self.load_indexed_profiles())
+            with atomic_open(self.profile_file) as file:
+                pickle.dump((PROFILE_FORMAT, profiles), file)
+            self.profiles_version = file_version(self.profile_file)
+        self.profiles_dirty = False
+        self.profiles_replaced = False
     
     def load_indexed_queries(self):
         """
-        Loads the list of alphabetically sorted queries from self.query_file.
+        Loads the compressed queries and their records from self.query_file,
+        and the tables used to compress them into self.codec.
+
+        Indexes saved as sorted lists of queries, or as dictionaries of
+        queries and their records, are also accepted.
+
+        Returns: A dictionary that maps each compressed query to its record.
         """
         try:
             with open(self.query_file, 'rb') as file:
-                return pickle.load(file)
+                queries = pickle.load(file)
         except: 
-            return []
+            queries = []
+        if isinstance(queries, tuple):
+            positions, locations, buckets, records = queries
+            self.codec = QueryCodec(positions, locations, buckets)
+            return records
+        self.codec = QueryCodec()
+        if isinstance(queries, dict):
+            return {self.codec.encode(query): record
+                    for query, record in queries.items()}
+        return {self.codec.encode(query): (0, None) for query in queries}
+
+    def query_record(self, query):
+        """
+        Returns: The record of query, or (0, None) if it has not been indexed.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+        """
+        records = self.query_records
+        return records.get(self.codec.encode(query, False), (0, None))
+
+    def query_expired(self, query, max_age):
+        """
+        Returns: True if query was last searched more than max_age seconds
+        ago, otherwise False.
+
+        Parameter query: A query search term.
+        Precondition: query is a String in self.queries.
+
+        Parameter max_age: The age in seconds after which queries expire.
+        Precondition: max_age is a number >= 0, or None if queries never expire.
+        """
+        if max_age is None:
+            return False
+        return self.query_record(query)[0] <= time.time() - max_age
 
     def check_dup_query(self, query):
         """
-        Checks for duplicate queries using a recursive binary search algorithm.
+        Checks for duplicate queries by looking up their compressed form.
         
         Returns: True if self.queries contains query, otherwise False.
 
         Parameter query: A query search term.
         Precondition: query is a String that represents a valid query. 
         """
-        left = 0
-        right = len(self.queries) -1
+        records = self.query_records
+        key = self.codec.encode(query, False)
+        return key is not None and key in records
+
+    def filter_new_queries(self, queries, max_age=None):
+        """
+        Yields the queries that have not been indexed, or that have expired,
+        in order.
 
-        while left <= right:
-            mid = (left + right) // 2
-            value = self.queries[mid]
+        Parameter queries: The queries to filter.
+        Precondition: queries is an iterable of Strings.
 
-            if value == query: return True
-            elif value < query: left = mid + 1
-            else: right = mid - 1
+        Parameter max_age: The age in seconds after which queries expire.
+        Precondition: max_age is a number >= 0, or None if queries never expire.
+        """
+        for query in queries:
+            if not self.check_dup_query(query) or self.query_expired(query, max_age):
+                yield query
+
+    def searched_locations(self, position):
+        """
+        Lists where a position has been searched, and for which experience.
 
-        return False
+        Returns: A dictionary that maps each location position has been
+        searched in to the set of experience buckets searched there, like
+        "3 years", or "" for the query excluding any years of experience.
+        Queries merged or split by a QueryPlanner are not included.
 
-    def add_indexed_query(self, query):
+        Parameter position: The position that was searched for.
+        Precondition: position is a String.
         """
-        Adds a new query to its correct location in the sorted list.
+        records = self.query_records
+        position_id = self.codec.intern(0, position, False)
+        locations = {}
+        for key in records:
+            if not isinstance(key, str) and key[0] == position_id:
+                locations.setdefault(self.codec.locations[key[1]], set()).add(
+                    self.codec.buckets[key[2]])
+        return locations
 
-        Modifies self.queries to add the new query search term
-        to its correct position based on alphabetical order.
+    def add_indexed_query(self, query, new=None):
+        """
+        Adds a new query to the index, and records that it was searched now.
+
+        Queries that are already in the index, because they expired and were
+        searched again, only have their record updated.
 
         Parameter query: A query search term.
-        Precondition: query is a String that is not already in the list.
+        Precondition: query is a String.
+
+        Parameter new: The number of new profiles the query returned.
+        Precondition: new is an int >= 0, or None if it is not known.
         """
-        left = 0
-        right = len(self.queries) - 1
+        records = self.query_records
+        records[self.codec.encode(query)] = (time.time(), new)
+        self.queries_dirty = True
 
-        while left <= right:
-            mid = (left + right) // 2
-            value = self.queries[mid]
+    def save_indexed_queries(self, max_age=None):
+        """
+        Saves the compressed queries, their records, and the tables used to
+        compress them to self.query_file.
 
-            if value < query:
-                left = mid + 1
-            else:
-                right = mid - 1
-        
-        self.queries.insert(left, query)
+        The file is locked while it is saved, and if another process has
+        saved it since it was loaded, its queries are merged in first, as in
+        merge_saved_queries, unless the whole index has been replaced. 
+        Queries that have expired are then evicted from the index, as they
+        would be searched again anyway, and the tables are rebuilt without
+        anything only they used.
 
-    def save_indexed_queries(self):
+        Parameter max_age: The age in seconds after which queries expire.
+        Precondition: max_age is a number >= 0, or None if queries never expire.
         """
-        Saves the updated list of indexed queries to self.query_file.
+        with FileLock(self.query_file):
+            records = self.query_records
+            if (not self.queries_replaced and
+                    file_version(self.query_file) != self.queries_version):
+                self.merge_saved_queries()
+            if max_age is not None:
+                cutoff = time.time() - max_age
+                codec = QueryCodec()
+                records = {codec.encode(self.codec.decode(key)): record
+                           for key, record in records.items() if record[0] > cutoff}
+                self.codec = codec
+                self._query_records = records
+            with atomic_open(self.query_file) as file:
+                pickle.dump((self.codec.positions, self.codec.locations,
+                             self.codec.buckets, records), file)
+            self.queries_version = file_version(self.query_file)
+        self.queries_dirty = False
+        self.queries_replaced = False
+
+    def merge_saved_queries(self):
+        """
+        Merges the queries saved in self.query_file into self.query_records.
+
+        Queries in both keep the record of whichever was searched last.
         """
-        with open(self.query_file, 'wb') as file:
-            pickle.dump(self.queries, file)
\ No newline at end of file
+        saved = IndexedData(self.profile_file, self.query_file)
+        records = self.query_records
+        for key, record in saved.query_records.items():
+            key = self.codec.encode(saved.codec.decode(key))
+            if key not in records or records[key][0] < record[0]:
+                records[key] = record
@@ -0,0 +1,282 @@
+"""
+The Journaled Index module of the LinkedIn Search Tool.
+
+This module keeps the profile and query indexes in their usual .pkl files,
+but records new profiles and queries in an append-only log next to each
+index as they are indexed, instead of rewriting the whole index every time
+it is saved. GoogleSearchAPI.search adds the new profiles of each page at
+once, so each page is written to the log as soon as it has been checked,
+and a crash part of the way through a search loses at most the page being
+checked. Logs are replayed on top of their index when it is loaded, and
+are compacted into it once they grow past a given size. Appends and
+compactions hold the index's FileLock, so several processes can share
+the same logs.
+
+Author: Ethan Baker
+"""
+import os
+import pickle
+from search_tool.indexed_data import IndexedData, file_version
+from search_tool.file_lock import FileLock
+from search_tool.profile_url import profile_key
+
+def append_log(log_file, entries):
+    """
+    Appends a record of entries to the end of log_file.
+
+    Parameter log_file: the filepath to the log.
+    Precondition: log_file is a String containing a valid filepath.
+
+    Parameter entries: The new profiles or queries.
+    Precondition: entries is a list of Strings.
+    """
+    with open(log_file, 'ab') as file:
+        pickle.dump(entries, file)
+        file.flush()
+        os.fsync(file.fileno())
+
+def replay_log(log_file, repair=False):
+    """
+    Reads every record in log_file.
+
+    A record that was only partly written ends the log. It may still be
+    being written by another process, so it is only cut off if repair is
+    True, which the caller must only ask for while holding the lock on the
+    log's index, so that later records are appended after the last complete
+    one.
+
+    Returns: A list of the Strings in every record, in the order they
+    were appended.
+
+    Parameter log_file: the filepath to the log.
+    Precondition: log_file is a String containing a valid filepath.
+
+    Parameter repair: Whether to cut off a partly written record.
+    Precondition: repair is a bool.
+    """
+    entries = []
+    end = 0
+    try:
+        with open(log_file, 'rb') as file:
+            while True:
+                entries.extend(pickle.load(file))
+                end = file.tell()
+    except:
+        pass
+    if repair and os.path.exists(log_file) and os.path.getsize(log_file) > end:
+        with open(log_file, 'r+b') as file:
+            file.truncate(end)
+    return entries
+
+class JournaledIndexedData(IndexedData):
+    """
+    A class representing indexed data that is saved through append-only logs.
+
+    Contains the properties profile_log and query_log, which are the String
+    filepaths to the logs of the profile and query indexes, and compact_size,
+    which is the size in bytes a log must reach before it is compacted into
+    its index. The versions used by refresh cover both an index and its log.
+    log_ends maps each log to its size when this object last wrote to it.
+    Logs are only read when they are loaded, and are only cut short while
+    their index is locked.
+    """
+
+    def __init__(self, profile_file, query_file, compact_size):
+        """
+        Creates a JournaledIndexedData object.
+
+        Parameter profile_file: the filepath to the profile index.
+        Precondition: profile_file is a String containing a valid .pkl filepath.
+
+        Parameter query_file: the filepath to the query index.
+        Precondition: query_file is a String containing a valid .pkl filepath.
+
+        Parameter compact_size: The log size in bytes that triggers compaction.
+        Precondition: compact_size is an int >= 0.
+        """
+        super().__init__(profile_file, query_file)
+        self.profile_log = profile_file + ".log"
+        self.query_log = query_file + ".log"
+        self.compact_size = compact_size
+        self.log_ends = {}
+
+    def journal_version(self, filepath, log_file):
+        """
+        Returns: A tuple identifying the contents of an index and its log.
+
+        Parameter filepath: the filepath to the index.
+        Precondition: filepath is a String.
+
+        Parameter log_file: the filepath to the log of the index.
+        Precondition: log_file is a String.
+        """
+        return (file_version(filepath), file_version(log_file))
+
+    def append_record(self, log_file, entries):
+        """
+        Appends a record of entries to log_file.
+
+        If the log has changed since this object last wrote to it, it is
+        replayed first to cut off any record left partly written by a
+        process that stopped. The caller must hold the lock on the log's
+        index.
+
+        Parameter log_file: the filepath to the log.
+        Precondition: log_file is self.profile_log or self.query_log.
+
+        Parameter entries: The new profiles or query records.
+        Precondition: entries is a list.
+        """
+        size = os.path.getsize(log_file) if os.path.exists(log_file) else 0
+        if size != self.log_ends.get(log_file, 0):
+            replay_log(log_file, True)
+        append_log(log_file, entries)
+        self.log_ends[log_file] = os.path.getsize(log_file)
+
+    def saved_profiles_version(self):
+        """
+        Returns: A tuple identifying the saved profile index and its log.
+        """
+        return self.journal_version(self.profile_file, self.profile_log)
+
+    @property
+    def profiles(self):
+        """
+        The set of indexed profiles, with the log replayed, loaded on first use.
+        """
+        if self._profiles is None:
+            self.profiles_version = self.journal_version(self.profile_file,
+                                                         self.profile_log)
+            self._profiles = self.load_indexed_profiles()
+            self._profiles.update(replay_log(self.profile_log))
+        return self._profiles
+
+    @profiles.setter
+    def profiles(self, profiles):
+        self._profiles = set(map(profile_key, profiles))
+        self.profiles_dirty = True
+        self.profiles_replaced = True
+
+    @property
+    def query_records(self):
+        """
+        The dictionary of compressed indexed queries and their records, with
+        the log replayed, loaded on first use.
+        """
+        if self._query_records is None:
+            self.queries_version = self.journal_version(self.query_file,
+                                                        self.query_log)
+            records = self.load_indexed_queries()
+            for query, searched, new in replay_log(self.query_log):
+                records[self.codec.encode(query)] = (searched, new)
+            self._query_records = records
+        return self._query_records
+
+    def refresh(self):
+        """
+        Forgets any loaded index whose file or log has changed since it was
+        loaded or written, unless it has unsaved changes.
+        """
+        if (self._profiles is not None and not self.profiles_dirty and
+                self.journal_version(self.profile_file, self.profile_log) !=
+                self.profiles_version):
+            self._profiles = None
+        if (self._query_records is not None and not self.queries_dirty and
+                self.journal_version(self.query_file, self.query_log) !=
+                self.queries_version):
+            self._query_records = None
+
+    def add_indexed_profile(self, profile):
+        """
+        Adds a new profile url to the index and appends it to the log.
+
+        Parameter profile: The profile being added.
+        Precondition: profile is a String that is not already in the index.
+        """
+        self.add_indexed_profiles([profile])
+
+    def add_indexed_profiles(self, profiles):
+        """
+        Adds many profile urls to the index and appends them to the log as
+        a single record.
+
+        Parameter profiles: The profiles being added.
+        Precondition: profiles is an iterable of Strings.
+        """
+        profiles = dict.fromkeys(map(profile_key, profiles))
+        profiles = [profile for profile in profiles if profile not in self.profiles]
+        if not profiles:
+            return
+        self.profiles.update(profiles)
+        with FileLock(self.profile_file):
+            self.append_record(self.profile_log, profiles)
+        if not self.profiles_dirty:
+            self.profiles_version = self.journal_version(self.profile_file,
+                                                         self.profile_log)
+
+    def save_indexed_profiles(self):
+        """
+        Compacts the log into self.profile_file if it has grown past
+        self.compact_size bytes, or if the whole index has been replaced.
+
+        Profiles appended to the log by other processes are replayed before
+        it is compacted, unless the whole index has been replaced.
+        """
+        size = os.path.getsize(self.profile_log) if os.path.exists(self.profile_log) else 0
+        if self.profiles_dirty or size > self.compact_size:
+            with FileLock(self.profile_file):
+                if not self.profiles_replaced:
+                    self.profiles.update(replay_log(self.profile_log, True))
+                super().save_indexed_profiles()
+                if os.path.exists(self.profile_log):
+                    os.remove(self.profile_log)
+                self.profiles_version = self.journal_version(self.profile_file,
+                                                             self.profile_log)
+
+    def add_indexed_query(self, query, new=None):
+        """
+        Adds a new query to the index and appends it to the log, along with
+        its record.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+
+        Parameter new: The number of new profiles the query returned.
+        Precondition: new is an int >= 0, or None if it is not known.
+        """
+        dirty = self.queries_dirty
+        super().add_indexed_query(query, new)
+        self.queries_dirty = dirty
+        with FileLock(self.query_file):
+            self.append_record(self.query_log, [(query,) + self.query_record(query)])
+        if not self.queries_dirty:
+            self.queries_version = self.journal_version(self.query_file,
+                                                        self.query_log)
+
+    def save_indexed_queries(self, max_age=None):
+        """
+        Compacts the log into self.query_file if it has grown past
+        self.compact_size bytes, or if the whole index has been replaced.
+        Expired queries are evicted when the log is compacted.
+
+        Queries appended to the log by other processes are replayed before
+        it is compacted, keeping the latest record of each, unless the whole
+        index has been replaced.
+
+        Parameter max_age: The age in seconds after which queries expire.
+        Precondition: max_age is a number >= 0, or None if queries never expire.
+        """
+        size = os.path.getsize(self.query_log) if os.path.exists(self.query_log) else 0
+        if self.queries_dirty or size > self.compact_size:
+            with FileLock(self.query_file):
+                if not self.queries_replaced:
+                    records = self.query_records
+                    for query, searched, new in replay_log(self.query_log, True):
+                        key = self.codec.encode(query)
+                        if key not in records or records[key][0] < searched:
+                            records[key] = (searched, new)
+                super().save_indexed_queries(max_age)
+                if os.path.exists(self.query_log):
+                    os.remove(self.query_log)
+                self.queries_version = self.journal_version(self.query_file,
+                                                            self.query_log)
@@ -0,0 +1,283 @@
+"""
+The Memory-Mapped Index module of the LinkedIn Search Tool.
+
+This module stores the profile index in a versioned binary file that is
+opened with mmap and searched in place, so opening the index takes the same
+time no matter how many profiles it holds. The file is a 16 byte header,
+made up of the 6 byte magic string CNXIDX, a 2 byte format version, and an
+8 byte count, followed by the sorted 64-bit hashes of every profile's slug,
+all little-endian. Profiles added since the file was written are appended
+to a small segment file next to it as they are indexed, and are merged into
+the main file by a background thread once there are enough of them.
+
+Author: Ethan Baker
+"""
+import os
+import struct
+import threading
+import numpy as np
+from search_tool.indexed_data import IndexedData, file_version
+from search_tool.file_lock import FileLock
+from search_tool.compact_index import slug_hash, hash_profiles
+from search_tool.profile_url import profile_slug
+
+MAGIC = b"CNXIDX"
+VERSION = 1
+HEADER = struct.Struct("<6sHQ")
+
+def write_index_file(index_file, hashes):
+    """
+    Writes a sorted array of hashes to index_file in the binary index format.
+
+    The file is written next to index_file and then renamed over it, so
+    index_file is never left half written.
+
+    Parameter index_file: the filepath to the index.
+    Precondition: index_file is a String containing a valid filepath.
+
+    Parameter hashes: The hashes to write.
+    Precondition: hashes is a sorted numpy uint64 array with no repeats.
+    """
+    temp_file = index_file + ".tmp"
+    with open(temp_file, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(hashes)))
+        file.write(np.asarray(hashes, dtype="<u8").tobytes())
+    os.replace(temp_file, index_file)
+
+def open_index_file(index_file):
+    """
+    Opens an index file without reading its hashes into memory.
+
+    Returns: A read-only numpy array of the file's hashes, backed by mmap.
+
+    Parameter index_file: the filepath to the index.
+    Precondition: index_file is a String containing the filepath of a file
+    written by write_index_file.
+    """
+    with open(index_file, 'rb') as file:
+        magic, version, count = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported index file: " + index_file)
+    if count == 0:
+        return np.empty(0, dtype="<u8")
+    return np.memmap(index_file, dtype="<u8", mode='r',
+                     offset=HEADER.size, shape=(count,))
+
+class MmapIndexedData(IndexedData):
+    """
+    A class representing indexed data with a memory-mapped profile index.
+
+    Contains the property index_file, the String filepath to the binary
+    profile index, whose hashes are mapped into the property base. Profiles
+    added since index_file was written are kept in the set appended, and in
+    the segment file at index_file + ".append", until they are merged into
+    index_file. The merge runs in a background thread once merge_threshold
+    profiles have been appended. index_file is created from the .pkl
+    profile index at profile_file the first time it is opened. The query
+    index is the same as in IndexedData.
+    """
+
+    def __init__(self, profile_file, query_file, index_file, merge_threshold):
+        """
+        Creates a MmapIndexedData object.
+
+        Parameter profile_file: the filepath to the .pkl profile index.
+        Precondition: profile_file is a String containing a valid .pkl filepath.
+
+        Parameter query_file: the filepath to the query index.
+        Precondition: query_file is a String containing a valid .pkl filepath.
+
+        Parameter index_file: the filepath to the binary profile index.
+        Precondition: index_file is a String containing a valid filepath.
+
+        Parameter merge_threshold: The appended profiles that trigger a merge.
+        Precondition: merge_threshold is an int > 0.
+        """
+        super().__init__(profile_file, query_file)
+        self.index_file = index_file
+        self.append_file = index_file + ".append"
+        self.merge_threshold = merge_threshold
+        self.base = None
+        self.appended = set()
+        self.lock = threading.Lock()
+        self.merger = None
+
+    def open(self):
+        """
+        Maps self.index_file and reads the appended segment, if they are not
+        already open. Creates self.index_file from the .pkl profile index if
+        it does not exist yet.
+
+        The index file is locked while they are read, so a merge in another
+        process is never seen half done.
+        """
+        if self.base is not None:
+            return
+        with FileLock(self.index_file):
+            if not os.path.exists(self.index_file):
+                profiles = list(self.load_indexed_profiles())
+                write_index_file(self.index_file, np.unique(hash_profiles(profiles)))
+            with self.lock:
+                self.base = open_index_file(self.index_file)
+                try:
+                    appended = np.fromfile(self.append_file, dtype="<u8")
+                    self.appended = set(appended.tolist())
+                except OSError:
+                    self.appended = set()
+                self.profiles_version = self.saved_profiles_version()
+
+    def saved_profiles_version(self):
+        """
+        Returns: A tuple of the versions of the index and segment files,
+        which changes whenever either is written.
+        """
+        return (file_version(self.index_file), file_version(self.append_file))
+
+    @property
+    def profiles(self):
+        """
+        A sorted numpy array of every indexed profile hash.
+        """
+        self.open()
+        with self.lock:
+            new = np.fromiter(self.appended, dtype=np.uint64, count=len(self.appended))
+            return np.union1d(np.asarray(self.base), new)
+
+    @profiles.setter
+    def profiles(self, profiles):
+        self.wait_for_merge()
+        profiles = list(profiles)
+        with FileLock(self.index_file), self.lock:
+            self.base = None
+            write_index_file(self.index_file, np.unique(hash_profiles(profiles)))
+            if os.path.exists(self.append_file):
+                os.remove(self.append_file)
+            self.base = open_index_file(self.index_file)
+            self.appended = set()
+            self.profiles_version = self.saved_profiles_version()
+
+    def refresh(self):
+        """
+        Reopens the index if its files have changed since they were read,
+        which is cheap as nothing is read until used, unless a merge is
+        running. Appended profiles are already on disk, so none are lost.
+        The query index is forgotten as in IndexedData.refresh.
+        """
+        busy = self.merger is not None and self.merger.is_alive()
+        if (self.base is not None and not busy and
+                self.saved_profiles_version() != self.profiles_version):
+            with self.lock:
+                self.base = None
+        if (self._query_records is not None and not self.queries_dirty and
+                file_version(self.query_file) != self.queries_version):
+            self._query_records = None
+
+    def check_dup_profile(self, profile):
+        """
+        Checks for a duplicate profile by searching for its hash in place.
+
+        Returns: True if profile has been indexed, otherwise False.
+
+        Parameter profile: the profile of the user that is being searched for.
+        Precondition: profile is a String that represents a url.
+        """
+        return self.check_dup_profiles([profile])[0]
+
+    def check_dup_profiles(self, profiles):
+        """
+        Checks a list of profiles for duplicates at once.
+
+        Returns: A list of bools, which are True where the profile at the
+        same position in profiles has been indexed.
+
+        Parameter profiles: the profiles being searched for.
+        Precondition: profiles is a list of Strings that represent urls.
+        """
+        self.open()
+        keys = hash_profiles(profiles)
+        with self.lock:
+            base = self.base
+            positions = np.searchsorted(base, keys)
+            found = positions < len(base)
+            found[found] = base[positions[found]] == keys[found]
+            return [bool(dup) or int(key) in self.appended
+                    for dup, key in zip(found, keys)]
+
+    def add_indexed_profile(self, profile):
+        """
+        Adds a new profile to the appended segment.
+
+        Parameter profile: The profile being added.
+        Precondition: profile is a String.
+        """
+        self.add_indexed_profiles([profile])
+
+    def add_indexed_profiles(self, profiles):
+        """
+        Adds many profiles to the appended segment at once.
+
+        The hashes are written to the segment file straight away, so they
+        are kept even if the program stops before saving. The index file is
+        locked while they are written, so a merge never empties the segment
+        file between reading it and the new hashes being written.
+
+        Parameter profiles: The profiles being added.
+        Precondition: profiles is an iterable of Strings.
+        """
+        self.open()
+        keys = [slug_hash(profile_slug(profile)) for profile in profiles]
+        with FileLock(self.index_file), self.lock:
+            keys = [key for key in keys if key not in self.appended]
+            self.appended.update(keys)
+            with open(self.append_file, 'ab') as file:
+                file.write(np.array(keys, dtype="<u8").tobytes())
+            self.profiles_version = self.saved_profiles_version()
+
+    def save_indexed_profiles(self):
+        """
+        Starts a background merge if enough profiles have been appended.
+
+        Appended profiles are already on disk, so nothing else is written.
+        The segment file is shared with other processes, so the profiles
+        they have appended count towards the threshold too.
+        """
+        self.open()
+        busy = self.merger is not None and self.merger.is_alive()
+        try:
+            count = os.path.getsize(self.append_file) // 8
+        except OSError:
+            count = 0
+        if count >= self.merge_threshold and not busy:
+            self.merger = threading.Thread(target=self.merge, daemon=True)
+            self.merger.start()
+
+    def merge(self):
+        """
+        Merges the appended profiles into self.index_file.
+
+        The index file is locked while it is merged, and the index and
+        segment files are read again from disk inside the lock, so profiles
+        appended or merged by another process are kept. The segment file is
+        only emptied once the merged index has replaced the old one.
+        """
+        with FileLock(self.index_file):
+            base = open_index_file(self.index_file)
+            try:
+                merging = np.fromfile(self.append_file, dtype="<u8")
+            except OSError:
+                merging = np.empty(0, dtype="<u8")
+            write_index_file(self.index_file, np.union1d(base, merging))
+            with open(self.append_file, 'wb') as file:
+                os.fsync(file.fileno())
+            with self.lock:
+                self.base = open_index_file(self.index_file)
+                self.appended -= set(merging.tolist())
+                self.profiles_version = self.saved_profiles_version()
+
+    def wait_for_merge(self):
+        """
+        Waits for a running background merge to finish.
+        """
+        if self.merger is not None:
+            self.merger.join()
+            self.merger = None
@@ -0,0 +1,80 @@
+"""
+The Profile Fields module of the LinkedIn Search Tool.
+
+Google titles LinkedIn profiles like "Ethan Baker - Intern - Cornell
+University | LinkedIn", and their snippets often start with the profile's
+location, current company and number of connections, like "Ithaca, New
+York, United States · Intern · Experience: Cornell University · 500+
+connections on LinkedIn". This module parses those parts into their own
+columns, so that results can be ranked, filtered, and written to without
+parsing the text again or opening the profile. Each pattern is compiled
+once and matched against a whole column at a time.
+
+Author: Ethan Baker
+"""
+import re
+import pandas as pd
+
+# Matches "Name - Headline - Company | LinkedIn", where only the name is required
+TITLE_PATTERN = re.compile(r'^\s*(?P<Name>.+?)'
+                           r'(?:\s+[-–]\s+(?P<Headline>.+?)'
+                           r'(?:\s+[-–]\s+(?P<Company>[^-–|]+?))?)?'
+                           r'\s*(?:\|\s*LinkedIn.*)?$', re.IGNORECASE)
+
+# Matches the location at the start of a snippet, either after "Location:"
+# or as a comma separated place before the first separator
+LOCATION_PATTERN = re.compile(r'^\s*(?:Location:\s*(?P<Labeled>[^·\n]+?)|'
+                              r'(?P<Place>[^·\n\d:]+?,[^·\n\d:]+?))\s*·')
+
+# Matches the current company listed in a snippet
+COMPANY_PATTERN = re.compile(r'Experience:\s*(?P<Company>[^·\n]+?)\s*(?:·|$)')
+
+# Matches a number of years of experience, like "10 years" or "1 year"
+YEARS_PATTERN = re.compile(r'(?P<Years>\d+)\+?\s+years?\b', re.IGNORECASE)
+
+# Matches a number of connections, like "500+ connections"
+CONNECTIONS_PATTERN = re.compile(r'(?P<Connections>\d[\d,]*)\+?\s+connections?\b',
+                                 re.IGNORECASE)
+
+# The columns added by extract_fields, in order
+FIELDS = ["Name", "Headline", "Company", "Location", "Years", "Connections"]
+
+def to_int(column):
+    """
+    Returns: A nullable integer Series of the numbers in column.
+
+    Parameter column: Numbers written as text, which may contain commas.
+    Precondition: column is a pandas Series of Strings or missing values.
+    """
+    return pd.to_numeric(column.str.replace(",", "", regex=False)).astype("Int64")
+
+def extract_fields(results):
+    """
+    Parses the name, headline, company, location, years of experience and
+    number of connections of each result from its title and snippet.
+
+    Parts that a title or snippet does not contain are left missing. The
+    company is taken from the snippet if it lists one, and otherwise from
+    the title, and years of experience are also taken from either.
+
+    Returns: A new pandas DataFrame with the columns in FIELDS added to
+    results. Years and Connections are nullable integers, and the rest are
+    Strings.
+
+    Parameter results: The search results.
+    Precondition: results is a pandas DataFrame with Title and Snippets columns.
+    """
+    titles = results["Title"].fillna("").astype(str)
+    snippets = results["Snippets"].fillna("").astype(str)
+    fields = titles.str.extract(TITLE_PATTERN)
+    location = snippets.str.extract(LOCATION_PATTERN)
+    fields["Location"] = location["Labeled"].fillna(location["Place"])
+    company = snippets.str.extract(COMPANY_PATTERN)["Company"]
+    fields["Company"] = company.fillna(fields["Company"])
+    years = snippets.str.extract(YEARS_PATTERN)["Years"]
+    fields["Years"] = to_int(years.fillna(titles.str.extract(YEARS_PATTERN)["Years"]))
+    fields["Connections"] = to_int(snippets.str.extract(CONNECTIONS_PATTERN)["Connections"])
+    fields = fields[FIELDS]
+    for field in FIELDS[:4]:
+        fields[field] = fields[field].astype("string")
+    return pd.concat([results.drop(columns=FIELDS, errors="ignore"), fields], axis=1)
@@ -0,0 +1,88 @@
+"""
+The Profile URL module of the LinkedIn Search Tool.
+
+The same LinkedIn profile can be linked in many ways, such as from a
+country subdomain like uk.linkedin.com, with or without a trailing slash,
+with a query string like ?originalSubdomain=uk, or with a locale suffix
+like /en. This module turns every one of them into the same canonical url,
+https://www.linkedin.com/in/<slug>, so that the search results, the indexes
+and the Connection Automator all agree on when two links are one profile.
+Links are matched with a single compiled pattern, and the result for each
+link is cached, as the same links are checked many times over.
+
+Author: Ethan Baker
+"""
+import re
+from functools import lru_cache
+from urllib.parse import quote, unquote
+
+# Matches a LinkedIn profile url on any subdomain, capturing its slug
+PROFILE_PATTERN = re.compile(r'^\s*(?:https?://)?(?:[a-z0-9-]+\.)*linkedin\.com/in/'
+                             r'([^/?#\s]+)', re.IGNORECASE)
+
+# The start of every canonical profile url
+CANONICAL_PREFIX = "https://www.linkedin.com/in/"
+
+# The number of links whose canonical slugs are cached
+CACHE_SIZE = 65536
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_slug(link):
+    """
+    Returns: The lowercase slug of a LinkedIn profile url, with any percent
+    encoding made consistent, or None if link is not a LinkedIn profile url.
+
+    Parameter link: A url.
+    Precondition: link is a String, or None.
+    """
+    if not isinstance(link, str):
+        return None
+    match = PROFILE_PATTERN.match(link)
+    if match is None:
+        return None
+    return quote(unquote(match.group(1)), safe="-_.~").lower()
+
+def canonical_url(link):
+    """
+    Returns: The canonical url of a LinkedIn profile url, or None if link
+    is not a LinkedIn profile url.
+
+    Parameter link: A url.
+    Precondition: link is a String, or None.
+    """
+    slug = canonical_slug(link)
+    if slug is None:
+        return None
+    return CANONICAL_PREFIX + slug
+
+def is_profile_url(link):
+    """
+    Returns: True if link is a LinkedIn profile url, otherwise False.
+
+    Parameter link: A url.
+    Precondition: link is a String, or None.
+    """
+    return canonical_slug(link) is not None
+
+def profile_key(profile):
+    """
+    Returns: The canonical url of a LinkedIn profile url, or profile itself
+    if it is not a LinkedIn profile url.
+
+    Parameter profile: A profile url.
+    Precondition: profile is a String.
+    """
+    return canonical_url(profile) or profile
+
+def profile_slug(profile):
+    """
+    Returns: The canonical slug of a profile url, or the lowercase url
+    without a trailing slash if it is not a LinkedIn profile url.
+
+    Parameter profile: A profile url.
+    Precondition: profile is a String.
+    """
+    slug = canonical_slug(profile)
+    if slug is None:
+        return profile.rstrip("/").lower()
+    return slug
@@ -0,0 +1,147 @@
+"""
+The Query Codec module of the LinkedIn Search Tool.
+
+Every query made by GoogleSearchAPI.generate_queries is the same
+boilerplate around a position, a location, and an experience bucket such
+as "3 years". This module turns those queries into tuples of three small
+int IDs, with each distinct position, location, and bucket stored once,
+and turns the tuples back into exactly the same query Strings. Queries of
+any other form, like those merged or split by a QueryPlanner, are kept as
+Strings.
+
+Author: Ethan Baker
+"""
+import re
+
+# Matches queries made by build_query
+QUERY_PATTERN = re.compile(r'site:linkedin\.com/in intitle:\("(?P<location>.*?)"\) '
+                           r'AND \("(?P<position>.*?)"\) '
+                           r'(?:AND \("(?P<bucket>\d+ years?)"\)|-"year" -"years")$')
+
+# Matches the location and position at the start of any query made from
+# build_query, including those merged or split by a QueryPlanner
+SUBJECT_PATTERN = re.compile(r'site:linkedin\.com/in intitle:\("(?P<location>.*?)"\) '
+                             r'AND \("(?P<position>.*?)"\)')
+
+def build_query(position, location, bucket):
+    """
+    Returns: The query String for a position, location and experience bucket.
+
+    Parameter position: The position being searched for.
+    Precondition: position is a String.
+
+    Parameter location: The location being searched in.
+    Precondition: location is a String.
+
+    Parameter bucket: The years of experience, like "3 years", or "" to
+    exclude profiles that list any years of experience.
+    Precondition: bucket is a String.
+    """
+    query = 'site:linkedin.com/in intitle:("' + location + '") AND ("' + position + '") '
+    if bucket == "":
+        return query + '-"year" -"years"'
+    return query + 'AND ("' + bucket + '")'
+
+def query_subject(query):
+    """
+    Returns: A tuple (location, position) of the preferences query was made
+    from, or None if it was not made from build_query.
+
+    Parameter query: A query search term.
+    Precondition: query is a String.
+    """
+    match = SUBJECT_PATTERN.match(query)
+    if match is None:
+        return None
+    return (match.group("location"), match.group("position"))
+
+class QueryCodec():
+    """
+    A class representing the tables used to compress queries.
+
+    Contains the properties positions, locations and buckets, which are the
+    lists of every distinct position, location and experience bucket seen,
+    in the order they were first seen, so that each one's ID is its index.
+    """
+
+    def __init__(self, positions=None, locations=None, buckets=None):
+        """
+        Creates a QueryCodec object, with the given tables if there are any.
+
+        Parameter positions: The positions with IDs.
+        Precondition: positions is a list of distinct Strings, or None.
+
+        Parameter locations: The locations with IDs.
+        Precondition: locations is a list of distinct Strings, or None.
+
+        Parameter buckets: The experience buckets with IDs.
+        Precondition: buckets is a list of distinct Strings, or None.
+        """
+        self.positions = positions or []
+        self.locations = locations or []
+        self.buckets = buckets or []
+        self.ids = [{value: i for i, value in enumerate(table)}
+                    for table in (self.positions, self.locations, self.buckets)]
+
+    def intern(self, field, value, add):
+        """
+        Returns: The ID of value in the table at index field, or None if it
+        has no ID and add is False.
+
+        Parameter field: 0 for positions, 1 for locations, 2 for buckets.
+        Precondition: field is an int between 0 and 2.
+
+        Parameter value: The value to look up.
+        Precondition: value is a String.
+
+        Parameter add: Whether to give value a new ID if it has none.
+        Precondition: add is a bool.
+        """
+        ids = self.ids[field]
+        if value not in ids:
+            if not add:
+                return None
+            table = (self.positions, self.locations, self.buckets)[field]
+            ids[value] = len(table)
+            table.append(value)
+        return ids[value]
+
+    def encode(self, query, add=True):
+        """
+        Compresses a query.
+
+        Returns: A tuple (position, location, bucket) of IDs if query was made
+        by build_query, otherwise query itself. Returns None instead if add
+        is False and any part of query has no ID, as it cannot have been
+        encoded before.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+
+        Parameter add: Whether to give new parts of query new IDs.
+        Precondition: add is a bool.
+        """
+        match = QUERY_PATTERN.match(query)
+        if match is None:
+            return query
+        parts = (match.group("position"), match.group("location"),
+                 match.group("bucket") or "")
+        # Locations or positions containing quotes may not split back the same way
+        if build_query(*parts) != query:
+            return query
+        key = tuple(self.intern(field, value, add) for field, value in enumerate(parts))
+        if None in key:
+            return None
+        return key
+
+    def decode(self, key):
+        """
+        Returns: The query String that was compressed into key.
+
+        Parameter key: A compressed query.
+        Precondition: key was returned by self.encode.
+        """
+        if isinstance(key, str):
+            return key
+        return build_query(self.positions[key[0]], self.locations[key[1]],
+                           self.buckets[key[2]])
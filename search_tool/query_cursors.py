@@ -0,0 +1,95 @@
+"""
+The Query Cursors module of the LinkedIn Search Tool.
+
+This module allows the program to record how far through its pages of
+results each unfinished query got before a search stopped, for example
+when the daily API request limit was reached. This ensures that the next
+search resumes those queries from the first page that was not received,
+instead of skipping them or requesting their first pages again. When a
+QueryPlanner merges or splits a query differently than before, the cursor
+of the old query is forgotten, as that query will not be searched again.
+
+Author: Ethan Baker
+"""
+import pickle
+from search_tool.query_codec import query_subject
+
+class QueryCursors():
+    """
+    A class representing the progress of queries that were not finished.
+
+    Contains the property cursors, a dictionary that maps each unfinished
+    query to a tuple (next_start, num_results), where next_start is the start
+    index of the first page that was not received, and num_results is the
+    number of results the query has, as per its totalResults. Also includes
+    the property cursor_file, which is the String filepath to the cursors.
+    """
+
+    def __init__(self, cursor_file):
+        """
+        Creates a QueryCursors object.
+
+        Parameter cursor_file: the filepath to the cursors.
+        Precondition: cursor_file is a String containing a valid .pkl filepath.
+        """
+        self.cursor_file = cursor_file
+        self.cursors = self.load_cursors()
+
+    def load_cursors(self):
+        """
+        Loads the dictionary of query cursors from self.cursor_file.
+        """
+        try:
+            with open(self.cursor_file, 'rb') as file:
+                return pickle.load(file)
+        except:
+            return {}
+
+    def set_cursor(self, query, next_start, num_results):
+        """
+        Records the progress of an unfinished query.
+
+        Parameter query: A query search term.
+        Precondition: query is a String that represents a valid query.
+
+        Parameter next_start: The start index of the first page not received.
+        Precondition: next_start is an int in 1, 11, ..., 91.
+
+        Parameter num_results: The number of results the query has.
+        Precondition: num_results is an int between 0 and 100.
+        """
+        self.cursors[query] = (next_start, num_results)
+
+    def remove_cursor(self, query):
+        """
+        Forgets the progress of a query once it has been finished.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+        """
+        self.cursors.pop(query, None)
+
+    def prune_cursors(self, queries):
+        """
+        Forgets the progress of queries that have been replaced by queries.
+
+        A cursor is forgotten if its query has the same location and
+        position as one of queries, but is not itself one of them, as
+        happens when a QueryPlanner merges or splits it differently.
+
+        Parameter queries: Every query generated for a search.
+        Precondition: queries is a list of Strings.
+        """
+        generated = set(queries)
+        subjects = {query_subject(query) for query in generated}
+        subjects.discard(None)
+        for query in list(self.cursors):
+            if query not in generated and query_subject(query) in subjects:
+                del self.cursors[query]
+
+    def save_cursors(self):
+        """
+        Saves the updated query cursors to self.cursor_file.
+        """
+        with open(self.cursor_file, 'wb') as file:
+            pickle.dump(self.cursors, file)
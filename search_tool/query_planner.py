@@ -0,0 +1,205 @@
+"""
+The Query Planner module of the LinkedIn Search Tool.
+
+This module reshapes the queries made by GoogleSearchAPI.generate_queries
+based on how many results each one returned in past searches. Google
+returns at most 100 results per query, so queries with far more results
+than that are split into narrower queries that each return up to 100 of
+them, while neighbouring years of experience that each return only a few
+results are merged into a single query using Google's OR operator. Both
+aim to get the most unique profiles out of each API request.
+
+Author: Ethan Baker
+"""
+import pickle
+from search_tool.query_scheduler import parse_query
+
+class QueryPlanner():
+    """
+    A class representing the rules used to merge and split queries.
+
+    Contains the property stats, which are the yield stats recorded by a
+    YieldPolicy and loaded from the String filepath stats_file, sparse, which
+    is the number of results below which a query may be merged, max_merged,
+    which is the most years of experience merged into one query, and
+    split_terms, which is the list of terms used, in order, to split queries
+    with more than 100 results.
+    """
+
+    def __init__(self, stats_file, sparse, max_merged, split_terms):
+        """
+        Creates a QueryPlanner object.
+
+        Parameter stats_file: the filepath to the yield stats.
+        Precondition: stats_file is a String containing a valid .pkl filepath.
+
+        Parameter sparse: The number of results below which queries merge.
+        Precondition: sparse is an int between 0 and 100.
+
+        Parameter max_merged: The most years merged into one query.
+        Precondition: max_merged is an int >= 1.
+
+        Parameter split_terms: The terms used to split queries.
+        Precondition: split_terms is a list of Strings.
+        """
+        self.stats_file = stats_file
+        self.sparse = sparse
+        self.max_merged = max_merged
+        self.split_terms = split_terms
+        self.stats = self.load_stats()
+
+    def load_stats(self):
+        """
+        Loads the dictionary of yield stats from self.stats_file.
+        """
+        try:
+            with open(self.stats_file, 'rb') as file:
+                return pickle.load(file)
+        except:
+            return {}
+
+    def recorded_total(self, query):
+        """
+        Returns: The totalResults recorded for query, or None if it has
+        never been searched.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+        """
+        stat = self.stats.get(query)
+        if stat is None or not stat["pages"]:
+            return None
+        return stat["total"]
+
+    def estimate_totals(self, queries):
+        """
+        Estimates the totalResults of each query.
+
+        Queries that have been searched use their recorded totalResults.
+        Queries that have not use the average recorded totalResults of
+        the queries with the same location and position, if there are any.
+
+        Returns: A dictionary that maps each query to its estimated
+        totalResults, or to None if there is nothing to estimate from.
+
+        Parameter queries: A list of queries from generate_queries.
+        Precondition: queries is a list of Strings.
+        """
+        groups = {}
+        for query in queries:
+            parsed = parse_query(query)
+            total = self.recorded_total(query)
+            if parsed is not None and total is not None:
+                groups.setdefault(parsed[:2], []).append(total)
+        totals = {}
+        for query in queries:
+            total = self.recorded_total(query)
+            parsed = parse_query(query)
+            if total is None and parsed is not None and parsed[:2] in groups:
+                group = groups[parsed[:2]]
+                total = sum(group) / len(group)
+            totals[query] = total
+        return totals
+
+    def merge_query(self, queries):
+        """
+        Combines queries that differ only in years of experience.
+
+        Returns: A String representing a query that matches the results of
+        any of queries.
+
+        Parameter queries: The queries to combine.
+        Precondition: queries is a non-empty list of Strings from
+        generate_queries with the same location and position, and years > 0.
+        """
+        if len(queries) == 1:
+            return queries[0]
+        location, position, _ = parse_query(queries[0])
+        years = []
+        for query in queries:
+            num = parse_query(query)[2]
+            s = ""
+            if num != 1: s = "s"
+            years.append('"' + str(num) + ' year' + s + '"')
+        return ('site:linkedin.com/in intitle:("' + location + '") AND ("' +
+                position + '") AND (' + " OR ".join(years) + ')')
+
+    def split_query(self, query, depth=0):
+        """
+        Splits a query with more than 100 results into narrower queries.
+
+        The query is split on self.split_terms[depth] into one query that
+        contains the term and one that excludes it, so that together they
+        match the same results. Each half is split again on the next term
+        if it has also been searched and had more than 100 results.
+
+        Returns: A list of Strings representing queries.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+
+        Parameter depth: The index of the next term in self.split_terms.
+        Precondition: depth is an int >= 0.
+        """
+        total = self.recorded_total(query)
+        if total is None or total <= 100 or depth >= len(self.split_terms):
+            return [query]
+        term = self.split_terms[depth]
+        return (self.split_query(query + ' "' + term + '"', depth + 1) +
+                self.split_query(query + ' -"' + term + '"', depth + 1))
+
+    def plan(self, queries, skip=None):
+        """
+        Merges sparse queries and splits saturated ones.
+
+        Runs of queries with the same location and position whose years of
+        experience follow each other are merged while each is estimated to
+        have fewer than self.sparse results and the merged query is
+        estimated to have at most 100. Queries with more than 100 recorded
+        results are split using split_query. Every other query is kept as is,
+        and the order of queries is otherwise unchanged. Queries in skip are
+        left out of the plan and are never merged with others, but are still
+        used to estimate the totalResults of the queries that are planned.
+
+        Returns: A list of Strings representing queries.
+
+        Parameter queries: A list of queries from generate_queries.
+        Precondition: queries is a list of Strings.
+
+        Parameter skip: The queries to leave out, such as those searched before.
+        Precondition: skip is a set of Strings, or None.
+        """
+        totals = self.estimate_totals(queries)
+        planned = []
+        run = []
+        run_total = 0
+        for query in queries:
+            if skip and query in skip:
+                if run:
+                    planned.append(self.merge_query(run))
+                    run = []
+                continue
+            parsed = parse_query(query)
+            total = totals[query]
+            mergeable = (parsed is not None and parsed[2] > 0 and
+                         total is not None and total < self.sparse)
+            if run:
+                last = parse_query(run[-1])
+                follows = (mergeable and parsed[:2] == last[:2] and
+                           parsed[2] == last[2] + 1 and
+                           run_total + total <= 100 and
+                           len(run) < self.max_merged)
+                if follows:
+                    run.append(query)
+                    run_total += total
+                    continue
+                planned.append(self.merge_query(run))
+                run = []
+            if mergeable:
+                run = [query]
+                run_total = total
+            else:
+                planned.extend(self.split_query(query))
+        if run:
+            planned.append(self.merge_query(run))
+        return planned
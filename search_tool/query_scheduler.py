@@ -0,0 +1,240 @@
+"""
+The Query Scheduler module of the LinkedIn Search Tool.
+
+This module decides which search queries to spend the day's API requests
+on, and in what order. Queries are ranked by the number of new profiles
+they are expected to return per API request, as per the yield stats
+recorded by past searches. Queries that have never been searched are
+estimated from past queries with the same position, location, or years
+of experience. The highest ranked queries are then planned until the
+daily request budget is used up.
+
+Author: Ethan Baker
+"""
+import math
+import pickle
+import datetime
+from search_tool.query_codec import QUERY_PATTERN
+
+# The number of pages of evidence that the prior estimate is worth
+PRIOR_PAGES = 2
+
+def parse_query(query):
+    """
+    Splits a query into the preferences it was generated from.
+
+    Returns: A tuple (location, position, years) where years is an int, and
+    is 0 for queries that exclude profiles listing any years, or None if
+    query was not generated by GoogleSearchAPI.generate_queries.
+
+    Parameter query: A query search term.
+    Precondition: query is a String.
+    """
+    match = QUERY_PATTERN.match(query)
+    if match is None:
+        return None
+    bucket = match.group("bucket")
+    return (match.group("location"), match.group("position"),
+            int(bucket.split()[0]) if bucket is not None else 0)
+
+class QueryScheduler():
+    """
+    A class representing a plan for spending the daily API request budget.
+
+    Contains the properties stats, which are the yield stats recorded by a
+    YieldPolicy, daily_budget, which is the number of API requests that may
+    be sent per day, and usage_file, which is the String filepath to the
+    record of requests sent today. Also includes the properties prior, the
+    number of new profiles per request expected from a query with no
+    history, and features, which maps each of "location", "position", and
+    "years" to a dictionary of [new, pages] totals for each value.
+    """
+
+    def __init__(self, stats, usage_file, daily_budget):
+        """
+        Creates a QueryScheduler object.
+
+        Parameter stats: The yield stats of past searches.
+        Precondition: stats is a dictionary as in YieldPolicy.stats.
+
+        Parameter usage_file: the filepath to the record of requests sent.
+        Precondition: usage_file is a String containing a valid .pkl filepath.
+
+        Parameter daily_budget: The number of API requests allowed per day.
+        Precondition: daily_budget is an int >= 0.
+        """
+        self.stats = stats
+        self.usage_file = usage_file
+        self.daily_budget = daily_budget
+        self.usage = self.load_usage()
+
+        self.features = {"location": {}, "position": {}, "years": {}}
+        new = 0
+        pages = 0
+        costs = []
+        for query, stat in stats.items():
+            new += stat["new"]
+            pages += stat["pages"]
+            if stat["total"]:
+                costs.append(self.estimate_cost(query))
+            parsed = parse_query(query)
+            if parsed is None:
+                continue
+            for feature, value in zip(["location", "position", "years"], parsed):
+                totals = self.features[feature].setdefault(value, [0, 0])
+                totals[0] += stat["new"]
+                totals[1] += stat["pages"]
+        # Unexplored queries are assumed to be as good as a full page
+        self.prior = new / pages if pages > 0 else 10
+        self.default_cost = sum(costs) / len(costs) if costs else 10
+
+    def load_usage(self):
+        """
+        Loads the number of requests sent today from self.usage_file.
+
+        Returns: A tuple (date, requests) where date is an ISO format String.
+        """
+        today = datetime.date.today().isoformat()
+        try:
+            with open(self.usage_file, 'rb') as file:
+                usage = pickle.load(file)
+            if usage[0] == today:
+                return usage
+        except:
+            pass
+        return (today, 0)
+
+    def remaining_budget(self):
+        """
+        Returns: The number of API requests that can still be sent today.
+        """
+        return max(0, self.daily_budget - self.usage[1])
+
+    def smoothed_yield(self, new, pages):
+        """
+        Returns: The number of new profiles per page, pulled towards
+        self.prior when there are few pages of evidence.
+
+        Parameter new: The number of new profiles received.
+        Precondition: new is an int >= 0.
+
+        Parameter pages: The number of pages received.
+        Precondition: pages is an int >= 0.
+        """
+        return (new + self.prior * PRIOR_PAGES) / (pages + PRIOR_PAGES)
+
+    def estimate_yield(self, query):
+        """
+        Estimates the number of new profiles per request a query will return.
+
+        Queries with their own history are estimated from it. Otherwise, the
+        estimate is the average of the yields of the query's location,
+        position, and years, or self.prior if none of them have history.
+
+        Returns: A float representing new profiles per request.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+        """
+        stat = self.stats.get(query)
+        if stat is not None and stat["pages"] > 0:
+            return self.smoothed_yield(stat["new"], stat["pages"])
+        parsed = parse_query(query)
+        if parsed is None:
+            return self.prior
+        estimates = []
+        for feature, value in zip(["location", "position", "years"], parsed):
+            totals = self.features[feature].get(value)
+            if totals is not None and totals[1] > 0:
+                estimates.append(self.smoothed_yield(totals[0], totals[1]))
+        if not estimates:
+            return self.prior
+        return sum(estimates) / len(estimates)
+
+    def estimate_cost(self, query, cursor=None):
+        """
+        Estimates the number of requests needed to finish a query.
+
+        Returns: An int representing a number of API requests.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+
+        Parameter cursor: The progress of the query, if it is unfinished.
+        Precondition: cursor is a (next_start, num_results) tuple as in
+        QueryCursors, or None.
+        """
+        if cursor is not None:
+            next_start, num_results = cursor
+            return max(1, math.ceil((num_results - next_start + 1) / 10))
+        stat = self.stats.get(query)
+        if stat is not None and stat["total"]:
+            return max(1, math.ceil(min(100, stat["total"]) / 10))
+        return math.ceil(self.default_cost)
+
+    def rank(self, queries, cursors):
+        """
+        Orders queries by expected yield.
+
+        Returns: A list of queries, with unfinished queries first, then the
+        rest from the highest to the lowest expected yield.
+
+        Parameter queries: The queries that could be searched.
+        Precondition: queries is a list of Strings.
+
+        Parameter cursors: The progress of unfinished queries.
+        Precondition: cursors is a dictionary as in QueryCursors.cursors.
+        """
+        return sorted(queries, key=lambda query:
+                      (query not in cursors, -self.estimate_yield(query)))
+
+    def schedule(self, queries, cursors, budget=None):
+        """
+        Orders queries by expected yield and keeps those that fit the budget.
+
+        Queries are added to the plan in the order of rank, skipping any
+        that are expected to cost more than what is left of the budget.
+        Costs are only estimates, so a search should plan again from the
+        queries that are left once the requests it actually sent are known,
+        rather than stopping when the first plan is done.
+
+        Returns: A list of queries to search, in the order to search them.
+
+        Parameter queries: The queries that could be searched.
+        Precondition: queries is a list of Strings.
+
+        Parameter cursors: The progress of unfinished queries.
+        Precondition: cursors is a dictionary as in QueryCursors.cursors.
+
+        Parameter budget: The number of requests that may be sent.
+        Precondition: budget is an int >= 0, or None for what is left of
+        today's budget.
+        """
+        if budget is None:
+            budget = self.remaining_budget()
+        planned = []
+        for query in self.rank(queries, cursors):
+            cost = self.estimate_cost(query, cursors.get(query))
+            if cost <= budget:
+                planned.append(query)
+                budget -= cost
+        return planned
+
+    def record_usage(self, requests):
+        """
+        Adds requests to the number of requests sent today.
+
+        Parameter requests: The number of API requests sent.
+        Precondition: requests is an int >= 0.
+        """
+        today = datetime.date.today().isoformat()
+        if self.usage[0] != today:
+            self.usage = (today, 0)
+        self.usage = (today, self.usage[1] + requests)
+
+    def save_usage(self):
+        """
+        Saves the number of requests sent today to self.usage_file.
+        """
+        with open(self.usage_file, 'wb') as file:
+            pickle.dump(self.usage, file)
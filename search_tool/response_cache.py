@@ -0,0 +1,110 @@
+"""
+The Response Cache module of the LinkedIn Search Tool.
+
+This module allows the program to record the responses it receives from
+Google's Custom Search API so that pages which were already paid for can
+be reused. Responses are keyed by the query and the start index of the page,
+expire after a set time, and the oldest responses are evicted once the
+cache grows past a set number of entries.
+
+Author: Ethan Baker
+"""
+import time
+import pickle
+
+class ResponseCache():
+    """
+    A class representing previously received pages of search results.
+
+    Contains the property cache_file, which is the String filepath to the
+    cache, and the properties ttl and max_entries, which are the number of
+    seconds a response stays fresh and the number of responses kept on disk.
+    The cache is loaded from cache_file the first time it is used.
+    """
+
+    def __init__(self, cache_file, ttl, max_entries):
+        """
+        Creates a ResponseCache object.
+
+        Parameter cache_file: the filepath to the cache.
+        Precondition: cache_file is a String containing a valid .pkl filepath.
+
+        Parameter ttl: The number of seconds a response stays fresh.
+        Precondition: ttl is a number >= 0.
+
+        Parameter max_entries: The maximum number of responses to save.
+        Precondition: max_entries is an int >= 0.
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = None
+
+    def load(self):
+        """
+        Loads the dictionary of cached responses from self.cache_file.
+
+        Returns: A dictionary that maps (query, start) tuples to
+        (time received, response) tuples.
+        """
+        if self.entries is None:
+            try:
+                with open(self.cache_file, 'rb') as file:
+                    self.entries = pickle.load(file)
+            except:
+                self.entries = {}
+        return self.entries
+
+    def get(self, query, start, replay=False):
+        """
+        Returns: The cached response for a page, or None if there is no
+        fresh response for it.
+
+        Parameter query: The query the page was requested for.
+        Precondition: query is a String.
+
+        Parameter start: The index of the first result on the page.
+        Precondition: start is an int.
+
+        Parameter replay: Whether expired responses may be returned.
+        Precondition: replay is a bool.
+        """
+        entry = self.load().get((query, start))
+        if entry is None:
+            return None
+        received, data = entry
+        if not replay and time.time() - received > self.ttl:
+            return None
+        return data
+
+    def put(self, query, start, data):
+        """
+        Records the response received for a page.
+
+        Parameter query: The query the page was requested for.
+        Precondition: query is a String.
+
+        Parameter start: The index of the first result on the page.
+        Precondition: start is an int.
+
+        Parameter data: The decoded response.
+        Precondition: data is a dictionary that does not contain an error.
+        """
+        self.load()[(query, start)] = (time.time(), data)
+
+    def save(self):
+        """
+        Saves the cached responses to self.cache_file.
+
+        Expired responses are dropped, then the oldest responses are dropped
+        until at most self.max_entries remain.
+        """
+        if self.entries is None:
+            return
+        now = time.time()
+        fresh = [(key, entry) for key, entry in self.entries.items()
+                 if now - entry[0] <= self.ttl]
+        fresh.sort(key=lambda item: item[1][0], reverse=True)
+        self.entries = dict(fresh[:self.max_entries])
+        with open(self.cache_file, 'wb') as file:
+            pickle.dump(self.entries, file)
@@ -0,0 +1,84 @@
+"""
+The Result Filter module of the LinkedIn Search Tool.
+
+This module removes unwanted rows, like links that are not LinkedIn
+profiles, from the DataFrame of search results. Each rule checks a whole
+column at once and returns which rows it keeps, and a ResultFilter applies
+its rules one after another, only removing the rejected rows once at the
+end. Rules are chosen by name in consts.py, and new rules can be added to
+RULES. The number of rows each rule rejected is recorded, so a search can
+report why results were removed.
+
+Author: Ethan Baker
+"""
+import pandas as pd
+from search_tool.profile_url import PROFILE_PATTERN
+
+def profile_link(df):
+    """
+    Returns: A boolean Series, True where the row's link is a LinkedIn
+    profile url.
+
+    Parameter df: The search results.
+    Precondition: df is a pandas DataFrame with a Link column.
+    """
+    return df["Link"].str.match(PROFILE_PATTERN, na=False)
+
+def duplicate_link(df):
+    """
+    Returns: A boolean Series, True where the row's link does not appear in
+    an earlier row.
+
+    Parameter df: The search results.
+    Precondition: df is a pandas DataFrame with a Link column.
+    """
+    return ~df["Link"].duplicated()
+
+# The rules that can be chosen by name in consts.RESULT_FILTERS
+RULES = {"profile_link": profile_link, "duplicate_link": duplicate_link}
+
+class ResultFilter():
+    """
+    A class representing the rules search results must pass to be kept.
+
+    Contains the property rules, a list of tuples (name, rule) where rule
+    is a function that takes a DataFrame of search results and returns a
+    boolean Series of the rows it keeps, and rejected, a dictionary
+    mapping each rule's name to the number of rows it has rejected. A row
+    is counted against the first rule it fails.
+    """
+
+    def __init__(self, names, rules=None):
+        """
+        Creates a ResultFilter object.
+
+        Parameter names: The names of the rules to apply, in order.
+        Precondition: names is a list of Strings, each a key of rules.
+
+        Parameter rules: The rules that can be chosen, by name.
+        Precondition: rules is a dictionary mapping Strings to functions,
+        or None to use RULES.
+        """
+        if rules is None:
+            rules = RULES
+        self.rules = [(name, rules[name]) for name in names]
+        self.rejected = {name: 0 for name in names}
+
+    def apply(self, df):
+        """
+        Removes every row of df that fails a rule.
+
+        Returns: A new pandas DataFrame of the rows that passed every rule,
+        with a fresh index.
+
+        Parameter df: The search results.
+        Precondition: df is a pandas DataFrame with the columns the rules use.
+        """
+        keep = pd.Series(True, index=df.index)
+        for name, rule in self.rules:
+            if df.empty:
+                break
+            passed = rule(df).astype(bool)
+            self.rejected[name] += int((keep & ~passed).sum())
+            keep &= passed
+        return df[keep].reset_index(drop=True)
@@ -0,0 +1,284 @@
+"""
+The Result Sink module of the LinkedIn Search Tool.
+
+This module saves search results to the output file by appending only the
+new rows, instead of reading the whole file, adding to it, and writing it
+all back. Results can be saved as a CSV file, as a directory of Parquet
+files with one file per batch of results, or as a table in a SQLite
+database, and the format is chosen by the extension of the output file.
+GoogleSearchAPI.search can write each page of results to a sink as soon
+as it arrives. Excel workbooks cannot be appended to, so they are still
+rewritten in full, and are best made on demand with export_excel when the
+results are needed for the Connection Automator.
+
+Author: Ethan Baker
+"""
+import os
+import time
+import sqlite3
+from abc import ABC, abstractmethod
+import pandas as pd
+from search_tool.file_lock import FileLock, atomic_open
+
+class ResultSink(ABC):
+    """
+    A class representing a file that search results are saved to.
+
+    Contains the property filepath, which is the String filepath to the
+    saved results. Subclasses append new results with write and read every
+    saved result with read, which every subclass must define. The property
+    streaming is True if writing a
+    batch only costs as much as the batch itself, so that results can be
+    written a page at a time.
+    """
+    streaming = True
+
+    def __init__(self, filepath):
+        """
+        Creates a ResultSink object.
+
+        Parameter filepath: the filepath to the saved results.
+        Precondition: filepath is a String containing a valid filepath.
+        """
+        self.filepath = filepath
+
+    @abstractmethod
+    def write(self, results):
+        """
+        Appends results to the saved results.
+
+        Parameter results: The new search results.
+        Precondition: results is a pandas DataFrame.
+        """
+
+    @abstractmethod
+    def read(self):
+        """
+        Returns: A pandas DataFrame of every saved result, in the order they
+        were written, or an empty DataFrame if none have been saved.
+        """
+
+class CSVResultSink(ResultSink):
+    """
+    A class representing search results saved to a CSV file.
+
+    New rows are appended to the end of the file in the order of the
+    columns in its header. If new rows have a column the header does not,
+    the whole file is rewritten once with the column added to its header,
+    so that no column is lost. A row that was only partly written, because
+    the program stopped while writing it, is cut off before the next rows
+    are appended.
+    """
+
+    def write(self, results):
+        """
+        Appends results to the end of the CSV file, writing its header first
+        if the file is new, or rewriting the file if results have columns
+        its header does not.
+
+        Parameter results: The new search results.
+        Precondition: results is a pandas DataFrame.
+        """
+        if results.empty:
+            return
+        with FileLock(self.filepath):
+            header = True
+            if os.path.exists(self.filepath) and os.path.getsize(self.filepath) > 0:
+                header = False
+                with open(self.filepath, 'r+b') as file:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        file.seek(0)
+                        file.truncate(file.read().rfind(b"\n") + 1)
+                columns = pd.read_csv(self.filepath, nrows=0).columns
+                if not results.columns.isin(columns).all():
+                    self.rewrite(results)
+                    return
+                results = results.reindex(columns=columns)
+            with open(self.filepath, 'a', newline='', encoding='utf-8') as file:
+                results.to_csv(file, header=header, index=False)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def rewrite(self, results):
+        """
+        Rewrites the CSV file with results added to the end, and with the
+        columns of results its header does not have added after the others.
+
+        The saved rows are read as text, so they are written back exactly as
+        they were. The caller must hold the lock on the file.
+
+        Parameter results: The new search results.
+        Precondition: results is a pandas DataFrame.
+        """
+        saved = pd.read_csv(self.filepath, dtype=str, keep_default_na=False)
+        results = pd.concat([saved, results], ignore_index=True)
+        with atomic_open(self.filepath) as file:
+            results.to_csv(file, index=False, encoding='utf-8')
+
+    def read(self):
+        """
+        Returns: A pandas DataFrame of every row in the CSV file.
+        """
+        try:
+            return pd.read_csv(self.filepath)
+        except:
+            return pd.DataFrame()
+
+class ParquetResultSink(ResultSink):
+    """
+    A class representing search results saved as a directory of Parquet files.
+
+    Each batch of results is written to its own file in the directory at
+    filepath, which is made whole before it is moved into place, so a
+    crash never leaves a partly written batch behind.
+    """
+
+    def write(self, results):
+        """
+        Writes results to a new Parquet file in the directory.
+
+        Parameter results: The new search results.
+        Precondition: results is a pandas DataFrame.
+        """
+        if results.empty:
+            return
+        os.makedirs(self.filepath, exist_ok=True)
+        name = str(time.time_ns()) + "-" + str(os.getpid()) + ".parquet"
+        with atomic_open(os.path.join(self.filepath, name)) as file:
+            results.to_parquet(file, index=False)
+
+    def read(self):
+        """
+        Returns: A pandas DataFrame of the rows of every Parquet file in the
+        directory.
+        """
+        if not os.path.isdir(self.filepath):
+            return pd.DataFrame()
+        # File names start with the time they were written, so sort in order
+        names = sorted(name for name in os.listdir(self.filepath)
+                       if name.endswith(".parquet"))
+        if not names:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(os.path.join(self.filepath, name))
+                          for name in names], ignore_index=True)
+
+class SQLiteResultSink(ResultSink):
+    """
+    A class representing search results saved to a table in a SQLite database.
+
+    Contains the property table, which is the String name of the table the
+    results are saved to. Columns that the table does not have yet are
+    added to it, and each batch is written in a single transaction.
+    """
+
+    def __init__(self, filepath, table="results"):
+        """
+        Creates a SQLiteResultSink object.
+
+        Parameter filepath: the filepath to the database.
+        Precondition: filepath is a String containing a valid filepath.
+
+        Parameter table: The name of the table the results are saved to.
+        Precondition: table is a String.
+        """
+        super().__init__(filepath)
+        self.table = table
+
+    def write(self, results):
+        """
+        Inserts results into the table, creating it if it does not exist.
+
+        Parameter results: The new search results.
+        Precondition: results is a pandas DataFrame.
+        """
+        if results.empty:
+            return
+        connection = sqlite3.connect(self.filepath)
+        try:
+            with connection:
+                rows = connection.execute('PRAGMA table_info("' + self.table + '")')
+                columns = {row[1] for row in rows}
+                if columns:
+                    for column in results.columns:
+                        if column not in columns:
+                            connection.execute('ALTER TABLE "' + self.table +
+                                               '" ADD COLUMN "' + column + '"')
+                results.to_sql(self.table, connection, if_exists='append', index=False)
+        finally:
+            connection.close()
+
+    def read(self):
+        """
+        Returns: A pandas DataFrame of every row in the table.
+        """
+        if not os.path.exists(self.filepath):
+            return pd.DataFrame()
+        connection = sqlite3.connect(self.filepath)
+        try:
+            return pd.read_sql_query('SELECT * FROM "' + self.table + '"', connection)
+        except:
+            return pd.DataFrame()
+        finally:
+            connection.close()
+
+class ExcelResultSink(ResultSink):
+    """
+    A class representing search results saved to an Excel workbook.
+
+    A workbook cannot be appended to, so every write reads the whole
+    workbook and writes it back with the new rows added. The new workbook
+    is written in full before it replaces the old one, so a crash never
+    leaves it partly written.
+    """
+    streaming = False
+
+    def write(self, results):
+        """
+        Rewrites the workbook with results added to the end.
+
+        Parameter results: The new search results.
+        Precondition: results is a pandas DataFrame.
+        """
+        with FileLock(self.filepath):
+            results = pd.concat([self.read(), results])
+            with atomic_open(self.filepath) as file:
+                results.to_excel(file, index=False, engine="openpyxl")
+
+    def read(self):
+        """
+        Returns: A pandas DataFrame of every row in the workbook.
+        """
+        try:
+            return pd.read_excel(self.filepath)
+        except:
+            return pd.DataFrame()
+
+# The sink used for each output file extension, see get_result_sink
+RESULT_SINKS = {".csv": CSVResultSink, ".parquet": ParquetResultSink,
+                ".db": SQLiteResultSink, ".sqlite": SQLiteResultSink,
+                ".xlsx": ExcelResultSink}
+
+def get_result_sink(filepath):
+    """
+    Returns: The ResultSink for the output file at filepath, chosen by its
+    extension.
+
+    Parameter filepath: the filepath to the saved results.
+    Precondition: filepath is a String ending in an extension in RESULT_SINKS.
+    """
+    return RESULT_SINKS[os.path.splitext(filepath)[1].lower()](filepath)
+
+def export_excel(sink, excel_file):
+    """
+    Writes every result saved by sink to an Excel workbook, replacing it.
+
+    Parameter sink: The saved results.
+    Precondition: sink is a ResultSink.
+
+    Parameter excel_file: the filepath to the workbook.
+    Precondition: excel_file is a String containing a valid .xlsx filepath.
+    """
+    results = sink.read()
+    with atomic_open(excel_file) as file:
+        results.to_excel(file, index=False, engine="openpyxl")
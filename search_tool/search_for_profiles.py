@@ -4,10 +4,11 @@ The primary module for the LinkedIn Search Tool section of ConneXion.
 This module faciliates the overall execution of the search methods, which 
 includes loading the preferences from consts.py, searching Google for 
 LinkedIn profiles based on those preferences, and saving the search results
-to an Excel file, while indexing the data to a .pkl file.
+to an output file, while indexing the data to a .pkl file.
 """
-import pandas as pd
 from search_tool.google_api import GoogleSearchAPI
+from search_tool.result_filter import ResultFilter
+from search_tool.result_sink import get_result_sink
 import consts as c
 
 def load_preferences(): 
@@ -31,7 +32,8 @@ def run_search(preferences):
     
     Returns: A list of length 2 where the fist element is a pandas DataFrame 
     containing search results, and the second element is an error message, if one
-    occured. 
+    occured. The DataFrame's attrs["rejected"] maps the name of each rule in
+    consts.RESULT_FILTERS to the number of results it removed.
 
     Parameter preferences: A dictionary of user search preferences.
     Precondition: preferences is generated by search_for_profiles.load_preferences()
@@ -41,42 +43,66 @@ def run_search(preferences):
     # Generate search terms
     google = GoogleSearchAPI(c.API_KEY, c.SEARCH_ENGINE_ID)
     queries = google.generate_queries(preferences)
-    # Search for list of terms using Google API
-    results = google.search(queries)
-    # Remove error results
-    # Remove error results
-    i = 0
-    start = "https://www.linkedin.com/in"
-    while i < len(results[0]):
-        link = results[0]["Link"][i]
-        if link[:27] != start:
-            results[0] = results[0].drop(i).reset_index(drop=True)
-        else:
-            i += 1
-
-    results[0] = results[0].reset_index(drop=True)
+    # Search for list of terms using Google API, removing error results
+    # from each page and recording how many each rule removed
+    result_filter = ResultFilter(c.RESULT_FILTERS)
+    results = google.search(queries, None, result_filter)
+    google.session.close()
+    results[0].attrs["rejected"] = result_filter.rejected
 
     return results
+
+def stream_search(preferences, sink, google=None):
+    """
+    Uses Google's search API to search LinkedIn accounts based on preferences,
+    saving the results as they arrive.
+
+    Searches the same terms as run_search, but writes each page of results
+    to sink as soon as it has been checked and filtered, instead of keeping
+    them, so memory use stays the same however many terms are searched.
+
+    Returns: A list of length 3 where the first element is the number of
+    results saved, the second element is an error message, if one occured,
+    and the third element maps the name of each rule in consts.RESULT_FILTERS
+    to the number of results it removed, as in run_search.
+
+    Parameter preferences: A dictionary of user search preferences.
+    Precondition: preferences is generated by search_for_profiles.load_preferences()
+    and is based on a consts.py configuration which follows the rules
+    outlined in that file.
+
+    Parameter sink: Where each page of results is saved.
+    Precondition: sink is a ResultSink.
+
+    Parameter google: The API used to search.
+    Precondition: google is a GoogleSearchAPI, or None to create one with the
+    key and search engine in consts.py.
+    """
+    if google is None:
+        google = GoogleSearchAPI(c.API_KEY, c.SEARCH_ENGINE_ID)
+    queries = google.generate_queries(preferences)
+    result_filter = ResultFilter(c.RESULT_FILTERS)
+    num_added = 0
+    for batch in google.iter_search(queries, result_filter):
+        sink.write(batch)
+        num_added += len(batch)
+    google.session.close()
+    return [num_added, google.error, result_filter.rejected]
     
 def save_results(results):
     """
-    Saves search results to an Excel file at the location designated in consts.py.
+    Appends search results to the output file designated in consts.py.
 
     Parameter results: A list of search results.
     Precondition: results is a pandas DataFrame.
     """
-    try:
-        df = pd.read_excel(c.EXCEL_FILE_LOCATION)
-        new = pd.concat([df, results])
-        new.to_excel(c.EXCEL_FILE_LOCATION, index=False)
-    except:
-        results.to_excel(c.EXCEL_FILE_LOCATION, index=False)
+    get_result_sink(c.EXCEL_FILE_LOCATION).write(results)
 
 def execute_search():
     """
     Orchestrates the overall execution of the LinkedIn Search Tool.
 
-    Modifies: An Excel file to contain information about potential client 
+    Modifies: An output file to contain information about potential client 
     profiles the program finds via Google, and two pkl files that contain 
     information about previously indexed profiles and search queries.
 
@@ -84,13 +110,22 @@ def execute_search():
     """
     # Load search preferences
     preferences = load_preferences()
-    # Search and record results, index query
-    search_results = run_search(preferences)
-    # Save results to excel file
-    save_results(search_results[0])
+    # Search and record results, index query. Results are written to the
+    # output file as they arrive, unless it must be rewritten every time
+    sink = get_result_sink(c.EXCEL_FILE_LOCATION)
+    if sink.streaming:
+        num_added, er_msg, rejected = stream_search(preferences, sink)
+    else:
+        results, er_msg = run_search(preferences)
+        sink.write(results)
+        num_added = len(results)
+        rejected = results.attrs["rejected"]
     # Return message at end of program
-    if search_results[1] != "":
-        return search_results[1]
-    num_added = str(len(search_results[0]))
-    return "Search Completed: " + num_added + " new profiles added."
+    if er_msg != "":
+        return er_msg
+    message = "Search Completed: " + str(num_added) + " new profiles added."
+    removed = [name + ": " + str(count) for name, count in rejected.items() if count > 0]
+    if removed:
+        message += " Removed " + ", ".join(removed) + "."
+    return message
 
@@ -0,0 +1,116 @@
+"""
+The Search Session module of the LinkedIn Search Tool.
+
+This module manages the HTTP connections used to request results from
+Google's Custom Search API. Connections are pooled and kept alive between
+requests, so each page of results does not pay for a new TLS handshake,
+and responses are requested with gzip compression. Responses are decoded
+with orjson when it is installed, and with the standard json module 
+otherwise. Requests that time out, fail to connect, or return a body that
+is not JSON are reported as API errors, like any other failed request.
+
+Author: Ethan Baker
+"""
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import consts as c
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+API_URL = "https://www.googleapis.com/customsearch/v1"
+
+class SearchSession():
+    """
+    A class representing a reusable connection to the Custom Search API.
+
+    Contains the properties timeout, which is the (connect, read) timeout
+    in seconds used for each request, and transport, which is the requests
+    adapter that sends the requests. The underlying requests.Session is
+    created on first use and can be closed with close(), or by using the
+    object as a context manager. It is shared by every thread sending
+    requests, so it is only ever created by one of them.
+    """
+
+    def __init__(self, timeout=None, transport=None):
+        """
+        Creates a new SearchSession object.
+
+        Parameter timeout: The (connect, read) timeout of each request.
+        Precondition: timeout is a tuple of two numbers, or None to use
+        c.SEARCH_TIMEOUT.
+
+        Parameter transport: The adapter used to send requests.
+        Precondition: transport is a requests.adapters.BaseAdapter, or None
+        to use a pooled HTTPAdapter sized to c.SEARCH_CONCURRENCY. Tests can
+        pass a stand-in adapter to avoid sending real requests.
+        """
+        self.timeout = timeout if timeout is not None else c.SEARCH_TIMEOUT
+        self.transport = transport
+        self.session = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        """
+        Returns the underlying requests.Session, creating it if necessary.
+        """
+        with self.lock:
+            if self.session is None:
+                if self.transport is None:
+                    self.transport = HTTPAdapter(
+                        pool_connections=1, pool_maxsize=c.SEARCH_CONCURRENCY)
+                session = requests.Session()
+                session.mount("https://", self.transport)
+                session.mount("http://", self.transport)
+                # Google only compresses responses for clients that ask for
+                # gzip in both headers
+                session.headers.update({"Accept-Encoding": "gzip",
+                                        "User-Agent": "ConneXion (gzip)"})
+                self.session = session
+            return self.session
+
+    def get_json(self, params):
+        """
+        Sends a GET request to the Custom Search API.
+
+        Returns: A dictionary of the decoded JSON response. If the request
+        times out, cannot be sent, or its response is not JSON, a dictionary
+        like those the API returns for errors is returned instead, with the
+        code 408 for a timeout, 503 for a failed connection, and the HTTP
+        status code for a response that is not JSON.
+
+        Parameter params: The query string parameters of the request.
+        Precondition: params is a dictionary of Strings to Strings or ints.
+        """
+        try:
+            response = self.open().get(API_URL, params=params, timeout=self.timeout)
+        except requests.Timeout as error:
+            return {"error": {"code": 408, "message": str(error)}}
+        except requests.RequestException as error:
+            return {"error": {"code": 503, "message": str(error)}}
+        try:
+            return loads(response.content)
+        except ValueError:
+            return {"error": {"code": response.status_code,
+                              "message": "Response was not JSON."}}
+
+    def close(self):
+        """
+        Closes every pooled connection. The session is reopened on next use.
+        """
+        with self.lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,316 @@
+"""
+The Sharded Index module of the LinkedIn Search Tool.
+
+This module splits the profile index into many small .pkl shards, chosen
+by the first bits of the hash of each profile's slug, instead of keeping
+it in a single file. A shard is only loaded when a profile that belongs in
+it is checked or added, so a search only pays for the shards its results
+fall into. Loaded shards are kept in order of use, and the least recently
+used ones are dropped once they take up more memory than allowed, so the
+index can grow far larger than the memory available. Only shards with new
+profiles are written when the index is saved.
+
+Author: Ethan Baker
+"""
+import os
+import sys
+import pickle
+import shutil
+import tempfile
+from collections import OrderedDict
+from search_tool.indexed_data import IndexedData, file_version
+from search_tool.compact_index import slug_hash
+from search_tool.profile_url import profile_slug, profile_key
+from search_tool.file_lock import FileLock, atomic_open
+
+class ShardedIndexedData(IndexedData):
+    """
+    A class representing indexed data with a sharded profile index.
+
+    Contains the properties shard_dir, which is the String filepath to the
+    directory of shards, shard_bits, the number of bits of each slug hash
+    used to choose its shard, and memory_limit, the number of bytes loaded
+    shards may take up. Loaded shards are kept in shards, an OrderedDict
+    from the least to the most recently used shard, which maps each shard's
+    number to its set of profiles. sizes holds the estimated size in bytes
+    of each loaded shard, dirty the numbers of shards with unsaved changes,
+    and versions the file version of each loaded shard. The shards are made
+    from the .pkl profile index at profile_file the first time they are
+    used. The query index is the same as in IndexedData.
+    """
+
+    def __init__(self, profile_file, query_file, shard_dir, shard_bits, memory_limit):
+        """
+        Creates a ShardedIndexedData object.
+
+        Parameter profile_file: the filepath to the .pkl profile index.
+        Precondition: profile_file is a String containing a valid .pkl filepath.
+
+        Parameter query_file: the filepath to the query index.
+        Precondition: query_file is a String containing a valid .pkl filepath.
+
+        Parameter shard_dir: the filepath to the directory of shards.
+        Precondition: shard_dir is a String containing a valid filepath.
+
+        Parameter shard_bits: The number of hash bits that choose a shard.
+        Precondition: shard_bits is an int between 1 and 16.
+
+        Parameter memory_limit: The bytes loaded shards may take up.
+        Precondition: memory_limit is an int > 0.
+        """
+        super().__init__(profile_file, query_file)
+        self.shard_dir = shard_dir
+        self.shard_bits = shard_bits
+        self.memory_limit = memory_limit
+        self.shards = OrderedDict()
+        self.sizes = {}
+        self.versions = {}
+        self.dirty = set()
+        self.created = False
+
+    def shard_of(self, profile):
+        """
+        Returns: The number of the shard profile belongs in.
+
+        Parameter profile: A profile url.
+        Precondition: profile is a String.
+        """
+        return slug_hash(profile_slug(profile)) >> (64 - self.shard_bits)
+
+    def shard_file(self, shard):
+        """
+        Returns: The filepath to the shard numbered shard.
+
+        Parameter shard: The number of a shard.
+        Precondition: shard is an int >= 0 and < 2 ** self.shard_bits.
+        """
+        width = (self.shard_bits + 3) // 4
+        return os.path.join(self.shard_dir, format(shard, "0" + str(width) + "x") + ".pkl")
+
+    def create_shards(self):
+        """
+        Splits the .pkl profile index into shards, if shard_dir does not
+        exist yet.
+
+        The shards are written under a lock on shard_dir, so only one
+        process makes them, and through write_shards, so shard_dir only
+        appears once every shard has been written.
+        """
+        if self.created:
+            return
+        with FileLock(self.shard_dir):
+            if not os.path.isdir(self.shard_dir):
+                self.write_shards(self.load_indexed_profiles())
+        self.created = True
+
+    def write_shards(self, profiles):
+        """
+        Replaces shard_dir with new shards holding profiles.
+
+        The shards are written to a new directory next to shard_dir, which
+        is then renamed into place, and only after that is the old one
+        removed, so a crash leaves either the old shards or the new ones.
+        The caller must hold the lock on shard_dir.
+
+        Parameter profiles: The profiles to write.
+        Precondition: profiles is an iterable of Strings.
+        """
+        shards = {}
+        for profile in profiles:
+            profile = profile_key(profile)
+            shards.setdefault(self.shard_of(profile), set()).add(profile)
+        parent = os.path.dirname(os.path.abspath(self.shard_dir))
+        name = os.path.basename(os.path.normpath(self.shard_dir))
+        new_dir = tempfile.mkdtemp(dir=parent, prefix=name + ".", suffix=".tmp")
+        try:
+            for shard, members in shards.items():
+                path = os.path.join(new_dir, os.path.basename(self.shard_file(shard)))
+                with atomic_open(path) as file:
+                    pickle.dump(members, file)
+            old_dir = None
+            if os.path.isdir(self.shard_dir):
+                old_dir = tempfile.mkdtemp(dir=parent, prefix=name + ".", suffix=".old")
+                os.replace(self.shard_dir, os.path.join(old_dir, name))
+            os.replace(new_dir, self.shard_dir)
+        except:
+            shutil.rmtree(new_dir, ignore_errors=True)
+            raise
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def load_shard(self, shard):
+        """
+        Returns: The set of profiles in the shard numbered shard, loading it
+        if it is not loaded yet.
+
+        Parameter shard: The number of a shard.
+        Precondition: shard is an int >= 0 and < 2 ** self.shard_bits.
+        """
+        if shard in self.shards:
+            self.shards.move_to_end(shard)
+            return self.shards[shard]
+        self.create_shards()
+        path = self.shard_file(shard)
+        self.versions[shard] = file_version(path)
+        profiles = self.read_shard(path)
+        self.shards[shard] = profiles
+        self.sizes[shard] = sys.getsizeof(profiles) + sum(map(sys.getsizeof, profiles))
+        self.evict_shards()
+        return profiles
+
+    def read_shard(self, path):
+        """
+        Returns: The set of profiles in the shard file at path, or an empty
+        set if it cannot be read.
+
+        Parameter path: the filepath to a shard.
+        Precondition: path is a String.
+        """
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except:
+            return set()
+
+    def evict_shards(self):
+        """
+        Drops the least recently used shards until the loaded shards fit in
+        self.memory_limit, saving any that have unsaved changes first. The
+        most recently used shard is always kept.
+        """
+        while len(self.shards) > 1 and sum(self.sizes.values()) > self.memory_limit:
+            shard = next(iter(self.shards))
+            if shard in self.dirty:
+                self.save_shard(shard)
+            del self.shards[shard]
+            del self.sizes[shard]
+            del self.versions[shard]
+
+    def save_shard(self, shard):
+        """
+        Writes the shard numbered shard to its file.
+
+        The file is locked while it is written, and if another process has
+        written it since it was loaded, the profiles it added are merged in
+        first.
+
+        Parameter shard: The number of a loaded shard.
+        Precondition: shard is an int in self.shards.
+        """
+        path = self.shard_file(shard)
+        with FileLock(path):
+            if file_version(path) != self.versions[shard]:
+                try:
+                    with open(path, 'rb') as file:
+                        self.shards[shard].update(pickle.load(file))
+                except:
+                    pass
+            with atomic_open(path) as file:
+                pickle.dump(self.shards[shard], file)
+            self.versions[shard] = file_version(path)
+        self.dirty.discard(shard)
+
+    @property
+    def profiles(self):
+        """
+        The set of every indexed profile.
+
+        This is a full scan of the index, which reads every shard file and
+        so costs as much as the whole index, and is only meant for rebuilding
+        or exporting it. Profiles are checked one shard at a time instead.
+        The shard files are read directly, so the loaded shards are kept as
+        they are, and their unsaved changes are included.
+        """
+        self.create_shards()
+        profiles = set()
+        for shard in range(2 ** self.shard_bits):
+            if shard in self.shards:
+                profiles.update(self.shards[shard])
+            else:
+                profiles.update(self.read_shard(self.shard_file(shard)))
+        return profiles
+
+    @profiles.setter
+    def profiles(self, profiles):
+        with FileLock(self.shard_dir):
+            self.write_shards(profiles)
+        self.created = True
+        self.shards = OrderedDict()
+        self.sizes = {}
+        self.versions = {}
+        self.dirty = set()
+        self.profiles_dirty = False
+
+    def refresh(self):
+        """
+        Forgets any loaded shard whose file has changed since it was loaded
+        or saved, unless it has unsaved changes, and the query index as in
+        IndexedData.
+        """
+        for shard in list(self.shards):
+            if (shard not in self.dirty and
+                    file_version(self.shard_file(shard)) != self.versions[shard]):
+                del self.shards[shard]
+                del self.sizes[shard]
+                del self.versions[shard]
+        if (self._query_records is not None and not self.queries_dirty and
+                file_version(self.query_file) != self.queries_version):
+            self._query_records = None
+
+    def saved_profiles_version(self):
+        """
+        Returns: A tuple of the names and versions of every shard file, or
+        the version of the .pkl profile index if there are no shards yet.
+        """
+        if not os.path.isdir(self.shard_dir):
+            return file_version(self.profile_file)
+        return tuple((name, file_version(os.path.join(self.shard_dir, name)))
+                     for name in sorted(os.listdir(self.shard_dir))
+                     if name.endswith(".pkl"))
+
+    def check_dup_profile(self, profile):
+        """
+        Checks for a duplicate profile in the shard it belongs in.
+
+        Returns: True if profile has been indexed, otherwise False.
+
+        Parameter profile: the profile of the user that is being searched for.
+        Precondition: profile is a String that represents a url.
+        """
+        profile = profile_key(profile)
+        return profile in self.load_shard(self.shard_of(profile))
+
+    def add_indexed_profile(self, profile):
+        """
+        Adds a new profile url to the shard it belongs in.
+
+        Parameter profile: The profile being added.
+        Precondition: profile is a String.
+        """
+        profile = profile_key(profile)
+        shard = self.shard_of(profile)
+        profiles = self.load_shard(shard)
+        if profile not in profiles:
+            profiles.add(profile)
+            self.sizes[shard] += sys.getsizeof(profile)
+            self.dirty.add(shard)
+            self.profiles_dirty = True
+
+    def add_indexed_profiles(self, profiles):
+        """
+        Adds many profile urls to the shards they belong in.
+
+        Parameter profiles: The profiles being added.
+        Precondition: profiles is an iterable of Strings.
+        """
+        for profile in profiles:
+            self.add_indexed_profile(profile)
+        self.evict_shards()
+
+    def save_indexed_profiles(self):
+        """
+        Writes every shard with unsaved changes to its file.
+        """
+        for shard in list(self.dirty):
+            self.save_shard(shard)
+        self.profiles_dirty = False
@@ -0,0 +1,322 @@
+"""
+The SQLite Index module of the LinkedIn Search Tool.
+
+This module stores the profile and query indexes in a SQLite database
+instead of .pkl files. New profiles and queries are written in batched
+transactions as they are indexed, rather than by rewriting the whole index
+on every save, so saving costs grow with the number of new entries and a
+crash part of the way through a search only loses the last unsaved batch.
+The database uses write-ahead logging so that it can be read while it is
+being written to. The first time a database is opened, the existing .pkl
+indexes are copied into it.
+
+Author: Ethan Baker
+"""
+import time
+import sqlite3
+from search_tool.indexed_data import IndexedData
+from search_tool.profile_url import profile_key
+
+class SQLiteIndexedData(IndexedData):
+    """
+    A class representing indexed data that is stored in a SQLite database.
+
+    Contains the properties database_file, which is the String filepath to
+    the database, and batch_size, which is the number of new profiles or
+    queries that are held in memory before they are written. Profiles and
+    queries are kept in the tables profiles and queries, each keyed by its
+    String value. Each query also has the columns searched and new, which
+    hold its record as in IndexedData.query_records. The properties
+    profile_file and query_file are the .pkl indexes that are copied into a
+    new database. The connection to the database is opened by the first
+    thread that uses it, and sqlite3 only lets that thread use it, so a
+    SQLiteIndexedData object must only be used from one thread.
+    """
+
+    def __init__(self, profile_file, query_file, database_file, batch_size):
+        """
+        Creates a SQLiteIndexedData object.
+
+        Parameter profile_file: the filepath to the .pkl profile index.
+        Precondition: profile_file is a String containing a valid .pkl filepath.
+
+        Parameter query_file: the filepath to the .pkl query index.
+        Precondition: query_file is a String containing a valid .pkl filepath.
+
+        Parameter database_file: the filepath to the database.
+        Precondition: database_file is a String containing a valid filepath.
+
+        Parameter batch_size: The number of new entries written at once.
+        Precondition: batch_size is an int > 0.
+        """
+        super().__init__(profile_file, query_file)
+        self.database_file = database_file
+        self.batch_size = batch_size
+        self.connection = None
+        self.new_profiles = set()
+        self.new_queries = {}
+
+    def connect(self):
+        """
+        Returns: The connection to the database, opening it if necessary.
+
+        Creates the tables and copies in the .pkl indexes the first time
+        the database is opened.
+        """
+        if self.connection is None:
+            connection = sqlite3.connect(self.database_file)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS profiles "
+                                   "(profile TEXT PRIMARY KEY) WITHOUT ROWID")
+                connection.execute("CREATE TABLE IF NOT EXISTS queries "
+                                   "(query TEXT PRIMARY KEY, "
+                                   "searched REAL NOT NULL DEFAULT 0, "
+                                   "new INTEGER) WITHOUT ROWID")
+                connection.execute("CREATE TABLE IF NOT EXISTS migrations "
+                                   "(name TEXT PRIMARY KEY)")
+            self.connection = connection
+            self.migrate()
+        return self.connection
+
+    def migrate(self):
+        """
+        Copies the .pkl indexes into the database, once per database, and
+        adds the query record columns to databases made before they existed.
+        """
+        columns = [row[1] for row in
+                   self.connection.execute("PRAGMA table_info(queries)")]
+        if "searched" not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE queries ADD COLUMN "
+                                        "searched REAL NOT NULL DEFAULT 0")
+                self.connection.execute("ALTER TABLE queries ADD COLUMN new INTEGER")
+        done = self.connection.execute(
+            "SELECT 1 FROM migrations WHERE name = 'pkl'").fetchone()
+        if done is not None:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO profiles VALUES (?)",
+                ((profile,) for profile in self.load_indexed_profiles()))
+            records = self.load_indexed_queries()
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO queries VALUES (?, ?, ?)",
+                ((self.codec.decode(key),) + record
+                 for key, record in records.items()))
+            self.connection.execute("INSERT INTO migrations VALUES ('pkl')")
+
+    @property
+    def profiles(self):
+        """
+        The set of every indexed profile, read from the database.
+        """
+        self.save_indexed_profiles()
+        rows = self.connect().execute("SELECT profile FROM profiles")
+        return {row[0] for row in rows}
+
+    @profiles.setter
+    def profiles(self, profiles):
+        self.new_profiles = set()
+        with self.connect():
+            self.connection.execute("DELETE FROM profiles")
+            self.connection.executemany("INSERT OR IGNORE INTO profiles VALUES (?)",
+                                        ((profile_key(profile),) for profile in profiles))
+
+    @property
+    def queries(self):
+        """
+        The alphabetically sorted list of every indexed query, read from
+        the database.
+        """
+        self.save_indexed_queries()
+        rows = self.connect().execute("SELECT query FROM queries ORDER BY query")
+        return [row[0] for row in rows]
+
+    @property
+    def query_records(self):
+        """
+        The dictionary of compressed indexed queries and their records, read
+        from the database.
+        """
+        self.save_indexed_queries()
+        rows = self.connect().execute("SELECT query, searched, new FROM queries")
+        return {self.codec.encode(row[0]): (row[1], row[2]) for row in rows}
+
+    @queries.setter
+    def queries(self, queries):
+        self.new_queries = {}
+        with self.connect():
+            self.connection.execute("DELETE FROM queries")
+            self.connection.executemany("INSERT OR IGNORE INTO queries (query) VALUES (?)",
+                                        ((query,) for query in queries))
+
+    def refresh(self):
+        """
+        Does nothing, as the database is always read directly.
+        """
+        pass
+
+    def saved_profiles_version(self):
+        """
+        Returns: The number of profiles saved in the database.
+
+        The files of the database change whenever its write-ahead log is
+        opened or checkpointed, even if no profile was added, so the saved
+        profiles are counted instead. Profiles are only ever added, unless
+        the whole index is replaced.
+        """
+        return self.connect().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def check_dup_profile(self, profile):
+        """
+        Checks for duplicate profiles using the database's primary key.
+
+        Returns: True if profile has been indexed, otherwise False.
+
+        Parameter profile: the profile of the user that is being searched for.
+        Precondition: profile is a String that represents a url.
+        """
+        profile = profile_key(profile)
+        if profile in self.new_profiles:
+            return True
+        row = self.connect().execute(
+            "SELECT 1 FROM profiles WHERE profile = ?", (profile,)).fetchone()
+        return row is not None
+
+    def add_indexed_profile(self, profile):
+        """
+        Adds a new profile url to the index.
+
+        The profile is written with the rest of its batch once
+        self.batch_size new profiles have been added.
+
+        Parameter profile: The profile being added.
+        Precondition: profile is a String.
+        """
+        self.new_profiles.add(profile_key(profile))
+        if len(self.new_profiles) >= self.batch_size:
+            self.save_indexed_profiles()
+
+    def add_indexed_profiles(self, profiles):
+        """
+        Adds many profile urls to the index at once.
+
+        Parameter profiles: The profiles being added.
+        Precondition: profiles is an iterable of Strings.
+        """
+        self.new_profiles.update(map(profile_key, profiles))
+        if len(self.new_profiles) >= self.batch_size:
+            self.save_indexed_profiles()
+
+    def save_indexed_profiles(self):
+        """
+        Writes every new profile to the database in a single transaction.
+        """
+        if self.new_profiles:
+            with self.connect():
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO profiles VALUES (?)",
+                    ((profile,) for profile in self.new_profiles))
+            self.new_profiles = set()
+
+    def check_dup_query(self, query):
+        """
+        Checks for duplicate queries using the database's primary key.
+
+        Returns: True if query has been indexed, otherwise False.
+
+        Parameter query: A query search term.
+        Precondition: query is a String that represents a valid query.
+        """
+        if query in self.new_queries:
+            return True
+        row = self.connect().execute(
+            "SELECT 1 FROM queries WHERE query = ?", (query,)).fetchone()
+        return row is not None
+
+    def query_record(self, query):
+        """
+        Returns: The record of query, or (0, None) if it has not been indexed.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+        """
+        if query in self.new_queries:
+            return self.new_queries[query]
+        row = self.connect().execute(
+            "SELECT searched, new FROM queries WHERE query = ?", (query,)).fetchone()
+        return (0, None) if row is None else (row[0], row[1])
+
+    def add_indexed_query(self, query, new=None):
+        """
+        Adds a new query to the index, or updates its record if it is
+        already there.
+
+        The query is written with the rest of its batch once
+        self.batch_size new queries have been added.
+
+        Parameter query: A query search term.
+        Precondition: query is a String.
+
+        Parameter new: The number of new profiles the query returned.
+        Precondition: new is an int >= 0, or None if it is not known.
+        """
+        self.new_queries[query] = (time.time(), new)
+        if len(self.new_queries) >= self.batch_size:
+            self.save_indexed_queries()
+
+    def filter_new_queries(self, queries, max_age=None):
+        """
+        Yields the queries that have not been indexed, or that have expired,
+        in order.
+
+        Parameter queries: The queries to filter.
+        Precondition: queries is an iterable of Strings.
+
+        Parameter max_age: The age in seconds after which queries expire.
+        Precondition: max_age is a number >= 0, or None if queries never expire.
+        """
+        cutoff = None if max_age is None else time.time() - max_age
+        for query in queries:
+            if query in self.new_queries:
+                searched = self.new_queries[query][0]
+            else:
+                row = self.connect().execute(
+                    "SELECT searched FROM queries WHERE query = ?", (query,)).fetchone()
+                if row is None:
+                    yield query
+                    continue
+                searched = row[0]
+            if cutoff is not None and searched <= cutoff:
+                yield query
+
+    def save_indexed_queries(self, max_age=None):
+        """
+        Writes every new query to the database in a single transaction, and
+        evicts expired queries.
+
+        Parameter max_age: The age in seconds after which queries expire.
+        Precondition: max_age is a number >= 0, or None if queries never expire.
+        """
+        if self.new_queries:
+            with self.connect():
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO queries VALUES (?, ?, ?)",
+                    ((query,) + record for query, record in self.new_queries.items()))
+            self.new_queries = {}
+        if max_age is not None:
+            with self.connect():
+                self.connection.execute("DELETE FROM queries WHERE searched <= ?",
+                                        (time.time() - max_age,))
+
+    def close(self):
+        """
+        Writes any new entries and closes the connection to the database.
+        """
+        if self.connection is not None:
+            self.save_indexed_profiles()
+            self.save_indexed_queries()
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,106 @@
+"""
+The Yield Policy module of the LinkedIn Search Tool.
+
+This module decides when a search query has stopped returning enough new
+profiles to be worth another page of results, and records how many new
+profiles each query has returned. On a large profile index, the last pages
+of a query are often made up entirely of profiles that were already found,
+so stopping early saves API requests for queries that are still productive.
+
+Author: Ethan Baker
+"""
+import pickle
+from search_tool.profile_url import profile_key
+
+class YieldPolicy():
+    """
+    A class representing the rule used to stop paging through a query.
+
+    Contains the properties threshold, which is the smallest fraction of new
+    profiles a batch of pages can contain before its query is stopped, and
+    wave_size, which is the number of pages of a query requested at once
+    between checks. Also includes the property stats, a dictionary that maps
+    each query to a dictionary with the keys "pages", "results", "new", and
+    "total", which are the number of pages received, the number of results
+    on those pages, the number of those results that were new profiles, and
+    the query's totalResults, and the property stats_file, which is the
+    String filepath to the stats.
+    """
+
+    def __init__(self, stats_file, threshold, wave_size, indexed):
+        """
+        Creates a YieldPolicy object.
+
+        Parameter stats_file: the filepath to the yield stats.
+        Precondition: stats_file is a String containing a valid .pkl filepath.
+
+        Parameter threshold: The smallest fraction of new profiles to continue.
+        Precondition: threshold is a number between 0 and 1. If threshold is
+        0, queries are never stopped early.
+
+        Parameter wave_size: The number of pages requested between checks.
+        Precondition: wave_size is an int > 0.
+
+        Parameter indexed: The index that results are checked against.
+        Precondition: indexed is an IndexedData object.
+        """
+        self.stats_file = stats_file
+        self.threshold = threshold
+        self.wave_size = wave_size
+        self.indexed = indexed
+        self.stats = self.load_stats()
+        self.seen = set()
+
+    def load_stats(self):
+        """
+        Loads the dictionary of yield stats from self.stats_file.
+        """
+        try:
+            with open(self.stats_file, 'rb') as file:
+                return pickle.load(file)
+        except:
+            return {}
+
+    def keep_paging(self, query, pages):
+        """
+        Records the yield of pages of a query and decides whether to continue.
+
+        A result is new if it is not in self.indexed and has not been
+        seen earlier in the same search, under any link to the same profile.
+
+        Returns: True if the fraction of new profiles on pages is at least
+        self.threshold, otherwise False.
+
+        Parameter query: The query the pages were received for.
+        Precondition: query is a String.
+
+        Parameter pages: The pages of results received.
+        Precondition: pages is a list of decoded responses without errors.
+        """
+        stats = self.stats.setdefault(
+            query, {"pages": 0, "results": 0, "new": 0, "total": 0})
+        results = 0
+        new = 0
+        for data in pages:
+            search_info = data.get("searchInformation")
+            if search_info is not None and search_info.get("totalResults"):
+                stats["total"] = int(search_info.get("totalResults"))
+            for result in data.get("items") or []:
+                link = profile_key(result.get("link"))
+                results += 1
+                if link not in self.seen and not self.indexed.check_dup_profile(link):
+                    self.seen.add(link)
+                    new += 1
+        stats["pages"] += len(pages)
+        stats["results"] += results
+        stats["new"] += new
+        if results == 0:
+            return self.threshold == 0
+        return new / results >= self.threshold
+
+    def save_stats(self):
+        """
+        Saves the updated yield stats to self.stats_file.
+        """
+        with open(self.stats_file, 'wb') as file:
+            pickle.dump(self.stats, file)
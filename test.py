@@ -5,15 +5,73 @@ Author: Ethan Baker
 """
 import os
 import time
+import asyncio
 import random
 import pickle
+import shutil
+import json
+import urllib.parse
 import pandas as pd
 import numpy as np
+import requests
+import requests.adapters
 import search_tool.search_for_profiles as search_for_profiles
 import consts as c
 from search_tool.google_api import GoogleSearchAPI
-from search_tool.indexed_data import IndexedData
+from search_tool.indexed_data import IndexedData, get_indexed_data, file_version, PROFILE_FORMAT
+from search_tool.sqlite_index import SQLiteIndexedData
+from search_tool.compact_index import CompactIndexedData, slug_hash
+from search_tool.mmap_index import MmapIndexedData
+from search_tool.bloom_filter import BloomFilter, BloomIndexedData, load_bloom_filter
+from search_tool.journal_index import JournaledIndexedData, replay_log
+from search_tool.query_codec import QueryCodec
+from search_tool.sharded_index import ShardedIndexedData
+from search_tool.file_lock import FileLock, atomic_open
+from search_tool.profile_url import canonical_url, is_profile_url
+from search_tool.result_filter import ResultFilter
+from search_tool.result_sink import get_result_sink, export_excel, ResultSink, SQLiteResultSink
+from search_tool.profile_fields import extract_fields, FIELDS
+from search_tool.search_session import SearchSession
+from search_tool.response_cache import ResponseCache
+from search_tool.query_cursors import QueryCursors
+from search_tool.yield_policy import YieldPolicy
+from search_tool.query_scheduler import QueryScheduler, parse_query
+from search_tool.query_planner import QueryPlanner
 from connection_automator.linkedin_bot import LinkedinBot
+from connection_automator.bot_controller import BotController
+
+class LocalTransport(requests.adapters.BaseAdapter):
+    """
+    A stand-in for the Custom Search API that answers requests locally.
+
+    Each response is produced by calling respond with the query string
+    parameters of the request, which may raise to fail the request, or
+    return bytes to answer with a body that is not JSON and a 502 status.
+    Every request sent is recorded in requests.
+    """
+
+    def __init__(self, respond):
+        super().__init__()
+        self.respond = respond
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        query = urllib.parse.urlparse(request.url).query
+        params = dict(urllib.parse.parse_qsl(query))
+        data = self.respond(params)
+        response = requests.Response()
+        response.status_code = 200
+        if isinstance(data, bytes):
+            response.status_code = 502
+            response._content = data
+        else:
+            response._content = json.dumps(data).encode()
+        response.request = request
+        return response
+
+    def close(self):
+        pass
 
 def test_load_preferences():
     # 1 Location and Position
@@ -117,6 +175,123 @@ def test_save_results():
     os.remove(c.EXCEL_FILE_LOCATION)
     print("save_results passed.")
 
+def test_result_filter():
+    # Rows are removed by the first rule they fail, and counted against it
+    results = pd.DataFrame()
+    results["Title"] = ["Ethan Baker", "Cornell", "Alec Price", "Ethan Baker", "Google"]
+    results["Link"] = ["https://www.linkedin.com/in/ethbak",
+                       "https://www.linkedin.com/company/cornell",
+                       "https://uk.linkedin.com/in/alecprice",
+                       "https://www.linkedin.com/in/ethbak",
+                       None]
+    result_filter = ResultFilter(["profile_link", "duplicate_link"])
+    actual = result_filter.apply(results)
+    assert actual["Title"].tolist() == ["Ethan Baker", "Alec Price"], "test_result_filter failed."
+    assert actual.index.tolist() == [0, 1], "test_result_filter failed."
+    assert result_filter.rejected == {"profile_link": 2, "duplicate_link": 1}, "test_result_filter failed."
+
+    # Counts add up across batches, and custom rules can be plugged in
+    rules = {"short_title": lambda df: df["Title"].str.len() < 10}
+    result_filter = ResultFilter(["short_title"], rules)
+    result_filter.apply(results)
+    result_filter.apply(results.head(2))
+    assert result_filter.rejected == {"short_title": 4}, "test_result_filter failed."
+    assert ResultFilter(["profile_link"]).apply(pd.DataFrame()).empty, "test_result_filter failed."
+    print("result_filter passed.")
+
+def test_result_sink():
+    results = pd.DataFrame()
+    results["Title"] = ["Ethan Baker - Intern", "Alec Price - Financial Advisor"]
+    results["Link"] = ["https://www.linkedin.com/in/ethbak",
+                       "https://www.linkedin.com/in/alecprice"]
+    results["Snippets"] = ["1 year of experience", "33 years of experience"]
+
+    # Pages are appended to CSV files and SQLite tables as they arrive
+    for file in ["tests/excel_tests/results.csv", "tests/excel_tests/results.db"]:
+        sink = get_result_sink(file)
+        assert sink.streaming, "test_result_sink failed."
+        sink.write(results.head(1))
+        sink.write(results.tail(1))
+        sink.write(results.head(0))
+        assert sink.read().equals(results), "test_result_sink failed."
+
+    # A row cut off by a crash is dropped before the next page is appended
+    with open("tests/excel_tests/results.csv", 'a') as file:
+        file.write("Ana Yavorska,https://www.linkedin")
+    sink = get_result_sink("tests/excel_tests/results.csv")
+    sink.write(results)
+    assert sink.read().equals(pd.concat([results, results], ignore_index=True)), \
+        "test_result_sink failed."
+
+    # New columns are added to CSV files, keeping the rows already saved
+    sink.write(results.assign(Years=[1, 33])[["Years", "Link", "Title", "Snippets"]])
+    saved = sink.read()
+    assert saved.columns.tolist() == ["Title", "Link", "Snippets", "Years"], "test_result_sink failed."
+    assert saved["Link"].tolist() == results["Link"].tolist() * 3, "test_result_sink failed."
+    assert saved["Years"].isna().sum() == 4 and saved["Years"].tolist()[4:] == [1, 33], "test_result_sink failed."
+    sink.write(results)
+    assert len(sink.read()) == 8 and sink.read()["Years"].isna().sum() == 6, "test_result_sink failed."
+    os.remove("tests/excel_tests/results.csv")
+
+    # Sinks must say how results are written and read
+    try:
+        ResultSink("tests/excel_tests/results.csv")
+        assert False, "test_result_sink failed."
+    except TypeError:
+        pass
+
+    # New columns are added to SQLite tables
+    extra = results.assign(Years=[1, 33])
+    sink = SQLiteResultSink("tests/excel_tests/results.db")
+    sink.write(extra)
+    years = sink.read()["Years"]
+    assert years.isna().tolist() == [True, True, False, False], "test_result_sink failed."
+    assert years.tolist()[2:] == [1, 33], "test_result_sink failed."
+
+    # Excel workbooks are exported on demand
+    export_excel(sink, "tests/excel_tests/results.xlsx")
+    xl = pd.read_excel("tests/excel_tests/results.xlsx")
+    assert xl["Link"].tolist() == results["Link"].tolist() * 2, "test_result_sink failed."
+    assert not get_result_sink("tests/excel_tests/results.xlsx").streaming, "test_result_sink failed."
+    os.remove("tests/excel_tests/results.db")
+    os.remove("tests/excel_tests/results.xlsx")
+    print("result_sink passed.")
+
+def test_stream_search():
+    locations = (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, 
+                 c.QUERY_CURSOR_LOCATION, c.YIELD_STATS_LOCATION, 
+                 c.REQUEST_USAGE_LOCATION, c.USE_RESPONSE_CACHE)
+    c.PROFILE_INDEX_LOCATION = "tests/pkl_tests/stream_profiles.pkl"
+    c.QUERY_INDEX_LOCATION = "tests/pkl_tests/stream_queries.pkl"
+    c.QUERY_CURSOR_LOCATION = "tests/pkl_tests/stream_cursors.pkl"
+    c.YIELD_STATS_LOCATION = "tests/pkl_tests/stream_yield_stats.pkl"
+    c.REQUEST_USAGE_LOCATION = "tests/pkl_tests/stream_request_usage.pkl"
+    c.USE_RESPONSE_CACHE = False
+    def respond(params):
+        items = [{"title": "Ethan Baker", "snippet": "", "link": "https://www.linkedin.com/in/ethbak"},
+                 {"title": "Cornell", "snippet": "", "link": "https://www.linkedin.com/company/cornell"}]
+        return {"searchInformation": {"totalResults": "2"}, "items": items}
+    google = GoogleSearchAPI("key", "engine", SearchSession(transport=LocalTransport(respond)))
+    preferences = {"location":["Ithaca"], "position":["Intern"], "exp_op":"<", "exp_num":1}
+
+    # Results are saved as they arrive, and the results each rule removed are counted
+    sink = get_result_sink("tests/excel_tests/stream_results.csv")
+    num_added, er_msg, rejected = search_for_profiles.stream_search(preferences, sink, google)
+    assert num_added == 1 and er_msg == "", "test_stream_search failed."
+    assert rejected == {"profile_link": 1, "duplicate_link": 0}, "test_stream_search failed."
+    assert sink.read()["Link"].tolist() == ["https://www.linkedin.com/in/ethbak"], "test_stream_search failed."
+
+    os.remove("tests/excel_tests/stream_results.csv")
+    for file in [c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, 
+                 c.QUERY_CURSOR_LOCATION, c.YIELD_STATS_LOCATION, 
+                 c.REQUEST_USAGE_LOCATION]:
+        if os.path.exists(file):
+            os.remove(file)
+    (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, c.QUERY_CURSOR_LOCATION,
+     c.YIELD_STATS_LOCATION, c.REQUEST_USAGE_LOCATION, 
+     c.USE_RESPONSE_CACHE) = locations
+    print("stream_search passed.")
+
 def test_generate_queries():
     # 1 position and location, operator is "="
     preferences = {"location":["Cazenovia"], "position":["Intern"], 
@@ -198,16 +373,468 @@ def test_generate_queries():
 
     print("generate_queries passed.")
 
+def test_iter_queries():
+    google = GoogleSearchAPI(c.API_KEY, c.SEARCH_ENGINE_ID)
+    preferences = {"location":["Cazenovia", "Syracuse"], 
+                   "position":["Intern", "CEO"], 
+                    "exp_op":"<", "exp_num":2}
+
+    # Queries are yielded lazily, in the same order as generate_queries
+    queries = google.iter_queries(preferences)
+    assert next(queries) == 'site:linkedin.com/in intitle:("Cazenovia") AND ("Intern") -"year" -"years"', "test_iter_queries failed."
+    assert len(list(queries)) == 7, "test_iter_queries failed."
+    c.REPEAT_QUERIES = True
+    assert list(google.iter_queries(preferences)) == google.generate_queries(preferences), "test_iter_queries failed."
+    c.REPEAT_QUERIES = False
+    print("iter_queries passed.")
+
+def test_fetch_all():
+    google = GoogleSearchAPI(c.API_KEY, c.SEARCH_ENGINE_ID)
+    def fetch_page(term, start):
+        if term == "error":
+            return {"error": {"code": 429}}
+        return {"searchInformation": {"totalResults": "25"},
+                "items": [{"link": term + str(start)}]}
+    google.fetch_page = fetch_page
+
+    # Every page of every term is fetched, in the same order as terms
+    searched, code = asyncio.run(google.fetch_all(["CEO", "Intern"]))
+    assert code is None, "test_fetch_all failed."
+    assert [result[0] for result in searched] == ["CEO", "Intern"], "test_fetch_all failed."
+    links = [page["items"][0]["link"] for page in searched[0][1]]
+    assert links == ["CEO1", "CEO11", "CEO21"], "test_fetch_all failed."
+    assert searched[0][2:] == (31, 25), "test_fetch_all failed."
+
+    # Requests stop after an error, and unfinished terms report their progress
+    c.SEARCH_CONCURRENCY = 1
+    searched, code = asyncio.run(google.fetch_all(["CEO", "error", "Intern"]))
+    assert code == 429, "test_fetch_all failed."
+    assert [result[0] for result in searched] == ["CEO", "error"], "test_fetch_all failed."
+    assert searched[0][2:] == (11, 25), "test_fetch_all failed."
+    assert searched[1] == ("error", [], 1, 100), "test_fetch_all failed."
+
+    # Resumed terms start from their first missing page
+    searched, code = asyncio.run(google.fetch_all(["CEO"], {"CEO": (21, 25)}))
+    links = [page["items"][0]["link"] for page in searched[0][1]]
+    assert links == ["CEO21"], "test_fetch_all failed."
+    assert searched[0][2:] == (31, 25), "test_fetch_all failed."
+
+    # Terms are stopped once their pages stop yielding new profiles
+    def fetch_page(term, start):
+        link = "old" if start > 21 else term + str(start)
+        return {"searchInformation": {"totalResults": "100"},
+                "items": [{"link": link}]}
+    google.fetch_page = fetch_page
+    index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                        "tests/pkl_tests/indexed_queries_full.pkl")
+    index.profiles = ["old"]
+    policy = YieldPolicy("tests/pkl_tests/yield_stats.pkl", 0.5, 2, index)
+    searched, code = asyncio.run(google.fetch_all(["CEO"], None, policy))
+    assert len(searched[0][1]) == 5 and searched[0][2:] == (51, 51), "test_fetch_all failed."
+    c.SEARCH_CONCURRENCY = 8
+    print("fetch_all passed.")
+
+def test_search():
+    locations = (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, 
+                 c.QUERY_CURSOR_LOCATION, c.YIELD_STATS_LOCATION, 
+                 c.REQUEST_USAGE_LOCATION, c.USE_RESPONSE_CACHE)
+    c.PROFILE_INDEX_LOCATION = "tests/pkl_tests/search_profiles.pkl"
+    c.QUERY_INDEX_LOCATION = "tests/pkl_tests/search_queries.pkl"
+    c.QUERY_CURSOR_LOCATION = "tests/pkl_tests/search_cursors.pkl"
+    c.YIELD_STATS_LOCATION = "tests/pkl_tests/search_yield_stats.pkl"
+    c.REQUEST_USAGE_LOCATION = "tests/pkl_tests/search_request_usage.pkl"
+    c.USE_RESPONSE_CACHE = False
+    quota = [4]
+    def respond(params):
+        if quota[0] == 0:
+            return {"error": {"code": 429}}
+        quota[0] -= 1
+        start = int(params["start"])
+        items = [{"title": params["q"] + " " + str(start + i), 
+                  "link": "https://www.linkedin.com/in/" + params["q"] + str(start + i),
+                  "snippet": ""} for i in range(10)]
+        # Every query shares its first result
+        items[0]["link"] = "https://www.linkedin.com/in/shared"
+        return {"searchInformation": {"totalResults": "30"}, "items": items}
+    c.SEARCH_CONCURRENCY = 1
+    google = GoogleSearchAPI("key", "engine", SearchSession(transport=LocalTransport(respond)))
+
+    # Quota runs out part of the way through the second query
+    df, er_msg = google.search(["ceo", "cfo"])
+    assert er_msg == "API request limit reached.", "test_search failed."
+    assert len(df) == 37 and not df["Link"].duplicated().any(), "test_search failed."
+    index = IndexedData(c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION)
+    assert len(index.queries) == 1, "test_search failed."
+    finished = index.queries[0]
+    unfinished = "cfo" if finished == "ceo" else "ceo"
+    cursors = QueryCursors(c.QUERY_CURSOR_LOCATION)
+    assert cursors.cursors == {unfinished: (11, 30)}, "test_search failed."
+
+    # The unfinished query resumes from its second page
+    quota[0] = 2
+    df, er_msg = google.search([unfinished])
+    assert er_msg == "", "test_search failed."
+    assert len(df) == 18, "test_search failed."
+    assert QueryCursors(c.QUERY_CURSOR_LOCATION).cursors == {}, "test_search failed."
+
+    # Requests are counted against the daily budget, including the failed one
+    scheduler = QueryScheduler({}, c.REQUEST_USAGE_LOCATION, 100)
+    assert scheduler.usage[1] == 7, "test_search failed."
+
+    for file in [c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, 
+                 c.QUERY_CURSOR_LOCATION, c.YIELD_STATS_LOCATION, 
+                 c.REQUEST_USAGE_LOCATION]:
+        os.remove(file)
+    (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, c.QUERY_CURSOR_LOCATION,
+     c.YIELD_STATS_LOCATION, c.REQUEST_USAGE_LOCATION, 
+     c.USE_RESPONSE_CACHE) = locations
+    c.SEARCH_CONCURRENCY = 8
+    print("search passed.")
+
+def test_iter_search():
+    locations = (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, 
+                 c.QUERY_CURSOR_LOCATION, c.YIELD_STATS_LOCATION, 
+                 c.REQUEST_USAGE_LOCATION, c.USE_RESPONSE_CACHE)
+    c.PROFILE_INDEX_LOCATION = "tests/pkl_tests/iter_profiles.pkl"
+    c.QUERY_INDEX_LOCATION = "tests/pkl_tests/iter_queries.pkl"
+    c.QUERY_CURSOR_LOCATION = "tests/pkl_tests/iter_cursors.pkl"
+    c.YIELD_STATS_LOCATION = "tests/pkl_tests/iter_yield_stats.pkl"
+    c.REQUEST_USAGE_LOCATION = "tests/pkl_tests/iter_request_usage.pkl"
+    c.USE_RESPONSE_CACHE = False
+    def respond(params):
+        start = int(params["start"])
+        items = [{"title": params["q"], "snippet": "",
+                  "link": "https://www.linkedin.com/in/" + params["q"] + str(start + i)}
+                 for i in range(10)]
+        return {"searchInformation": {"totalResults": "30"}, "items": items}
+    google = GoogleSearchAPI("key", "engine", SearchSession(transport=LocalTransport(respond)))
+
+    # One batch is yielded for each page, or for each term
+    batches = list(google.iter_search(["ceo", "cfo"]))
+    assert [len(batch) for batch in batches] == [10] * 6, "test_iter_search failed."
+    assert google.error == "", "test_iter_search failed."
+    batches = list(google.iter_search(["cto", "coo"], per_term=True))
+    assert [len(batch) for batch in batches] == [30, 30], "test_iter_search failed."
+    assert batches[0]["Title"].nunique() == 1, "test_iter_search failed."
+
+    # Indexes are saved even if the batches stop being read part of the way through
+    batches = google.iter_search(["cmo", "cio"])
+    next(batches)
+    batches.close()
+    index = IndexedData(c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION)
+    assert len(index.profiles) == 130 and len(index.queries) == 4, "test_iter_search failed."
+
+    # Extracted fields are saved to a CSV file made before they were extracted
+    with open("tests/excel_tests/iter_results.csv", 'w') as file:
+        file.write("Title,Link,Snippets\nAlec,https://www.linkedin.com/in/alec,\n")
+    sink = get_result_sink("tests/excel_tests/iter_results.csv")
+    for batch in google.iter_search(["vp"]):
+        sink.write(batch)
+    saved = sink.read()
+    assert saved.columns.tolist() == ["Title", "Link", "Snippets"] + FIELDS, "test_iter_search failed."
+    assert len(saved) == 31 and saved["Name"].tolist()[1:] == ["vp"] * 30, "test_iter_search failed."
+    assert saved["Link"][0] == "https://www.linkedin.com/in/alec", "test_iter_search failed."
+    os.remove("tests/excel_tests/iter_results.csv")
+
+    # Terms are searched until the daily budget is used, not until it is
+    # used by their estimated costs
+    def respond_once(params):
+        return {"searchInformation": {"totalResults": "5"},
+                "items": [{"title": params["q"], "snippet": "",
+                           "link": "https://www.linkedin.com/in/" + params["q"]}]}
+    google = GoogleSearchAPI("key", "engine", SearchSession(transport=LocalTransport(respond_once)))
+    budget = c.DAILY_REQUEST_BUDGET
+    c.DAILY_REQUEST_BUDGET = QueryScheduler({}, c.REQUEST_USAGE_LOCATION, 0).usage[1] + 25
+    batches = list(google.iter_search(["t" + str(i) for i in range(20)]))
+    assert len(batches) == 20 and google.requests_sent == 20, "test_iter_search failed."
+    assert google.error == "", "test_iter_search failed."
+    batches = list(google.iter_search(["u" + str(i) for i in range(10)]))
+    assert len(batches) == 5 and google.requests_sent == 25, "test_iter_search failed."
+    assert google.error == "Daily request budget reached.", "test_iter_search failed."
+    c.DAILY_REQUEST_BUDGET = budget
+
+    for file in [c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, 
+                 c.QUERY_CURSOR_LOCATION, c.YIELD_STATS_LOCATION, 
+                 c.REQUEST_USAGE_LOCATION]:
+        os.remove(file)
+    (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, c.QUERY_CURSOR_LOCATION,
+     c.YIELD_STATS_LOCATION, c.REQUEST_USAGE_LOCATION, 
+     c.USE_RESPONSE_CACHE) = locations
+    print("iter_search passed.")
+
+def test_extract_fields():
+    results = pd.DataFrame()
+    results["Title"] = ["Ethan Baker - Intern - Cornell University | LinkedIn",
+                        "Alec Price - Financial Advisor | LinkedIn",
+                        "Ana Yavorska | LinkedIn",
+                        None]
+    results["Link"] = ["https://www.linkedin.com/in/ethbak",
+                       "https://www.linkedin.com/in/alecprice",
+                       "https://www.linkedin.com/in/anayavorska",
+                       "https://www.linkedin.com/in/unknown"]
+    results["Snippets"] = ["Ithaca, New York, United States · Intern · "
+                           "Experience: Cornell University · 500+ connections on LinkedIn.",
+                           "Location: Syracuse · 1,204 connections on LinkedIn. "
+                           "Price Financial · 33 years of experience",
+                           "",
+                           None]
+    actual = extract_fields(results)
+    assert actual.columns.tolist()[:3] == ["Title", "Link", "Snippets"], "test_extract_fields failed."
+    assert actual["Name"].tolist()[:3] == ["Ethan Baker", "Alec Price", "Ana Yavorska"], "test_extract_fields failed."
+    assert actual["Headline"].tolist()[:2] == ["Intern", "Financial Advisor"], "test_extract_fields failed."
+    assert actual["Company"][0] == "Cornell University", "test_extract_fields failed."
+    assert actual["Location"].tolist()[:2] == ["Ithaca, New York, United States", "Syracuse"], "test_extract_fields failed."
+    assert actual["Years"][1] == 33 and str(actual["Years"].dtype) == "Int64", "test_extract_fields failed."
+    assert actual["Connections"].tolist()[:2] == [500, 1204], "test_extract_fields failed."
+
+    # Missing parts are left missing
+    assert actual.iloc[3][["Name", "Headline", "Company", "Location",
+                           "Years", "Connections"]].isna().all(), "test_extract_fields failed."
+    assert pd.isna(actual["Company"][1]) and pd.isna(actual["Years"][0]), "test_extract_fields failed."
+    assert extract_fields(actual).columns.equals(actual.columns), "test_extract_fields failed."
+    print("extract_fields passed.")
+
+def test_fetch_page():
+    transport = LocalTransport(lambda params: {"items": [{"link": params["q"]}]})
+    session = SearchSession(transport=transport)
+    cache = ResponseCache("tests/pkl_tests/response_cache.pkl", 60, 10)
+    google = GoogleSearchAPI("key", "engine", session, cache)
+
+    # Parameters are encoded and the response is decoded
+    data = google.fetch_page('intitle:("CEO") & "1 year"', 11)
+    assert data == {"items": [{"link": 'intitle:("CEO") & "1 year"'}]}, "test_fetch_page failed."
+    request = transport.requests[0]
+    assert "start=11" in request.url and "key=key" in request.url, "test_fetch_page failed."
+    assert "fields=searchInformation" in request.url, "test_fetch_page failed."
+    assert request.headers["Accept-Encoding"] == "gzip", "test_fetch_page failed."
+
+    # The same session is reused between requests, and reopened after closing
+    first = session.open()
+    google.fetch_page("CEO", 1)
+    assert session.open() is first, "test_fetch_page failed."
+    session.close()
+    assert session.open() is not first, "test_fetch_page failed."
+    assert len(transport.requests) == 2, "test_fetch_page failed."
+
+    # Cached pages are not requested again
+    google.fetch_page("CEO", 1)
+    assert len(transport.requests) == 2, "test_fetch_page failed."
+
+    # Replaying never sends requests
+    c.CACHE_REPLAY_ONLY = True
+    assert google.fetch_page("CEO", 1) == {"items": [{"link": "CEO"}]}, "test_fetch_page failed."
+    data = google.fetch_page("CFO", 1)
+    assert data == {"searchInformation": {"totalResults": "0"}}, "test_fetch_page failed."
+    assert len(transport.requests) == 2, "test_fetch_page failed."
+    c.CACHE_REPLAY_ONLY = False
+    session.close()
+
+    # Failed requests are returned as API errors instead of raising
+    def respond(params):
+        if params["q"] == "slow":
+            raise requests.Timeout("timed out")
+        if params["q"] == "down":
+            raise requests.ConnectionError("refused")
+        return b"<html>Bad Gateway</html>"
+    session = SearchSession(transport=LocalTransport(respond))
+    codes = [session.get_json({"q": term})["error"]["code"] for term in ["slow", "down", "html"]]
+    assert codes == [408, 503, 502], "test_fetch_page failed."
+    session.close()
+    print("fetch_page passed.")
+
+def test_response_cache():
+    # Missing file
+    cache = ResponseCache("tests/pkl_tests/response_cache.pkl", 60, 2)
+    assert cache.get("CEO", 1) is None, "test_response_cache failed."
+
+    # Fresh and expired responses
+    cache.put("CEO", 1, {"items": []})
+    assert cache.get("CEO", 1) == {"items": []}, "test_response_cache failed."
+    cache.entries[("CEO", 11)] = (time.time() - 120, {"items": [1]})
+    assert cache.get("CEO", 11) is None, "test_response_cache failed."
+    assert cache.get("CEO", 11, True) == {"items": [1]}, "test_response_cache failed."
+
+    # Saving drops expired responses, then the oldest responses
+    cache.entries[("CEO", 21)] = (time.time() - 30, {"items": [2]})
+    cache.entries[("CEO", 31)] = (time.time() - 20, {"items": [3]})
+    cache.save()
+    cache = ResponseCache("tests/pkl_tests/response_cache.pkl", 60, 2)
+    assert sorted(cache.load()) == [("CEO", 1), ("CEO", 31)], "test_response_cache failed."
+
+    os.remove("tests/pkl_tests/response_cache.pkl")
+    print("response_cache passed.")
+
+def test_query_cursors():
+    # Missing file
+    cursors = QueryCursors("tests/pkl_tests/query_cursors.pkl")
+    assert cursors.cursors == {}, "test_query_cursors failed."
+
+    # Set, update, and remove cursors
+    cursors.set_cursor("CEO", 11, 100)
+    cursors.set_cursor("CFO", 41, 58)
+    cursors.set_cursor("CEO", 31, 100)
+    cursors.remove_cursor("CFO")
+    cursors.remove_cursor("Intern")
+    assert cursors.cursors == {"CEO": (31, 100)}, "test_query_cursors failed."
+
+    # Save and load
+    cursors.save_cursors()
+    cursors = QueryCursors("tests/pkl_tests/query_cursors.pkl")
+    assert cursors.cursors == {"CEO": (31, 100)}, "test_query_cursors failed."
+
+    # Cursors of queries that were merged into others are forgotten
+    one = 'site:linkedin.com/in intitle:("Ithaca") AND ("CEO") AND ("1 year")'
+    merged = 'site:linkedin.com/in intitle:("Ithaca") AND ("CEO") AND ("1 year" OR "2 years")'
+    other = 'site:linkedin.com/in intitle:("Boston") AND ("CEO") AND ("1 year")'
+    cursors.set_cursor(one, 11, 100)
+    cursors.set_cursor(other, 11, 100)
+    cursors.prune_cursors([merged])
+    assert cursors.cursors == {"CEO": (31, 100), other: (11, 100)}, "test_query_cursors failed."
+    cursors.prune_cursors([other])
+    assert other in cursors.cursors, "test_query_cursors failed."
+
+    os.remove("tests/pkl_tests/query_cursors.pkl")
+    print("query_cursors passed.")
+
+def test_yield_policy():
+    index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                        "tests/pkl_tests/indexed_queries_full.pkl")
+    policy = YieldPolicy("tests/pkl_tests/yield_stats.pkl", 0.5, 3, index)
+    assert policy.stats == {}, "test_yield_policy failed."
+
+    # Mostly new profiles
+    page = {"searchInformation": {"totalResults": "42"},
+            "items": [{"link": "fred"}, {"link": "zoe"}, {"link": "ethan"}]}
+    assert policy.keep_paging("CEO", [page]) is True, "test_yield_policy failed."
+
+    # Profiles seen earlier in the search are not new
+    page = {"items": [{"link": "fred"}, {"link": "alec"}, {"link": "bob"}]}
+    assert policy.keep_paging("CEO", [page]) is False, "test_yield_policy failed."
+
+    # Empty pages stop the query
+    assert policy.keep_paging("CEO", [{}]) is False, "test_yield_policy failed."
+    expected = {"CEO": {"pages": 3, "results": 6, "new": 3, "total": 42}}
+    assert policy.stats == expected, "test_yield_policy failed."
+
+    # Every link to the same profile is one new result
+    page = {"items": [{"link": "https://www.linkedin.com/in/carl"},
+                      {"link": "https://uk.linkedin.com/in/Carl/"}]}
+    policy.keep_paging("CFO", [page])
+    assert policy.stats["CFO"]["new"] == 1, "test_yield_policy failed."
+    del policy.stats["CFO"]
+
+    # Save and load
+    policy.save_stats()
+    policy = YieldPolicy("tests/pkl_tests/yield_stats.pkl", 0.5, 3, index)
+    assert policy.stats == expected, "test_yield_policy failed."
+
+    os.remove("tests/pkl_tests/yield_stats.pkl")
+    print("yield_policy passed.")
+
+def test_query_scheduler():
+    ceo_nyc = 'site:linkedin.com/in intitle:("NYC") AND ("CEO") AND ("3 years")'
+    cfo_nyc = 'site:linkedin.com/in intitle:("NYC") AND ("CFO") AND ("1 year")'
+    ceo_la = 'site:linkedin.com/in intitle:("LA") AND ("CEO") -"year" -"years"'
+    cfo_la = 'site:linkedin.com/in intitle:("LA") AND ("CFO") AND ("2 years")'
+
+    # Parse queries
+    assert parse_query(ceo_nyc) == ("NYC", "CEO", 3), "test_query_scheduler failed."
+    assert parse_query(cfo_nyc) == ("NYC", "CFO", 1), "test_query_scheduler failed."
+    assert parse_query(ceo_la) == ("LA", "CEO", 0), "test_query_scheduler failed."
+    assert parse_query("CEO") is None, "test_query_scheduler failed."
+
+    # Estimates use the query's own history, then its features, then the prior
+    stats = {ceo_nyc: {"pages": 8, "results": 80, "new": 72, "total": 75},
+             cfo_nyc: {"pages": 2, "results": 20, "new": 0, "total": 15}}
+    scheduler = QueryScheduler(stats, "tests/pkl_tests/request_usage.pkl", 12)
+    assert scheduler.prior == 7.2, "test_query_scheduler failed."
+    assert round(scheduler.estimate_yield(ceo_nyc), 2) == 8.64, "test_query_scheduler failed."
+    assert round(scheduler.estimate_yield(cfo_nyc), 2) == 3.6, "test_query_scheduler failed."
+    assert round(scheduler.estimate_yield(ceo_la), 2) == 8.64, "test_query_scheduler failed."
+    assert round(scheduler.estimate_yield(cfo_la), 2) == 3.6, "test_query_scheduler failed."
+    assert scheduler.estimate_cost(ceo_nyc) == 8, "test_query_scheduler failed."
+    assert scheduler.estimate_cost(ceo_la) == 5, "test_query_scheduler failed."
+    assert scheduler.estimate_cost(ceo_la, (71, 100)) == 3, "test_query_scheduler failed."
+
+    # Unfinished queries first, then by yield, within the budget
+    planned = scheduler.schedule([cfo_la, cfo_nyc, ceo_nyc, ceo_la], {cfo_la: (91, 100)})
+    assert planned == [cfo_la, ceo_nyc, cfo_nyc], "test_query_scheduler failed."
+
+    # Usage counts against today's budget
+    scheduler.record_usage(10)
+    scheduler.save_usage()
+    scheduler = QueryScheduler(stats, "tests/pkl_tests/request_usage.pkl", 12)
+    assert scheduler.remaining_budget() == 2, "test_query_scheduler failed."
+    assert scheduler.schedule([ceo_nyc, cfo_nyc], {}) == [cfo_nyc], "test_query_scheduler failed."
+
+    os.remove("tests/pkl_tests/request_usage.pkl")
+    print("query_scheduler passed.")
+
+def test_query_planner():
+    base = 'site:linkedin.com/in intitle:("NYC") AND ("CEO")'
+    queries = [base + ' -"year" -"years"', base + ' AND ("1 year")', 
+               base + ' AND ("2 years")', base + ' AND ("3 years")',
+               base + ' AND ("4 years")', base + ' AND ("5 years")']
+    stats = {queries[0]: {"pages": 1, "results": 4, "new": 4, "total": 4},
+             queries[1]: {"pages": 1, "results": 5, "new": 5, "total": 5},
+             queries[2]: {"pages": 1, "results": 8, "new": 8, "total": 8},
+             queries[4]: {"pages": 10, "results": 100, "new": 90, "total": 4500},
+             queries[4] + ' "University"': 
+                {"pages": 10, "results": 100, "new": 90, "total": 2000}}
+    with open("tests/pkl_tests/planner_stats.pkl", 'wb') as file:
+        pickle.dump(stats, file)
+    planner = QueryPlanner("tests/pkl_tests/planner_stats.pkl", 10, 3, ["University", "Present"])
+
+    # Unsearched queries are estimated from the others with the same location and position
+    totals = planner.estimate_totals(queries)
+    assert totals[queries[3]] == 1129.25, "test_query_planner failed."
+
+    # Sparse years are merged, saturated queries are split
+    expected = [queries[0],
+                base + ' AND ("1 year" OR "2 years")',
+                queries[3],
+                queries[4] + ' "University" "Present"',
+                queries[4] + ' "University" -"Present"',
+                queries[4] + ' -"University"',
+                queries[5]]
+    assert planner.plan(queries) == expected, "test_query_planner failed."
+
+    # No stats
+    planner = QueryPlanner("tests/pkl_tests/missing.pkl", 10, 3, ["University"])
+    assert planner.plan(queries) == queries, "test_query_planner failed."
+
+    # Searched queries are left out before sparse ones are merged
+    locations = (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, c.YIELD_STATS_LOCATION)
+    c.PROFILE_INDEX_LOCATION = "tests/pkl_tests/planner_profiles.pkl"
+    c.QUERY_INDEX_LOCATION = "tests/pkl_tests/planner_queries.pkl"
+    c.YIELD_STATS_LOCATION = "tests/pkl_tests/planner_stats.pkl"
+    google = GoogleSearchAPI(c.API_KEY, c.SEARCH_ENGINE_ID)
+    preferences = {"location":["NYC"], "position":["CEO"], "exp_op":"<", "exp_num":4}
+    generated = list(google.iter_queries(preferences))
+    stats = {query: {"pages": 1, "results": 5, "new": 5, "total": 5} for query in generated[1:]}
+    with open(c.YIELD_STATS_LOCATION, 'wb') as file:
+        pickle.dump(stats, file)
+    index = IndexedData(c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION)
+    index.add_indexed_query(generated[1], 5)
+    index.add_indexed_query(generated[2], 5)
+    index.save_indexed_queries()
+    assert google.generate_queries(preferences) == [generated[0], generated[3]], "test_query_planner failed."
+    os.remove(c.QUERY_INDEX_LOCATION)
+    (c.PROFILE_INDEX_LOCATION, c.QUERY_INDEX_LOCATION, c.YIELD_STATS_LOCATION) = locations
+
+    os.remove("tests/pkl_tests/planner_stats.pkl")
+    print("query_planner passed.")
+
 def test_load_indexed_profiles():
     # Empty file
     index = IndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
                         "tests/pkl_tests/indexed_queries_empty.pkl")
-    assert index.profiles == [], "test_load_indexed_profiles failed."
+    assert index.profiles == set(), "test_load_indexed_profiles failed."
 
     # File with some data already in it
     index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
                         "tests/pkl_tests/indexed_queries_full.pkl")
-    assert index.profiles == ["alec", "ethan", "sharon"], "test_load_indexed_profiles failed."
+    assert index.profiles == {"alec", "ethan", "sharon"}, "test_load_indexed_profiles failed."
     print("load_indexed_profiles passed.")
 
 def test_check_dup_profile():
@@ -225,13 +852,17 @@ def test_add_indexed_profile():
     index = IndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
                         "tests/pkl_tests/indexed_queries_empty.pkl")
     index.add_indexed_profile("fred")
-    assert index.profiles == ['fred'], "test_add_indexed_profile failed."
+    assert index.profiles == {'fred'}, "test_add_indexed_profile failed."
 
     # Add to full list
     index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
                         "tests/pkl_tests/indexed_queries_full.pkl")
     index.add_indexed_profile("fred")
-    assert index.profiles == ['alec', 'ethan', 'fred', 'sharon'], "test_add_indexed_profile failed."
+    assert index.profiles == {'alec', 'ethan', 'fred', 'sharon'}, "test_add_indexed_profile failed."
+
+    # Add many at once
+    index.add_indexed_profiles(['zoe', 'ethan', 'bob'])
+    assert index.profiles == {'alec', 'bob', 'ethan', 'fred', 'sharon', 'zoe'}, "test_add_indexed_profile failed."
     print("add_indexed_profile passed.")
 
 def test_save_indexed_profiles():
@@ -242,7 +873,7 @@ def test_save_indexed_profiles():
     index.profiles = []
     index.save_indexed_profiles()
     assert IndexedData("tests/pkl_tests/save.pkl",
-                       "tests/pkl_tests/indexed_queries_full.pkl").profiles == [], "test_save_indexed_profiles failed."
+                       "tests/pkl_tests/indexed_queries_full.pkl").profiles == set(), "test_save_indexed_profiles failed."
 
     # Full list
     index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
@@ -253,12 +884,374 @@ def test_save_indexed_profiles():
     assert IndexedData("tests/pkl_tests/save.pkl",
                        "tests/pkl_tests/indexed_queries_full.pkl").profiles == index.profiles, "test_save_indexed_profiles failed."
 
+    # Older indexes are made canonical when loaded, and saved in the current format
+    with open("tests/pkl_tests/save.pkl", 'wb') as file:
+        pickle.dump(["https://uk.linkedin.com/in/Alec/", "zoe"], file)
+    index = IndexedData("tests/pkl_tests/save.pkl",
+                        "tests/pkl_tests/indexed_queries_full.pkl")
+    assert index.profiles == {"https://www.linkedin.com/in/alec", "zoe"}, "test_save_indexed_profiles failed."
+    index.save_indexed_profiles()
+    with open("tests/pkl_tests/save.pkl", 'rb') as file:
+        assert pickle.load(file) == (PROFILE_FORMAT, index.profiles), "test_save_indexed_profiles failed."
+
     os.remove("tests/pkl_tests/save.pkl")
     with open ("tests/pkl_tests/save.pkl", 'wb'):
         pass
 
     print("save_indexed_profiles passed.")
 
+def test_get_indexed_data():
+    with open("tests/pkl_tests/shared_profiles.pkl", 'wb') as file:
+        pickle.dump(["alec", "ethan"], file)
+
+    # The same object is shared, and each index is only loaded when used
+    index = get_indexed_data("tests/pkl_tests/shared_profiles.pkl",
+                             "tests/pkl_tests/indexed_queries_full.pkl")
+    assert index is get_indexed_data("tests/pkl_tests/shared_profiles.pkl",
+                                     "tests/pkl_tests/indexed_queries_full.pkl"), "test_get_indexed_data failed."
+    assert index._profiles is None and index._query_records is None, "test_get_indexed_data failed."
+    assert index.profiles == {"alec", "ethan"}, "test_get_indexed_data failed."
+    assert index._query_records is None, "test_get_indexed_data failed."
+
+    # Changed files are reloaded
+    with open("tests/pkl_tests/shared_profiles.pkl", 'wb') as file:
+        pickle.dump(["alec", "ethan", "sharon", "zoe"], file)
+    index = get_indexed_data("tests/pkl_tests/shared_profiles.pkl",
+                             "tests/pkl_tests/indexed_queries_full.pkl")
+    assert index.profiles == {"alec", "ethan", "sharon", "zoe"}, "test_get_indexed_data failed."
+
+    # Unsaved changes are kept
+    index.add_indexed_profile("fred")
+    with open("tests/pkl_tests/shared_profiles.pkl", 'wb') as file:
+        pickle.dump([], file)
+    index = get_indexed_data("tests/pkl_tests/shared_profiles.pkl",
+                             "tests/pkl_tests/indexed_queries_full.pkl")
+    assert index.profiles == {"alec", "ethan", "fred", "sharon", "zoe"}, "test_get_indexed_data failed."
+
+    # Saved changes are not reloaded
+    index.save_indexed_profiles()
+    index = get_indexed_data("tests/pkl_tests/shared_profiles.pkl",
+                             "tests/pkl_tests/indexed_queries_full.pkl")
+    assert index._profiles is not None, "test_get_indexed_data failed."
+
+    os.remove("tests/pkl_tests/shared_profiles.pkl")
+    print("get_indexed_data passed.")
+
+def test_sqlite_indexed_data():
+    # The .pkl indexes are copied into a new database
+    index = SQLiteIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                              "tests/pkl_tests/indexed_queries_full.pkl",
+                              "tests/pkl_tests/indexed_data.db", 2)
+    assert index.check_dup_profile("ethan") is True, "test_sqlite_indexed_data failed."
+    assert index.check_dup_query("CEO") is True, "test_sqlite_indexed_data failed."
+    assert index.check_dup_profile("fred") is False, "test_sqlite_indexed_data failed."
+    mode = index.connection.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal", "test_sqlite_indexed_data failed."
+
+    # New entries are written once a batch fills up
+    index.add_indexed_profile("fred")
+    assert index.check_dup_profile("fred") is True, "test_sqlite_indexed_data failed."
+    assert index.new_profiles == {"fred"}, "test_sqlite_indexed_data failed."
+    index.add_indexed_profile("zoe")
+    assert index.new_profiles == set(), "test_sqlite_indexed_data failed."
+    index.add_indexed_query("CFO")
+    expected = ["Intern", "CFO", "Owner"]
+    assert list(index.filter_new_queries(expected)) == ["Intern"], "test_sqlite_indexed_data failed."
+    index.close()
+
+    # Reopening does not copy the .pkl indexes again
+    index = SQLiteIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                              "tests/pkl_tests/indexed_queries_empty.pkl",
+                              "tests/pkl_tests/indexed_data.db", 2)
+    with index.connect():
+        index.connection.execute("DELETE FROM profiles WHERE profile = 'alec'")
+    index.close()
+    index = SQLiteIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                              "tests/pkl_tests/indexed_queries_full.pkl",
+                              "tests/pkl_tests/indexed_data.db", 2)
+    assert index.profiles == {"ethan", "fred", "sharon", "zoe"}, "test_sqlite_indexed_data failed."
+    assert index.queries == ["CEO", "CFO", "Manager", "Owner"], "test_sqlite_indexed_data failed."
+    index.close()
+
+    # Query records are read from the database, not the .pkl index
+    query = 'site:linkedin.com/in intitle:("Ithaca") AND ("CEO") AND ("3 years")'
+    index = SQLiteIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                              "tests/pkl_tests/indexed_queries_empty.pkl",
+                              "tests/pkl_tests/indexed_data.db", 2)
+    index.add_indexed_query(query, 4)
+    assert index.query_record(query)[1] == 4, "test_sqlite_indexed_data failed."
+    assert index.query_expired(query, 60) is False, "test_sqlite_indexed_data failed."
+    index.close()
+    assert index.query_record(query)[1] == 4, "test_sqlite_indexed_data failed."
+    assert index.searched_locations("CEO") == {"Ithaca": {"3 years"}}, "test_sqlite_indexed_data failed."
+    assert index.query_record("CFO")[0] > 0, "test_sqlite_indexed_data failed."
+    index.close()
+
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists("tests/pkl_tests/indexed_data.db" + suffix):
+            os.remove("tests/pkl_tests/indexed_data.db" + suffix)
+    print("sqlite_indexed_data passed.")
+
+def test_compact_indexed_data():
+    # The .pkl index is hashed when there is no compact index yet
+    index = CompactIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/compact_profiles.npz")
+    assert index.profiles.dtype == np.uint64 and len(index.profiles) == 3, "test_compact_indexed_data failed."
+    assert list(index.profiles) == sorted(slug_hash(p) for p in ["alec", "ethan", "sharon"]), "test_compact_indexed_data failed."
+    assert index.check_dup_profile("ethan") is True, "test_compact_indexed_data failed."
+    assert index.check_dup_profile("fred") is False, "test_compact_indexed_data failed."
+
+    # Profiles are matched on their slugs, a page at a time
+    index.add_indexed_profile("https://www.linkedin.com/in/Fred/")
+    page = ["https://uk.linkedin.com/in/fred?trk=x", "alec", "zoe"]
+    assert index.check_dup_profiles(page) == [True, True, False], "test_compact_indexed_data failed."
+    index.add_indexed_profiles(["zoe", "bob"])
+    assert len(index.hashes) == 4 and len(index.pending) == 2, "test_compact_indexed_data failed."
+    assert len(index.profiles) == 6 and index.pending == set(), "test_compact_indexed_data failed."
+
+    # Save and load
+    index.save_indexed_profiles()
+    index = CompactIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/compact_profiles.npz")
+    assert index.check_dup_profiles(page) == [True, True, True], "test_compact_indexed_data failed."
+
+    # A compact index that cannot be read is not rebuilt from the .pkl index
+    with open("tests/pkl_tests/compact_profiles.npz", 'wb') as file:
+        file.write(b"not an index")
+    index = CompactIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/compact_profiles.npz")
+    try:
+        index.check_dup_profile("ethan")
+        assert False, "test_compact_indexed_data failed."
+    except ValueError:
+        pass
+    os.remove("tests/pkl_tests/compact_profiles.npz")
+
+    # Exact slugs rule out hash collisions
+    index = CompactIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/compact_profiles.npz", True)
+    assert index.check_dup_profile("alec") is True, "test_compact_indexed_data failed."
+    index.slugs[slug_hash("alec")] = {"not alec"}
+    assert index.check_dup_profile("alec") is False, "test_compact_indexed_data failed."
+    assert index.check_dup_profiles(["alec", "ethan"]) == [False, True], "test_compact_indexed_data failed."
+
+    # Turning on exact slugs keeps an index saved without them
+    index = CompactIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/compact_profiles.npz")
+    index.add_indexed_profiles(["alice", "bob"])
+    index.save_indexed_profiles()
+    index = CompactIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/compact_profiles.npz", True)
+    assert index.check_dup_profiles(["alice", "bob", "carol"]) == [True, True, False], "test_compact_indexed_data failed."
+    index.add_indexed_profile("carol")
+    index.save_indexed_profiles()
+    index = CompactIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/compact_profiles.npz", True)
+    assert len(index.profiles) == 3, "test_compact_indexed_data failed."
+    assert index.check_dup_profiles(["alice", "bob", "carol"]) == [True, True, True], "test_compact_indexed_data failed."
+    os.remove("tests/pkl_tests/compact_profiles.npz")
+    os.remove("tests/pkl_tests/compact_profiles.npz.slugs.pkl")
+    print("compact_indexed_data passed.")
+
+def test_mmap_indexed_data():
+    # The .pkl index is written to the binary index when there is none yet
+    index = MmapIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                            "tests/pkl_tests/indexed_queries_full.pkl",
+                            "tests/pkl_tests/mmap_profiles.idx", 2)
+    assert index.check_dup_profiles(["ethan", "fred"]) == [True, False], "test_mmap_indexed_data failed."
+    assert isinstance(index.base, np.memmap) and len(index.base) == 3, "test_mmap_indexed_data failed."
+
+    # New profiles go to the appended segment, and are kept without saving
+    index.add_indexed_profile("https://www.linkedin.com/in/Fred/")
+    assert index.check_dup_profile("https://uk.linkedin.com/in/fred") is True, "test_mmap_indexed_data failed."
+    index = MmapIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                            "tests/pkl_tests/indexed_queries_full.pkl",
+                            "tests/pkl_tests/mmap_profiles.idx", 2)
+    assert index.check_dup_profiles(["fred", "alec", "zoe"]) == [True, True, False], "test_mmap_indexed_data failed."
+
+    # Saving merges the segment into the index in the background
+    index.add_indexed_profiles(["zoe", "bob"])
+    index.save_indexed_profiles()
+    index.wait_for_merge()
+    assert len(index.base) == 6 and index.appended == set(), "test_mmap_indexed_data failed."
+    assert os.path.getsize("tests/pkl_tests/mmap_profiles.idx.append") == 0, "test_mmap_indexed_data failed."
+    assert list(index.profiles) == sorted(slug_hash(p) for p in ["alec", "bob", "ethan", "fred", "sharon", "zoe"]), "test_mmap_indexed_data failed."
+
+    # Merging keeps the profiles another process appended to the segment
+    other = MmapIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                            "tests/pkl_tests/indexed_queries_full.pkl",
+                            "tests/pkl_tests/mmap_profiles.idx", 2)
+    other.add_indexed_profile("carl")
+    index.add_indexed_profile("dana")
+    index.merge()
+    assert index.check_dup_profiles(["carl", "dana"]) == [True, True], "test_mmap_indexed_data failed."
+    assert len(index.base) == 8 and index.appended == set(), "test_mmap_indexed_data failed."
+    assert os.path.getsize("tests/pkl_tests/mmap_profiles.idx.append") == 0, "test_mmap_indexed_data failed."
+
+    # Refreshing reads the profiles another process appended, and keeps
+    # unsaved queries
+    other.add_indexed_profile("erin")
+    index.add_indexed_query("Ithaca Intern")
+    index.refresh()
+    assert index.check_dup_profile("erin") is True, "test_mmap_indexed_data failed."
+    assert index.check_dup_query("Ithaca Intern") is True, "test_mmap_indexed_data failed."
+    base = index.base
+    index.refresh()
+    assert index.base is base, "test_mmap_indexed_data failed."
+
+    # Files in another format are refused
+    with open("tests/pkl_tests/mmap_profiles.idx", 'r+b') as file:
+        file.write(b"NOTIDX")
+    index.refresh()
+    try:
+        index.check_dup_profile("zoe")
+        assert False, "test_mmap_indexed_data failed."
+    except ValueError:
+        pass
+    os.remove("tests/pkl_tests/mmap_profiles.idx")
+    os.remove("tests/pkl_tests/mmap_profiles.idx.append")
+    print("mmap_indexed_data passed.")
+
+def test_bloom_filter():
+    # Added keys are always found, and few others are
+    bloom = BloomFilter(1000, 0.01)
+    bloom.add_keys(np.arange(1000, dtype=np.uint64) * np.uint64(2654435761))
+    assert bloom.contains_keys(np.arange(1000, dtype=np.uint64) * np.uint64(2654435761)).all(), "test_bloom_filter failed."
+    misses = bloom.contains_keys(np.arange(1000, 11000, dtype=np.uint64) * np.uint64(2654435761)).mean()
+    assert misses < 0.03 and bloom.false_positive_rate() < 0.03, "test_bloom_filter failed."
+    assert bloom.memory_usage() == 1199, "test_bloom_filter failed."
+
+    # Profiles the filter rules out are never looked up in the index
+    index = BloomIndexedData(IndexedData("tests/pkl_tests/bloom_profiles.pkl",
+                                         "tests/pkl_tests/indexed_queries_full.pkl"),
+                             "tests/pkl_tests/profile_bloom.npz", 0.01)
+    index.profiles = ["alec", "ethan", "sharon"]
+    assert index.check_dup_profiles(["ethan", "fred", "alec"]) == [True, False, True], "test_bloom_filter failed."
+    assert index.lookups == 2 and index.observed_false_positive_rate() == 0.0, "test_bloom_filter failed."
+    index.add_indexed_profile("fred")
+    assert index.check_dup_profile("fred") is True, "test_bloom_filter failed."
+    assert index.check_dup_query("CEO") is True, "test_bloom_filter failed."
+
+    # Save and load, the filter is rebuilt for a different index
+    index.save_indexed_profiles()
+    assert load_bloom_filter("tests/pkl_tests/profile_bloom.npz").count == 4, "test_bloom_filter failed."
+
+    # A filter saved before another process changed the index is rebuilt
+    other = IndexedData("tests/pkl_tests/bloom_profiles.pkl",
+                        "tests/pkl_tests/indexed_queries_full.pkl")
+    other.add_indexed_profile("zoe")
+    other.save_indexed_profiles()
+    reloaded = BloomIndexedData(IndexedData("tests/pkl_tests/bloom_profiles.pkl",
+                                            "tests/pkl_tests/indexed_queries_full.pkl"),
+                                "tests/pkl_tests/profile_bloom.npz", 0.01)
+    assert reloaded.check_dup_profile("zoe") is True, "test_bloom_filter failed."
+
+    # Saving over another process's changes saves a filter that holds them
+    index.add_indexed_profile("bob")
+    index.save_indexed_profiles()
+    assert index.check_dup_profiles(["zoe", "bob"]) == [True, True], "test_bloom_filter failed."
+    bloom = load_bloom_filter("tests/pkl_tests/profile_bloom.npz")
+    assert bloom.count == 6 and bloom.version == index.index_version(), "test_bloom_filter failed."
+    index = BloomIndexedData(IndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                                         "tests/pkl_tests/indexed_queries_empty.pkl"),
+                             "tests/pkl_tests/profile_bloom.npz", 0.01)
+    assert index.check_dup_profile("fred") is False and index.bloom.count == 0, "test_bloom_filter failed."
+    os.remove("tests/pkl_tests/profile_bloom.npz")
+    os.remove("tests/pkl_tests/bloom_profiles.pkl")
+    print("bloom_filter passed.")
+
+def test_journaled_indexed_data():
+    # New entries are appended to the logs as they are indexed
+    index = JournaledIndexedData("tests/pkl_tests/journal_profiles.pkl",
+                                 "tests/pkl_tests/journal_queries.pkl", 1024)
+    index.add_indexed_profiles(["alec", "ethan"])
+    index.add_indexed_profile("sharon")
+    index.add_indexed_query("Owner")
+    index.add_indexed_query("CEO")
+    assert replay_log("tests/pkl_tests/journal_profiles.pkl.log") == ["alec", "ethan", "sharon"], "test_journaled_indexed_data failed."
+
+    # Small logs are not compacted, and are replayed on load
+    index.save_indexed_profiles()
+    index.save_indexed_queries()
+    assert not os.path.exists("tests/pkl_tests/journal_profiles.pkl"), "test_journaled_indexed_data failed."
+    index = JournaledIndexedData("tests/pkl_tests/journal_profiles.pkl",
+                                 "tests/pkl_tests/journal_queries.pkl", 1024)
+    assert index.profiles == {"alec", "ethan", "sharon"}, "test_journaled_indexed_data failed."
+    assert index.queries == ["CEO", "Owner"], "test_journaled_indexed_data failed."
+
+    # A partly written record ends the log, and is only cut off by a writer
+    with open("tests/pkl_tests/journal_profiles.pkl.log", 'ab') as file:
+        file.write(b"\x80\x04\x95")
+    size = os.path.getsize("tests/pkl_tests/journal_profiles.pkl.log")
+    index.refresh()
+    assert index.profiles == {"alec", "ethan", "sharon"}, "test_journaled_indexed_data failed."
+    assert os.path.getsize("tests/pkl_tests/journal_profiles.pkl.log") == size, "test_journaled_indexed_data failed."
+    index.add_indexed_profile("zoe")
+    assert replay_log("tests/pkl_tests/journal_profiles.pkl.log")[-1] == "zoe", "test_journaled_indexed_data failed."
+
+    # Logs past the compaction size are compacted into the index
+    index.compact_size = 0
+    index.add_indexed_profile("fred")
+    index.save_indexed_profiles()
+    index.save_indexed_queries()
+    assert not os.path.exists("tests/pkl_tests/journal_profiles.pkl.log"), "test_journaled_indexed_data failed."
+    index = JournaledIndexedData("tests/pkl_tests/journal_profiles.pkl",
+                                 "tests/pkl_tests/journal_queries.pkl", 1024)
+    assert index.profiles == {"alec", "ethan", "sharon", "zoe", "fred"}, "test_journaled_indexed_data failed."
+    assert index.queries == ["CEO", "Owner"], "test_journaled_indexed_data failed."
+    os.remove("tests/pkl_tests/journal_profiles.pkl")
+    os.remove("tests/pkl_tests/journal_queries.pkl")
+    print("journaled_indexed_data passed.")
+
+def test_sharded_indexed_data():
+    # Shards are made from the .pkl index, and only loaded when needed
+    index = ShardedIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/profile_shards", 4, 10 ** 6)
+    assert index.check_dup_profile("ethan") is True, "test_sharded_indexed_data failed."
+    assert list(index.shards) == [index.shard_of("ethan")], "test_sharded_indexed_data failed."
+    assert index.check_dup_profiles(["alec", "fred"]) == [True, False], "test_sharded_indexed_data failed."
+    assert index.profiles == {"alec", "ethan", "sharon"}, "test_sharded_indexed_data failed."
+
+    # Only shards with new profiles are saved
+    index.add_indexed_profiles(["fred", "zoe"])
+    dirty = {index.shard_of("fred"), index.shard_of("zoe")}
+    assert index.dirty == dirty, "test_sharded_indexed_data failed."
+    versions = [file_version(index.shard_file(shard)) for shard in range(16)]
+    index.save_indexed_profiles()
+    changed = {shard for shard in range(16) if file_version(index.shard_file(shard)) != versions[shard]}
+    assert changed == dirty and index.dirty == set(), "test_sharded_indexed_data failed."
+
+    # Shards past the memory limit are dropped, and saved first if changed
+    index = ShardedIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/profile_shards", 4, 1)
+    index.add_indexed_profile("bob")
+    index.check_dup_profiles(["alec", "ethan", "sharon", "fred", "zoe"])
+    assert len(index.shards) == 1, "test_sharded_indexed_data failed."
+    assert index.profiles == {"alec", "bob", "ethan", "sharon", "fred", "zoe"}, "test_sharded_indexed_data failed."
+
+    # Replacing the index swaps in a whole new directory of shards
+    index.profiles = ["https://www.linkedin.com/in/Carl/", "dana"]
+    assert len(index.shards) == 0 and index.dirty == set(), "test_sharded_indexed_data failed."
+    index = ShardedIndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
+                               "tests/pkl_tests/indexed_queries_full.pkl",
+                               "tests/pkl_tests/profile_shards", 4, 10 ** 6)
+    assert index.profiles == {"https://www.linkedin.com/in/carl", "dana"}, "test_sharded_indexed_data failed."
+    assert len(index.shards) == 0, "test_sharded_indexed_data failed."
+    assert index.check_dup_profiles(["https://uk.linkedin.com/in/carl", "alec"]) == [True, False], "test_sharded_indexed_data failed."
+    leftovers = [name for name in os.listdir("tests/pkl_tests") if name.startswith("profile_shards.")]
+    assert leftovers == ["profile_shards.lock"], "test_sharded_indexed_data failed."
+    shutil.rmtree("tests/pkl_tests/profile_shards")
+    print("sharded_indexed_data passed.")
+
 def test_load_indexed_queries():
     # Empty file
     index = IndexedData("tests/pkl_tests/indexed_profiles_empty.pkl",
@@ -320,6 +1313,156 @@ def test_save_indexed_queries():
 
     print("save_indexed_queries passed.")
 
+def test_query_expiry():
+    # Queries are recorded with the time they were searched and their yield
+    index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                        "tests/pkl_tests/indexed_queries_full.pkl")
+    index.add_indexed_query("CFO", 12)
+    assert index.query_record("CFO")[1] == 12 and index.query_record("CEO") == (0, None), "test_query_expiry failed."
+    index.add_indexed_query("CFO", 3)
+    assert index.queries == ["CEO", "CFO", "Manager", "Owner"], "test_query_expiry failed."
+
+    # Queries only become eligible again once they expire
+    queries = ["CFO", "CEO", "Intern"]
+    assert list(index.filter_new_queries(queries)) == ["Intern"], "test_query_expiry failed."
+    assert list(index.filter_new_queries(queries, 60)) == ["CEO", "Intern"], "test_query_expiry failed."
+    assert list(index.filter_new_queries(queries, 0)) == queries, "test_query_expiry failed."
+
+    # Expired queries are evicted when saved
+    index.query_file = "tests/pkl_tests/expiry_queries.pkl"
+    index.save_indexed_queries(60)
+    index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                        "tests/pkl_tests/expiry_queries.pkl")
+    assert index.queries == ["CFO"] and index.query_record("CFO")[1] == 3, "test_query_expiry failed."
+    os.remove("tests/pkl_tests/expiry_queries.pkl")
+
+    # The same holds for the SQLite index
+    index = SQLiteIndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                              "tests/pkl_tests/indexed_queries_full.pkl",
+                              "tests/pkl_tests/expiry_queries.db", 10)
+    index.add_indexed_query("CFO", 12)
+    assert list(index.filter_new_queries(queries, 60)) == ["CEO", "Intern"], "test_query_expiry failed."
+    index.save_indexed_queries(60)
+    assert index.queries == ["CFO"], "test_query_expiry failed."
+    index.close()
+    os.remove("tests/pkl_tests/expiry_queries.db")
+    print("query_expiry passed.")
+
+def test_query_codec():
+    # Generated queries are stored as tuples of IDs, and rebuilt exactly
+    codec = QueryCodec()
+    queries = ['site:linkedin.com/in intitle:("Ithaca") AND ("CEO") AND ("10 year")',
+               'site:linkedin.com/in intitle:("Ithaca") AND ("CEO") AND ("1 year")',
+               'site:linkedin.com/in intitle:("Boston") AND ("CEO") -"year" -"years"',
+               'site:linkedin.com/in intitle:("Boston") AND ("CFO") AND ("3 years") "Inc"',
+               "CEO"]
+    keys = [codec.encode(query) for query in queries]
+    assert keys[:3] == [(0, 0, 0), (0, 0, 1), (0, 1, 2)], "test_query_codec failed."
+    assert keys[3:] == queries[3:], "test_query_codec failed."
+    assert [codec.decode(key) for key in keys] == queries, "test_query_codec failed."
+    assert codec.encode(queries[0].replace("CEO", "CTO"), False) is None, "test_query_codec failed."
+
+    # The index is saved compressed, and can be asked where positions were searched
+    index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                        "tests/pkl_tests/codec_queries.pkl")
+    for query in queries:
+        index.add_indexed_query(query)
+    index.save_indexed_queries()
+    with open("tests/pkl_tests/codec_queries.pkl", 'rb') as file:
+        positions, locations, buckets, records = pickle.load(file)
+    assert positions == ["CEO"] and locations == ["Ithaca", "Boston"], "test_query_codec failed."
+    index = IndexedData("tests/pkl_tests/indexed_profiles_full.pkl",
+                        "tests/pkl_tests/codec_queries.pkl")
+    assert index.queries == sorted(queries), "test_query_codec failed."
+    assert index.check_dup_query(queries[2]) is True, "test_query_codec failed."
+    assert index.check_dup_query(queries[2].replace("Boston", "Ithaca")) is False, "test_query_codec failed."
+    assert index.searched_locations("CEO") == {"Ithaca": {"10 year", "1 year"}, "Boston": {""}}, "test_query_codec failed."
+    os.remove("tests/pkl_tests/codec_queries.pkl")
+    print("query_codec passed.")
+
+def test_profile_url():
+    # Every way of linking a profile has the same canonical url
+    links = ["https://www.linkedin.com/in/ethan-baker-123",
+             "https://www.linkedin.com/in/ethan-baker-123/",
+             "http://uk.linkedin.com/in/Ethan-Baker-123?originalSubdomain=uk",
+             "https://linkedin.com/in/ethan-baker-123/en",
+             "www.linkedin.com/in/ethan-baker-123#experience"]
+    expected = "https://www.linkedin.com/in/ethan-baker-123"
+    assert [canonical_url(link) for link in links] == [expected] * 5, "test_profile_url failed."
+    assert canonical_url("https://www.linkedin.com/in/j%C3%A9r%C3%B4me") == \
+        canonical_url("https://fr.linkedin.com/in/jérôme/"), "test_profile_url failed."
+    assert all(map(is_profile_url, links)), "test_profile_url failed."
+    for link in ["https://www.linkedin.com/company/cornell", "https://www.linkedin.com/in/",
+                 "https://www.google.com/in/ethan-baker-123", "", None]:
+        assert not is_profile_url(link), "test_profile_url failed."
+
+    # Indexes treat every link to a profile as a duplicate
+    index = IndexedData(None, None)
+    index.profiles = set()
+    index.add_indexed_profiles(links[:2])
+    assert index.profiles == {expected}, "test_profile_url failed."
+    assert index.check_dup_profiles(links) == [True] * 5, "test_profile_url failed."
+    index = CompactIndexedData(None, None, None, True)
+    index.profiles = [links[2]]
+    assert index.check_dup_profiles(links) == [True] * 5, "test_profile_url failed."
+    print("profile_url passed.")
+
+def test_concurrent_saves():
+    # Profiles and queries added by two overlapping runs are both kept
+    first = IndexedData("tests/pkl_tests/concurrent_profiles.pkl",
+                        "tests/pkl_tests/concurrent_queries.pkl")
+    second = IndexedData("tests/pkl_tests/concurrent_profiles.pkl",
+                         "tests/pkl_tests/concurrent_queries.pkl")
+    first.add_indexed_profile("alec")
+    second.add_indexed_profile("ethan")
+    first.add_indexed_query("CEO", 5)
+    second.add_indexed_query("CFO", 2)
+    second.add_indexed_query("CEO", 1)
+    first.save_indexed_profiles()
+    first.save_indexed_queries()
+    second.save_indexed_profiles()
+    second.save_indexed_queries()
+    index = IndexedData("tests/pkl_tests/concurrent_profiles.pkl",
+                        "tests/pkl_tests/concurrent_queries.pkl")
+    assert index.profiles == {"alec", "ethan"}, "test_concurrent_saves failed."
+    assert index.queries == ["CEO", "CFO"] and index.query_record("CEO")[1] == 1, "test_concurrent_saves failed."
+
+    # Replacing the whole index does not merge
+    second.profiles = ["sharon"]
+    second.save_indexed_profiles()
+    assert IndexedData("tests/pkl_tests/concurrent_profiles.pkl", None).profiles == {"sharon"}, "test_concurrent_saves failed."
+
+    # Locks can be taken again by the same thread, and failed writes leave the file as it was
+    with FileLock("tests/pkl_tests/concurrent_profiles.pkl"):
+        with FileLock("tests/pkl_tests/concurrent_profiles.pkl"):
+            pass
+    try:
+        with atomic_open("tests/pkl_tests/concurrent_profiles.pkl") as file:
+            file.write(b"partial")
+            raise ValueError
+    except ValueError:
+        pass
+    assert IndexedData("tests/pkl_tests/concurrent_profiles.pkl", None).profiles == {"sharon"}, "test_concurrent_saves failed."
+    assert [name for name in os.listdir("tests/pkl_tests") if name.endswith(".tmp")] == [], "test_concurrent_saves failed."
+    os.remove("tests/pkl_tests/concurrent_profiles.pkl")
+    os.remove("tests/pkl_tests/concurrent_queries.pkl")
+    print("concurrent_saves passed.")
+
+def test_bot_controller():
+    # Each profile is visited once, and rows without a link are kept
+    excel = c.EXCEL_INPUT_LOCATION
+    c.EXCEL_INPUT_LOCATION = "tests/excel_tests/bot_input.xlsx"
+    df = pd.DataFrame({"Title": ["Alec", "Ethan", "Sharon", "Zoe"],
+                       "Link": [None, None, "https://uk.linkedin.com/in/sharon/",
+                                "https://www.linkedin.com/in/sharon"]})
+    df.to_excel(c.EXCEL_INPUT_LOCATION, index=False)
+    controller = BotController()
+    assert controller.df["Title"].tolist() == ["Alec", "Ethan", "Sharon"], "test_bot_controller failed."
+    assert controller.df["Link"][2] == "https://www.linkedin.com/in/sharon", "test_bot_controller failed."
+    os.remove(c.EXCEL_INPUT_LOCATION)
+    c.EXCEL_INPUT_LOCATION = excel
+    print("bot_controller passed.")
+
 def test_login():
     # Valid login
     c.USERNAME = "8ethanbaker@gmail.com"
@@ -692,14 +1835,28 @@ def test_search_for_profiles():
     """
     test_load_preferences()
     test_save_results()
+    test_result_filter()
+    test_result_sink()
+    test_stream_search()
     print("All search_for_profiles.py functions passed.")
 
 def test_google_api():
     """
     Tests all methods in the class GoogleSearchAPI
-    Does not test search as it uses API requests.
+    API requests are answered by a LocalTransport.
     """
     test_generate_queries()
+    test_iter_queries()
+    test_search()
+    test_iter_search()
+    test_extract_fields()
+    test_fetch_page()
+    test_response_cache()
+    test_query_cursors()
+    test_yield_policy()
+    test_query_scheduler()
+    test_query_planner()
+    test_fetch_all()
     print("All GoogleSearchAPI methods passed.")
 
 def test_indexed_data():
@@ -710,10 +1867,21 @@ def test_indexed_data():
     test_check_dup_profile()
     test_add_indexed_profile()
     test_save_indexed_profiles()
+    test_get_indexed_data()
+    test_sqlite_indexed_data()
+    test_compact_indexed_data()
+    test_mmap_indexed_data()
+    test_bloom_filter()
+    test_journaled_indexed_data()
+    test_sharded_indexed_data()
     test_load_indexed_queries()
     test_check_dup_query()
     test_add_indexed_query()
     test_save_indexed_queries()
+    test_query_expiry()
+    test_query_codec()
+    test_profile_url()
+    test_concurrent_saves()
     print("All IndexedData methods passed.")
 
 def test_linkedin_bot():
@@ -723,6 +1891,7 @@ def test_linkedin_bot():
     Some of the test cases WILL FAIL as the connect / accept
     methods change the state of the LinkedIn profiles used in the tests.
     """
+    test_bot_controller()
     test_login()
     test_send_connection_request()
     test_more_then_connect()